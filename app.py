@@ -1,15 +1,29 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, g, has_app_context, Response, stream_with_context
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 import sqlite3
 import os
-import pandas as pd
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
 import json
+import base64
+import hashlib
+import hmac
+import csv
+import io
+import logging
+import random
 from functools import wraps
 from pathlib import Path
 import pytz
 from flask_cors import CORS  # Add CORS support
+from db_pool import ConexionPool
+from migraciones import inicializar_base_datos, version_esquema, VERSION_ESQUEMA
+from cache_ttl import CacheTTL
+from catalogo import CatalogoRutas, ARCHIVO_EXCEL, excel_sin_cambios, guardar_huella_excel
+from registro_actividad import RegistroActividad
+from archivador import Archivador
+from mantenimiento import MantenimientoBD, estado_base
+from metricas import Metricas
 
 def get_now():
     """
@@ -18,11 +32,29 @@ def get_now():
     """
     return datetime.now(pytz.timezone('America/Guatemala'))
 
+logging.basicConfig(
+    level=os.environ.get('LOG_LEVEL', 'INFO'),
+    format='%(asctime)s %(levelname)s %(name)s %(message)s'
+)
+logger = logging.getLogger('rutas')
+
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 app.secret_key = 'clave-secreta-rutas-2024'  # Cambiar en producción
 
 # Headers de seguridad para parecer sitio web corporativo normal
+# Los estáticos versionados cambian de URL al cambiar el archivo: se pueden guardar un año
+CACHE_ESTATICOS_VERSIONADOS = 'public, max-age=31536000, immutable'
+
+@app.url_defaults
+def versionar_estaticos(endpoint, values):
+    """Agregar ?v=<mtime> a url_for('static', ...) para invalidar el cache al cambiar el archivo"""
+    if endpoint != 'static' or 'v' in values or not app.static_folder:
+        return
+    ruta = os.path.join(app.static_folder, values.get('filename', ''))
+    if os.path.isfile(ruta):
+        values['v'] = int(os.stat(ruta).st_mtime)
+
 @app.after_request
 def add_security_headers(response):
     """Agregar headers que hagan parecer el sitio como corporativo normal"""
@@ -51,7 +83,7 @@ def add_security_headers(response):
     response.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
     response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains; preload'
     
-    # Content Security Policy (CSP) - Configurado para mejor seguridad
+    # Content Security Policy (CSP) - Configurado para mejor seguridad (salvo que la vista defina la suya)
     csp_directives = [
         "default-src 'self'",
         "script-src 'self' 'unsafe-inline' https://cdn.jsdelivr.net https://code.jquery.com", 
@@ -65,7 +97,8 @@ def add_security_headers(response):
         "object-src 'none'",
         "upgrade-insecure-requests"
     ]
-    response.headers['Content-Security-Policy'] = "; ".join(csp_directives)
+    if 'Content-Security-Policy' not in response.headers:
+        response.headers['Content-Security-Policy'] = "; ".join(csp_directives)
     
     # Headers que hacen parecer un sistema empresarial INTERNO
     response.headers['X-Enterprise-System'] = 'Sistema-Gestion-Rutas'
@@ -82,10 +115,15 @@ def add_security_headers(response):
     response.headers['X-System-ID'] = 'RMS-CORP-2024'
     response.headers['X-Corporate-Auth'] = 'Integrated-Windows-Auth'
     
-    # Headers de cache corporativo INTERNO
-    response.headers['Cache-Control'] = 'private, no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
+    # Archivos estáticos: cache largo si la URL lleva la versión (?v=), revalidar si no
+    if request.endpoint == 'static':
+        response.headers['Cache-Control'] = (CACHE_ESTATICOS_VERSIONADOS if request.args.get('v')
+                                             else 'no-cache')
+    # Headers de cache corporativo INTERNO (salvo que la vista defina su propia política, como /sw.js)
+    elif 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'private, no-cache, no-store, must-revalidate'
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '0'
     
     return response
 
@@ -118,314 +156,336 @@ class User(UserMixin):
     def is_supervisor(self):
         return self.role in ['supervisor', 'admin', 'super_admin']
 
+# Flask-Login carga el usuario en cada request autenticado directamente de
+# la base (búsqueda por clave primaria), sin cache: desactivar un usuario o
+# cambiarle el rol, desde cualquier proceso, se aplica en el siguiente request
 @login_manager.user_loader
 def load_user(user_id):
     """Cargar usuario desde la base de datos"""
-    # Asegurar que la base de datos exista antes de consultar
-    if not os.path.exists(DATABASE):
-        print("⚠️ Base de datos no encontrada, inicializando...")
-        init_db()
-    
     conn = get_db_connection()
-    
-    # Verificar que la tabla users existe
-    table_exists = conn.execute('''
-        SELECT count(name) FROM sqlite_master 
-        WHERE type='table' AND name='users'
-    ''').fetchone()[0]
-    
-    if table_exists == 0:
-        # La tabla no existe, inicializar la BD
-        conn.close()
-        print("⚠️ La tabla users no existe, inicializando base de datos...")
-        init_db()
-        conn = get_db_connection()
-    
     user_data = conn.execute(
-        'SELECT * FROM users WHERE id = ? AND is_active = 1', 
+        'SELECT id, username, email, role, is_active FROM users WHERE id = ? AND is_active = 1', 
         (user_id,)
     ).fetchone()
     conn.close()
     
     if user_data:
-        return User(
+        user = User(
             id=user_data['id'],
             username=user_data['username'],
             email=user_data['email'],
             role=user_data['role'],
             active=user_data['is_active']
         )
+        return user
     return None
 
 # Configuración de la base de datos
 DATABASE = 'sistema_rutas.db'
 
+# Latencia por endpoint y tiempos SQL de este worker (/metrics)
+metricas = Metricas()
+
+# Logs por request: una muestra de los normales y todos los lentos
+LOG_MUESTREO = float(os.environ.get('LOG_MUESTREO', 0.01))
+LOG_LENTO_MS = float(os.environ.get('LOG_LENTO_MS', 1000))
+
+# Pool de conexiones por worker (PRAGMAs aplicados una sola vez por conexión)
+pool_conexiones = ConexionPool(
+    DATABASE,
+    max_conexiones=int(os.environ.get('DB_POOL_SIZE', 5)),
+    timeout=float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+    observador=metricas
+)
+
+# Reportes anteriores a la retención en archivos mensuales (0 = no archivar;
+# las consultas por fecha siempre leen los archivos que existan)
+archivador = Archivador(
+    DATABASE,
+    directorio=os.environ.get('ARCHIVO_DIR'),
+    retencion_dias=int(os.environ.get('ARCHIVO_RETENCION_DIAS', 0))
+)
+
+# Checkpoints del WAL, PRAGMA optimize/ANALYZE y archivado en segundo plano (0 = desactivado)
+mantenimiento = MantenimientoBD(
+    DATABASE,
+    intervalo=float(os.environ.get('MANTENIMIENTO_INTERVALO', 60)),
+    wal_pasivo=float(os.environ.get('WAL_PASIVO_MB', 4)) * 1024 ** 2,
+    wal_truncar=float(os.environ.get('WAL_TRUNCAR_MB', 64)) * 1024 ** 2,
+    optimizar_cada=float(os.environ.get('OPTIMIZAR_CADA', 3600)),
+    analizar_cada=float(os.environ.get('ANALIZAR_CADA', 86400)),
+    archivador=archivador if archivador.retencion_dias > 0 else None,
+    archivar_cada=float(os.environ.get('ARCHIVAR_CADA', 86400)),
+    cambios_dias=int(os.environ.get('CAMBIOS_RETENCION_DIAS', 7)),
+    depurar_cada=float(os.environ.get('DEPURAR_CAMBIOS_CADA', 3600))
+)
+
+# Paginación del panel de administración
+MAX_POR_PAGINA = 100
+conteo_reportes_cache = CacheTTL(ttl=float(os.environ.get('ADMIN_CONTEO_TTL', 30)))
+
+# Feed en vivo del panel (/admin/stream)
+STREAM_RETRY_MS = int(os.environ.get('ADMIN_STREAM_RETRY_MS', 10000))
+STREAM_MAX_CAMBIOS = 200
+
 def get_db_connection():
-    """Obtener conexión a la base de datos"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys=ON")
+    """Obtener conexión del pool (conn.close() la devuelve al pool)"""
+    conn = pool_conexiones.obtener()
+    if has_app_context():
+        g.setdefault('conexiones_db', []).append(conn)
     return conn
 
-def init_db():
-    """Inicializar la base de datos"""
-    print(f"🔄 Inicializando base de datos en: {DATABASE}")
-    
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    # Configurar SQLite para mejor rendimiento
-    cursor.execute("PRAGMA journal_mode=WAL")
-    cursor.execute("PRAGMA synchronous=NORMAL")
-    cursor.execute("PRAGMA foreign_keys=ON")
-    cursor.execute("PRAGMA temp_store=MEMORY")
-    
-    # Tabla para almacenar datos de rutas (cargados desde Excel)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS rutas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ruta TEXT NOT NULL,
-            codigo TEXT,
-            placa TEXT,
-            supervisor TEXT,
-            contratista TEXT NOT NULL,
-            tipo TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Tabla para reportes de rutas diarios
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reportes_rutas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            contratista TEXT NOT NULL,
-            ruta_id INTEGER NOT NULL,
-            ruta_codigo TEXT NOT NULL,
-            clientes_pendientes INTEGER NOT NULL DEFAULT 0,
-            cajas_camion INTEGER NOT NULL DEFAULT 0,
-            hora_aproximada_ingreso TIME NOT NULL,
-            ubicacion_exacta TEXT,
-            latitud REAL,
-            longitud REAL,
-            hora_exacta_envio DATETIME DEFAULT CURRENT_TIMESTAMP,
-            comentarios TEXT,
-            fecha_reporte DATE DEFAULT (date('now')),
-            hora_reporte DATETIME DEFAULT CURRENT_TIMESTAMP,
-            estado TEXT DEFAULT 'activo',
-            reportado_por TEXT,
-            FOREIGN KEY (ruta_id) REFERENCES rutas (id)
-        )
-    ''')
-    
-    # Tabla para usuarios del sistema
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            role TEXT NOT NULL DEFAULT 'user',
-            is_active INTEGER DEFAULT 1,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            last_login DATETIME,
-            created_by INTEGER,
-            FOREIGN KEY (created_by) REFERENCES users (id)
-        )
-    ''')
-    
-    # Tabla para log de actividades
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS activity_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            action TEXT NOT NULL,
-            target_type TEXT,
-            target_id INTEGER,
-            details TEXT,
-            ip_address TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
+def ceder_conexion(conn):
+    """
+    Quitar `conn` de las conexiones del request para que la cierre el generador
+    de una respuesta en streaming: Flask ejecuta el teardown antes de enviar el
+    cuerpo y la conexión volvería al pool con el cursor todavía abierto.
+    """
+    g.conexiones_db.remove(conn)
+
+# Catálogo de rutas en memoria (index, /get_rutas, filtros del panel)
+catalogo = CatalogoRutas(get_db_connection, revalidar_cada=float(os.environ.get('CATALOGO_TTL', 60)))
+CATALOGO_MAX_AGE = int(os.environ.get('CATALOGO_MAX_AGE', 300))
+
+# Log de actividades escrito en lotes por un hilo en segundo plano
+registro_actividad = RegistroActividad(
+    get_db_connection,
+    max_lote=int(os.environ.get('ACTIVIDAD_MAX_LOTE', 100)),
+    intervalo=float(os.environ.get('ACTIVIDAD_INTERVALO', 1.0)),
+    max_pendientes=int(os.environ.get('ACTIVIDAD_MAX_PENDIENTES', 10000))
+)
+
+@app.before_request
+def iniciar_medicion():
+    metricas.iniciar_request()
+    mantenimiento.iniciar()
+
+@app.after_request
+def registrar_medicion(response):
+    """Registrar la latencia del request y dejar un log muestreado"""
+    endpoint = request.endpoint or 'sin_ruta'
+    resumen = metricas.terminar_request(endpoint, request.method, response.status_code)
+    if resumen is None:
+        return response
+    ms = resumen['segundos'] * 1000
+    if ms >= LOG_LENTO_MS:
+        nivel = logging.WARNING
+    elif random.random() < LOG_MUESTREO:
+        nivel = logging.INFO
+    else:
+        return response
+    logger.log(nivel, 'request endpoint=%s metodo=%s estado=%s ms=%.1f consultas=%d filas=%d sql_ms=%.1f',
+               endpoint, request.method, response.status_code, ms,
+               resumen['consultas'], resumen['filas'], resumen['sql_segundos'] * 1000)
+    return response
+
+@app.teardown_appcontext
+def devolver_conexiones(exception=None):
+    """Devolver al pool las conexiones que un request no cerró"""
+    for conn in g.pop('conexiones_db', []):
+        conn.close()
+
+def normalizar_fecha(valor):
+    """Normalizar una fecha recibida como texto a 'YYYY-MM-DD' (None si no es válida)"""
+    try:
+        return datetime.strptime(valor.strip()[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+    except (ValueError, AttributeError):
+        return None
+
+# Error de los endpoints que reciben una fecha que no se puede interpretar:
+# la consulta nunca se hace sin límite de fecha
+FECHA_INVALIDA = 'Fecha inválida. Use YYYY-MM-DD'
+
+def filtros_reportes(fecha=None, contratista=None):
+    """
+    Construir las condiciones WHERE sobre reportes_rutas (alias r).
+    Compara fecha_reporte directamente para aprovechar los índices por fecha.
+    """
+    condiciones = []
+    params = []
     
-    # Crear usuario administrador por defecto si no existe
-    existing_admin = cursor.execute(
-        'SELECT id FROM users WHERE username = ?', ('admin',)
-    ).fetchone()
+    if fecha:
+        condiciones.append('r.fecha_reporte = ?')
+        params.append(normalizar_fecha(fecha))
     
-    if not existing_admin:
-        admin_password_hash = generate_password_hash('admin123')
-        cursor.execute('''
-            INSERT INTO users (username, email, password_hash, role)
-            VALUES (?, ?, ?, ?)
-        ''', ('admin', 'admin@sistema-rutas.com', admin_password_hash, 'super_admin'))
-        
-        # Crear supervisor de ejemplo
-        supervisor_password_hash = generate_password_hash('supervisor123')
-        cursor.execute('''
-            INSERT INTO users (username, email, password_hash, role, created_by)
-            VALUES (?, ?, ?, ?, ?)
-        ''', ('supervisor', 'supervisor@sistema-rutas.com', supervisor_password_hash, 'supervisor', 1))
-        
-        print("✅ Usuarios por defecto creados:")
-        print("   Admin: admin / admin123")
-        print("   Supervisor: supervisor / supervisor123")
+    if contratista:
+        condiciones.append('r.contratista = ?')
+        params.append(contratista)
     
-    conn.commit()
-    conn.close()
+    where = ' AND '.join(condiciones) if condiciones else '1=1'
+    return where, params
 
-def load_rutas_from_excel():
-    """Cargar rutas desde el archivo Excel"""
+def codificar_cursor(reporte):
+    """Cursor opaco para paginar por (hora_reporte, id)"""
+    valor = json.dumps([reporte['hora_reporte'], reporte['id']])
+    return base64.urlsafe_b64encode(valor.encode('utf-8')).decode('ascii')
+
+def decodificar_cursor(cursor):
+    """Recuperar (hora_reporte, id) de un cursor; None si no es válido"""
+    if not cursor:
+        return None
     try:
-        # Leer el archivo Excel
-        df = pd.read_excel('DB_Rutas.xlsx')
-        
+        hora_reporte, reporte_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(hora_reporte), int(reporte_id)
+    except (ValueError, TypeError):
+        return None
+
+def init_db():
+    """Inicializar la base de datos (migraciones versionadas y usuarios por defecto)"""
+    print(f"🔄 Inicializando base de datos en: {DATABASE}")
+    inicializar_base_datos(DATABASE)
+
+def load_rutas_from_excel(forzar=False):
+    """
+    Sincronizar la tabla rutas con el archivo Excel.
+    Devuelve los contadores del cambio aplicado (con omitida=True si el
+    archivo no cambió desde la última carga), o None si hubo un error.
+    """
+    try:
+        # Si el archivo es el mismo de la última carga no se vuelve a leer
         conn = get_db_connection()
-        cursor = conn.cursor()
+        sin_cambios, huella = excel_sin_cambios(conn, ARCHIVO_EXCEL)
+        if sin_cambios and not forzar:
+            guardar_huella_excel(conn, huella)  # mtime nuevo tras una copia idéntica
+            conn.commit()
+            conn.close()
+            print("✅ DB_Rutas.xlsx sin cambios desde la última carga, se omite la lectura")
+            return {'insertadas': 0, 'actualizadas': 0, 'retiradas': 0,
+                    'sin_cambios': None, 'omitida': True}
+        conn.close()
         
-        # Verificar si hay reportes que dependen de rutas
-        reportes_count = cursor.execute('SELECT COUNT(*) FROM reportes_rutas').fetchone()[0]
+        # pandas/openpyxl solo se importan cuando de verdad hay que leer el Excel
+        from importar_rutas import leer_excel, normalizar_rutas, reportar_rechazadas, sincronizar_rutas
         
-        if reportes_count > 0:
-            print(f"⚠️ No se pueden limpiar rutas: hay {reportes_count} reportes asociados")
-            conn.close()
-            return False
-            
-        # Limpiar tabla de rutas existente
-        cursor.execute('DELETE FROM rutas')
-        
-        # Insertar datos desde Excel
-        loaded_count = 0
-        for _, row in df.iterrows():
-            try:
-                ruta = str(row['RUTA']) if pd.notna(row['RUTA']) else ''
-                codigo = str(row['CODIGO']) if pd.notna(row['CODIGO']) else ''
-                placa = str(row['PLACA']) if pd.notna(row['PLACA']) else ''
-                supervisor = str(row['SUPERVISOR']) if pd.notna(row['SUPERVISOR']) else ''
-                contratista = str(row['CONTRATISTA']) if pd.notna(row['CONTRATISTA']) else ''
-                tipo = str(row['TIPO']) if pd.notna(row['TIPO']) else ''
-                
-                # Verificar que contratista no sea vacío (es NOT NULL)
-                if not contratista:
-                    print(f"⚠️ Saltando ruta sin contratista: {ruta}")
-                    continue
-                
-                cursor.execute('''
-                    INSERT INTO rutas (ruta, codigo, placa, supervisor, contratista, tipo)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (ruta, codigo, placa, supervisor, contratista, tipo))
-                
-                loaded_count += 1
-            except Exception as row_error:
-                print(f"⚠️ Error en fila {_}: {row_error}")
-                continue
+        # Leer y normalizar el archivo Excel
+        filas, rechazadas = normalizar_rutas(leer_excel(ARCHIVO_EXCEL))
         
+        # Aplicar solo las diferencias: los ids existentes se conservan y
+        # los reportes siguen enlazados a sus rutas
+        conn = get_db_connection()
+        cambios = sincronizar_rutas(conn, filas)
+        guardar_huella_excel(conn, huella)
         conn.commit()
         conn.close()
+        catalogo.invalidar()
         
-        print(f"✅ {loaded_count} rutas cargadas desde Excel")
-        return True
+        reportar_rechazadas(rechazadas)
+        print(f"✅ Rutas sincronizadas desde Excel: {cambios['insertadas']} nuevas, "
+              f"{cambios['actualizadas']} actualizadas, {cambios['retiradas']} retiradas, "
+              f"{cambios['sin_cambios']} sin cambios")
+        return cambios
         
     except Exception as e:
         print(f"❌ Error cargando rutas desde Excel: {e}")
-        return False
+        return None
+
+# La versión del esquema se revisa una sola vez por worker; después los
+# handlers asumen que las tablas existen
+esquema_verificado = False
+
+@app.before_request
+def asegurar_esquema():
+    global esquema_verificado
+    if esquema_verificado:
+        return
+    conn = get_db_connection()
+    version = version_esquema(conn)
+    conn.close()
+    if version < VERSION_ESQUEMA:
+        print(f"⚠️ Esquema en versión {version} (se espera {VERSION_ESQUEMA}), migrando...")
+        init_db()
+    esquema_verificado = True
 
 @app.route('/')
 def index():
     """Página principal con el formulario para reportar rutas"""
     try:
-        # Inicializar la base de datos si no existe
-        if not os.path.exists(DATABASE):
-            init_db()
-            
-        # Verificar que existe la tabla rutas
-        conn = get_db_connection()
-        
-        # Verificar si la tabla existe
-        table_exists = conn.execute('''
-            SELECT count(name) FROM sqlite_master 
-            WHERE type='table' AND name='rutas'
-        ''').fetchone()[0]
-        
-        if table_exists == 0:
-            # La tabla no existe, inicializar la BD
-            conn.close()
-            print("⚠️ La tabla rutas no existe, inicializando base de datos...")
-            init_db()
-            conn = get_db_connection()
-        
-        # Obtener contratistas únicos para el dropdown
-        contratistas = conn.execute('''
-            SELECT DISTINCT contratista 
-            FROM rutas 
-            WHERE contratista != '' 
-            ORDER BY contratista
-        ''').fetchall()
-        conn.close()
+        # Contratistas únicos para el dropdown (desde el catálogo en memoria)
+        contratistas = [{'contratista': nombre} for nombre in catalogo.contratistas()]
         
         return render_template('index.html', contratistas=contratistas)
     except Exception as e:
         print(f"❌ ERROR en index(): {e}")
         return render_template('index.html', contratistas=[])
 
+# Versión del cache del service worker (cambiarla al modificar sw.js o index.html)
+SW_VERSION = '3'
+
+# CDNs de Bootstrap, Font Awesome y jQuery que el service worker guarda en cache
+ORIGENES_CDN = ['https://cdn.jsdelivr.net', 'https://cdnjs.cloudflare.com', 'https://code.jquery.com']
+
+@app.route('/sw.js')
+def service_worker():
+    """Service worker del formulario (servido desde la raíz para controlar todo el sitio)"""
+    response = Response(render_template('sw.js', version=SW_VERSION, origenes_cdn=ORIGENES_CDN),
+                        mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    # La CSP de este script rige los fetch() del propio worker: con el
+    # connect-src 'self' general no podría descargar los archivos de los CDN
+    response.headers['Content-Security-Policy'] = '; '.join([
+        "default-src 'none'",
+        "script-src 'self'",
+        "connect-src 'self' " + ' '.join(ORIGENES_CDN),
+    ])
+    return response
+
+@app.route('/cola_offline.js')
+def cola_offline_js():
+    """Cola IndexedDB de reportes sin conexión (compartida con el service worker)"""
+    response = Response(render_template('cola_offline.js'), mimetype='application/javascript')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
 @app.route('/get_rutas/<contratista>')
 def get_rutas(contratista):
     """API para obtener rutas de un contratista específico"""
-    conn = get_db_connection()
-    rutas = conn.execute('''
-        SELECT id, ruta, codigo, supervisor, placa, tipo
-        FROM rutas 
-        WHERE contratista = ?
-        ORDER BY ruta
-    ''', (contratista,)).fetchall()
-    conn.close()
-    
-    rutas_list = []
-    for ruta in rutas:
-        rutas_list.append({
-            'id': ruta['id'],
-            'ruta': ruta['ruta'],
-            'codigo': ruta['codigo'],
-            'supervisor': ruta['supervisor'],
-            'placa': ruta['placa'],
-            'tipo': ruta['tipo']
-        })
-    
-    return jsonify(rutas_list)
+    # El ETag cambia solo cuando se recarga el catálogo de rutas
+    etag = f'rutas-{catalogo.generacion}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(catalogo.rutas_de(contratista))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'private, max-age={CATALOGO_MAX_AGE}'
+    return response
+
+CAMPOS_REQUERIDOS_REPORTE = ['contratista', 'ruta_id', 'clientes_pendientes',
+                             'cajas_camion', 'hora_aproximada_ingreso']
+
+def validar_reporte(data):
+    """
+    Validar un reporte del formulario.
+    Devuelve (valores, None) con los campos numéricos convertidos, o (None, error).
+    """
+    if not isinstance(data, dict):
+        return None, 'Reporte inválido'
+    for field in CAMPOS_REQUERIDOS_REPORTE:
+        if not data.get(field):
+            return None, f'Campo requerido: {field}'
+    try:
+        datetime.strptime(data['hora_aproximada_ingreso'], '%H:%M')
+    except (TypeError, ValueError):
+        return None, 'Formato de hora inválido. Use HH:MM'
+    try:
+        valores = dict(data,
+                       ruta_id=int(data['ruta_id']),
+                       clientes_pendientes=int(data['clientes_pendientes']),
+                       cajas_camion=int(data['cajas_camion']))
+    except (TypeError, ValueError):
+        return None, 'ruta_id, clientes_pendientes y cajas_camion deben ser números enteros'
+    clave = data.get('clave_idempotencia')
+    if clave is not None and not (isinstance(clave, str) and 0 < len(clave) <= 100):
+        return None, 'clave_idempotencia inválida'
+    return valores, None
 
 @app.route('/submit_reporte', methods=['POST'])
 def submit_reporte():
     """Procesar el envío del reporte de ruta"""
     try:
-        data = request.get_json()
-        
-        # Validar datos requeridos
-        required_fields = ['contratista', 'ruta_id', 'clientes_pendientes', 
-                          'cajas_camion', 'hora_aproximada_ingreso']
-        
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({'success': False, 'error': f'Campo requerido: {field}'}), 400
-        
-        # Validar formato de hora
-        try:
-            hora_obj = datetime.strptime(data['hora_aproximada_ingreso'], '%H:%M').time()
-        except ValueError:
-            return jsonify({'success': False, 'error': 'Formato de hora inválido. Use HH:MM'}), 400
-        
-        # Obtener información de la ruta
-        conn = get_db_connection()
-        ruta_info = conn.execute(
-            'SELECT ruta FROM rutas WHERE id = ?', 
-            (data['ruta_id'],)
-        ).fetchone()
-        
-        if not ruta_info:
-            conn.close()
-            return jsonify({'success': False, 'error': 'Ruta no encontrada'}), 404
-        
-        # Insertar reporte
-        cursor = conn.cursor()
+        # Validar datos requeridos, formato de hora y campos numéricos
+        data, error = validar_reporte(request.get_json())
+        if error:
+            return jsonify({'success': False, 'error': error}), 400
         
         # Obtener fecha y hora actual del servidor con ajuste de zona horaria (GMT-6 para Centroamérica)
         ahora = get_now()
@@ -434,55 +494,215 @@ def submit_reporte():
         # Formato de hora y fecha completa para la hora exacta de envío
         hora_actual = ahora.strftime('%Y-%m-%d %H:%M:%S')
         
-        cursor.execute('''
-            INSERT INTO reportes_rutas 
-            (contratista, ruta_id, ruta_codigo, clientes_pendientes, 
-             cajas_camion, hora_aproximada_ingreso, ubicacion_exacta, 
-             latitud, longitud, hora_exacta_envio, comentarios, reportado_por,
-             fecha_reporte, hora_reporte)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            data['contratista'],
-            data['ruta_id'],
-            ruta_info['ruta'],
-            int(data['clientes_pendientes']),
-            int(data['cajas_camion']),
-            data['hora_aproximada_ingreso'],
-            data.get('ubicacion_exacta', ''),
-            data.get('latitud'),
-            data.get('longitud'),
-            hora_actual,  # Hora exacta de envío (formato completo)
-            data.get('comentarios', ''),
-            data.get('reportado_por', 'Sistema'),
-            fecha_actual,  # Fecha de reporte explícita
-            hora_actual   # Hora de reporte explícita
-        ))
+        # Una sola sentencia: el contratista, el código de ruta y el supervisor se
+        # toman de rutas dentro del mismo INSERT (no del cliente), y si la ruta no
+        # existe o está retirada no se inserta ninguna fila
+        conn = get_db_connection()
+        try:
+            cursor = conn.execute('''
+                INSERT INTO reportes_rutas 
+                (contratista, ruta_id, ruta_codigo, clientes_pendientes, 
+                 cajas_camion, hora_aproximada_ingreso, ubicacion_exacta, 
+                 latitud, longitud, hora_exacta_envio, comentarios, reportado_por,
+                 fecha_reporte, hora_reporte, clave_idempotencia, supervisor)
+                SELECT contratista, id, ruta, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, supervisor
+                FROM rutas WHERE id = ? AND activa = 1
+            ''', (
+                data['clientes_pendientes'],
+                data['cajas_camion'],
+                data['hora_aproximada_ingreso'],
+                data.get('ubicacion_exacta', ''),
+                data.get('latitud'),
+                data.get('longitud'),
+                hora_actual,  # Hora exacta de envío (formato completo)
+                data.get('comentarios', ''),
+                data.get('reportado_por', 'Sistema'),
+                fecha_actual,  # Fecha de reporte explícita
+                hora_actual,  # Hora de reporte explícita
+                data.get('clave_idempotencia'),
+                data['ruta_id']
+            ))
+        except sqlite3.IntegrityError:
+            # Reintento de un reporte ya recibido (misma clave_idempotencia)
+            existente = conn.execute(
+                'SELECT id, fecha_reporte FROM reportes_rutas WHERE clave_idempotencia = ?',
+                (data.get('clave_idempotencia'),)
+            ).fetchone()
+            conn.close()
+            if not existente:
+                raise
+            return jsonify({
+                'success': True,
+                'message': 'Reporte ya recibido anteriormente',
+                'reporte_id': existente['id'],
+                'fecha_guardada': existente['fecha_reporte'],
+                'duplicado': True
+            })
+        
+        if cursor.rowcount == 0:
+            conn.close()
+            return jsonify({'success': False, 'error': 'Ruta no encontrada'}), 404
         
         reporte_id = cursor.lastrowid
         conn.commit()
-        
-        # Verificar que el reporte se guardó correctamente
-        verificacion = conn.execute(
-            'SELECT id, fecha_reporte, hora_reporte FROM reportes_rutas WHERE id = ?', 
-            (reporte_id,)
-        ).fetchone()
-        
         conn.close()
         
-        print(f"✅ REPORTE GUARDADO - ID: {reporte_id}")
-        print(f"   Contratista: {data['contratista']}")
-        print(f"   Ruta: {ruta_info['ruta']}")
-        print(f"   Fecha guardada: {verificacion['fecha_reporte'] if verificacion else 'ERROR'}")
-        print(f"   Hora guardada: {verificacion['hora_reporte'] if verificacion else 'ERROR'}")
+        logger.info('reporte_guardado id=%s ruta_id=%s fecha=%s hora=%s',
+                    reporte_id, data['ruta_id'], fecha_actual, hora_actual)
         
         return jsonify({
             'success': True, 
             'message': 'Reporte de ruta enviado exitosamente',
             'reporte_id': reporte_id,
-            'fecha_guardada': verificacion['fecha_reporte'] if verificacion else None
+            'fecha_guardada': fecha_actual
         })
         
     except Exception as e:
+        logger.exception('error_submit_reporte')
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Envío por lotes desde dispositivos que estuvieron sin cobertura
+MAX_REPORTES_LOTE = int(os.environ.get('MAX_REPORTES_LOTE', 200))
+
+# Días de diferencia admitidos entre la captura en el dispositivo y la fecha del servidor
+MARGEN_DIAS_CAPTURA = 1
+
+@app.route('/submit_reportes_batch', methods=['POST'])
+def submit_reportes_batch():
+    """
+    Recibir varios reportes en un solo request.
+    Cada reporte trae una clave_idempotencia generada por el cliente: si el
+    lote se reintenta, los reportes ya guardados se devuelven como duplicados.
+    """
+    try:
+        data = request.get_json(silent=True)
+        reportes = data.get('reportes') if isinstance(data, dict) else data
+        if not isinstance(reportes, list) or not reportes:
+            return jsonify({'success': False, 'error': 'Se esperaba una lista de reportes'}), 400
+        if len(reportes) > MAX_REPORTES_LOTE:
+            return jsonify({'success': False,
+                            'error': f'Máximo {MAX_REPORTES_LOTE} reportes por lote'}), 400
+        
+        # Validación de todo el lote contra el catálogo de rutas en una pasada
+        hoy = get_now().date()
+        resultados = [None] * len(reportes)
+        validos = {}  # clave_idempotencia -> (indice, valores)
+        for indice, reporte in enumerate(reportes):
+            valores, error = validar_reporte(reporte)
+            clave = reporte.get('clave_idempotencia') if isinstance(reporte, dict) else None
+            if not error and not (isinstance(clave, str) and 0 < len(clave) <= 100):
+                error = 'Campo requerido: clave_idempotencia'
+            if not error and clave in validos:
+                error = 'clave_idempotencia repetida en el lote'
+            if not error:
+                # Sin hora del dispositivo el reporte es del día en que llega
+                # (nunca se toma una fecha_reporte enviada por el cliente)
+                valores['fecha_reporte'] = hoy.strftime('%Y-%m-%d')
+            if not error and valores.get('hora_exacta_envio'):
+                # Hora en que el dispositivo guardó el reporte sin conexión: el
+                # reporte pertenece a ese día, no al día en que se reenvió
+                try:
+                    capturado = datetime.strptime(valores['hora_exacta_envio'], '%Y-%m-%d %H:%M:%S').date()
+                except (TypeError, ValueError):
+                    error = 'Formato de hora_exacta_envio inválido. Use YYYY-MM-DD HH:MM:SS'
+                else:
+                    if abs((capturado - hoy).days) > MARGEN_DIAS_CAPTURA:
+                        error = f'hora_exacta_envio fuera de rango (máximo {MARGEN_DIAS_CAPTURA} día de diferencia)'
+                    else:
+                        valores['fecha_reporte'] = capturado.strftime('%Y-%m-%d')
+            if error:
+                resultados[indice] = {'indice': indice, 'clave_idempotencia': clave,
+                                      'estado': 'error', 'error': error}
+                continue
+            validos[clave] = (indice, valores)
+        
+        rutas = {}
+        for clave, (indice, valores) in validos.items():
+            ruta = catalogo.ruta(valores['ruta_id'])
+            if ruta:
+                rutas[valores['ruta_id']] = (ruta['ruta'], ruta['supervisor'], ruta['contratista'])
+        
+        conn = get_db_connection()
+        # Rutas que el catálogo de este worker aún no conoce
+        faltantes = {v['ruta_id'] for _, v in validos.values()} - set(rutas)
+        if faltantes:
+            marcadores = ','.join('?' * len(faltantes))
+            for fila in conn.execute(f'SELECT id, ruta, supervisor, contratista FROM rutas '
+                                     f'WHERE id IN ({marcadores}) AND activa = 1', tuple(faltantes)):
+                rutas[fila['id']] = (fila['ruta'], fila['supervisor'], fila['contratista'])
+        
+        for clave in [c for c, (_, v) in validos.items() if v['ruta_id'] not in rutas]:
+            indice, _ = validos.pop(clave)
+            resultados[indice] = {'indice': indice, 'clave_idempotencia': clave,
+                                  'estado': 'error', 'error': 'Ruta no encontrada'}
+        
+        creados = 0
+        if validos:
+            hora_actual = get_now().strftime('%Y-%m-%d %H:%M:%S')
+            claves = list(validos)
+            marcadores = ','.join('?' * len(claves))
+            
+            # Lock de escritura desde el inicio: la consulta de claves
+            # existentes y la inserción forman una sola transacción
+            conn.execute('BEGIN IMMEDIATE')
+            existentes = {fila['clave_idempotencia']: fila['id'] for fila in conn.execute(
+                f'SELECT id, clave_idempotencia FROM reportes_rutas WHERE clave_idempotencia IN ({marcadores})',
+                claves
+            )}
+            nuevos = [(clave, validos[clave][1]) for clave in claves if clave not in existentes]
+            conn.executemany('''
+                INSERT INTO reportes_rutas 
+                (contratista, ruta_id, ruta_codigo, clientes_pendientes, 
+                 cajas_camion, hora_aproximada_ingreso, ubicacion_exacta, 
+                 latitud, longitud, hora_exacta_envio, comentarios, reportado_por,
+                 fecha_reporte, hora_reporte, clave_idempotencia, supervisor)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(
+                rutas[v['ruta_id']][2],
+                v['ruta_id'],
+                rutas[v['ruta_id']][0],
+                v['clientes_pendientes'],
+                v['cajas_camion'],
+                v['hora_aproximada_ingreso'],
+                v.get('ubicacion_exacta', ''),
+                v.get('latitud'),
+                v.get('longitud'),
+                v.get('hora_exacta_envio') or hora_actual,
+                v.get('comentarios', ''),
+                v.get('reportado_por', 'Sistema'),
+                v['fecha_reporte'],
+                hora_actual,
+                clave,
+                rutas[v['ruta_id']][1]
+            ) for clave, v in nuevos])
+            ids = {fila['clave_idempotencia']: fila['id'] for fila in conn.execute(
+                f'SELECT id, clave_idempotencia FROM reportes_rutas WHERE clave_idempotencia IN ({marcadores})',
+                claves
+            )}
+            conn.commit()
+            
+            for clave, (indice, _) in validos.items():
+                duplicado = clave in existentes
+                resultados[indice] = {'indice': indice, 'clave_idempotencia': clave,
+                                      'estado': 'duplicado' if duplicado else 'creado',
+                                      'reporte_id': ids.get(clave)}
+            creados = len(nuevos)
+        conn.close()
+        
+        errores = sum(1 for r in resultados if r['estado'] == 'error')
+        logger.info('lote_reportes recibidos=%s creados=%s duplicados=%s errores=%s',
+                    len(reportes), creados, len(validos) - creados, errores)
+        
+        return jsonify({
+            'success': errores == 0,
+            'creados': creados,
+            'duplicados': len(validos) - creados,
+            'errores': errores,
+            'resultados': resultados
+        })
+        
+    except Exception as e:
+        logger.exception('error_submit_reportes_batch')
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/admin')
@@ -494,98 +714,97 @@ def admin():
     fecha_filtro = request.args.get('fecha', fecha_actual)
     contratista_filtro = request.args.get('contratista', '')
     
-    # Parámetros de paginación
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 10))  # 25 reportes por página
-    offset = (page - 1) * per_page
+    # Parámetros de paginación por cursor (hora_reporte, id)
+    page = max(1, request.args.get('page', 1, type=int))  # Solo para mostrar el número de página
+    per_page = request.args.get('per_page', 10, type=int)
+    per_page = min(max(per_page, 1), MAX_POR_PAGINA)
+    cursor_despues = decodificar_cursor(request.args.get('despues'))
+    cursor_antes = decodificar_cursor(request.args.get('antes'))
     
-    conn = get_db_connection()
+    # Sin fecha (parámetro vacío) se listan todas; una fecha inválida es un error
+    fecha_normalizada = normalizar_fecha(fecha_filtro) if fecha_filtro else None
+    if fecha_filtro and fecha_normalizada is None:
+        return jsonify({'success': False, 'error': FECHA_INVALIDA}), 400
     
-    # Mostrar todas las tablas para diagnóstico
-    tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
-    print("Tablas en la base de datos:", [t[0] for t in tables])
-    
-    # Construir query base para contar total
-    count_query = '''
-        SELECT COUNT(*) 
-        FROM reportes_rutas r
-        LEFT JOIN rutas ru ON r.ruta_id = ru.id
-        WHERE 1=1
-    '''
-    count_params = []
-    
-    if fecha_filtro:
-        count_query += ' AND date(r.fecha_reporte) = date(?)'
-        count_params.append(fecha_filtro)
-    
-    if contratista_filtro:
-        count_query += ' AND r.contratista = ?'
-        count_params.append(contratista_filtro)
-    
-    # Obtener total de reportes con filtros
-    total_reportes = conn.execute(count_query, count_params).fetchone()[0]
-    print(f"Total de reportes con filtros: {total_reportes}")
+    conn = get_db_connection()
     
-    # Construir query con filtros y paginación
-    query = '''
-        SELECT r.*, ru.supervisor, ru.placa, ru.tipo
-        FROM reportes_rutas r
+    where, filtro_params = filtros_reportes(fecha_filtro, contratista_filtro)
+    tabla = archivador.tabla_reportes(conn, fecha_normalizada, fecha_normalizada)
+    
+    # Total aproximado: se cachea por filtro para no contar en cada página
+    clave_conteo = (fecha_normalizada or '', contratista_filtro)
+    total_reportes = conteo_reportes_cache.obtener(clave_conteo)
+    if total_reportes is None:
+        # El LEFT JOIN con rutas no cambia el conteo
+        total_reportes = conn.execute(f'''
+            SELECT COUNT(*) 
+            FROM {tabla} r
+            WHERE {where}
+        ''', filtro_params).fetchone()[0]
+        conteo_reportes_cache.guardar(clave_conteo, total_reportes)
+    
+    # Construir query con filtros y paginación por cursor
+    params = list(filtro_params)
+    if cursor_antes:
+        # Página anterior: registros más recientes que el cursor, en orden inverso
+        where += ' AND (r.hora_reporte, r.id) > (?, ?)'
+        params.extend(cursor_antes)
+        orden = 'ASC'
+    else:
+        if cursor_despues:
+            where += ' AND (r.hora_reporte, r.id) < (?, ?)'
+            params.extend(cursor_despues)
+        orden = 'DESC'
+    
+    # Las filas de los archivos mensuales se muestran sin acciones de edición
+    archivado = '0' if tabla == 'reportes_rutas' else 'r.archivado'
+    query = f'''
+        SELECT {COLUMNAS_REPORTE}, {archivado} AS archivado
+        FROM {tabla} r
         LEFT JOIN rutas ru ON r.ruta_id = ru.id
-        WHERE 1=1
+        WHERE {where}
+        ORDER BY r.hora_reporte {orden}, r.id {orden} LIMIT ?
     '''
-    params = []
-    
-    if fecha_filtro:
-        query += ' AND date(r.fecha_reporte) = date(?)'
-        params.append(fecha_filtro)
-    
-    if contratista_filtro:
-        query += ' AND r.contratista = ?'
-        params.append(contratista_filtro)
-    
-    query += ' ORDER BY r.hora_reporte DESC LIMIT ? OFFSET ?'
-    params.extend([per_page, offset])
-    
-    print(f"DEBUG: Ejecutando consulta con fecha_filtro={fecha_filtro}, contratista_filtro={contratista_filtro}")
-    print(f"DEBUG: Página: {page}, Por página: {per_page}, Offset: {offset}")
-    print(f"DEBUG: Query: {query}")
-    print(f"DEBUG: Params: {params}")
+    params.append(per_page + 1)  # Un registro extra indica si hay más páginas
     
     reportes = conn.execute(query, params).fetchall()
-    print(f"DEBUG: Se encontraron {len(reportes)} reportes en esta página")
+    hay_mas = len(reportes) > per_page
+    reportes = reportes[:per_page]
+    if cursor_antes:
+        reportes.reverse()
+    logger.debug('admin fecha=%s contratista=%r pagina=%s por_pagina=%s total=%s filas=%d',
+                 fecha_filtro, contratista_filtro, page, per_page, total_reportes, len(reportes))
+    
+    # Contratistas para filtro (desde el catálogo en memoria)
+    contratistas = [{'contratista': nombre} for nombre in catalogo.contratistas()]
     
-    # Obtener contratistas para filtro
-    contratistas = conn.execute('''
-        SELECT DISTINCT contratista 
-        FROM rutas
-        ORDER BY contratista
-    ''').fetchall()
+    # Watermark inicial del feed en vivo
+    stream_desde = ultimo_cambio_reportes(conn)
     
     conn.close()
     
     # Calcular información de paginación
-    total_pages = (total_reportes + per_page - 1) // per_page
-    has_prev = page > 1
-    has_next = page < total_pages
-    prev_page = page - 1 if has_prev else None
-    next_page = page + 1 if has_next else None
-    
-    # Calcular rango de páginas para mostrar
-    start_page = max(1, page - 2)
-    end_page = min(total_pages, page + 2)
+    if cursor_antes:
+        has_prev = hay_mas
+        has_next = True
+    else:
+        has_prev = cursor_despues is not None
+        has_next = hay_mas
+    if not has_prev:
+        page = 1
+    total_pages = max((total_reportes + per_page - 1) // per_page, page + (1 if has_next else 0))
     
     pagination_info = {
         'page': page,
         'per_page': per_page,
         'total': total_reportes,
         'total_pages': total_pages,
-        'has_prev': has_prev,
-        'has_next': has_next,
-        'prev_page': prev_page,
-        'next_page': next_page,
-        'start_page': start_page,
-        'end_page': end_page,
-        'pages': list(range(start_page, end_page + 1))
+        'has_prev': has_prev and bool(reportes),
+        'has_next': has_next and bool(reportes),
+        'prev_page': page - 1 if has_prev else None,
+        'next_page': page + 1 if has_next else None,
+        'prev_cursor': codificar_cursor(reportes[0]) if reportes else None,
+        'next_cursor': codificar_cursor(reportes[-1]) if reportes else None,
     }
     
     # Log de acceso al admin
@@ -596,7 +815,100 @@ def admin():
                          contratistas=contratistas,
                          fecha_filtro=fecha_filtro,
                          contratista_filtro=contratista_filtro,
-                         pagination=pagination_info)
+                         pagination=pagination_info,
+                         stream_desde=stream_desde)
+
+def ultimo_cambio_reportes(conn):
+    """Último número de secuencia del registro de cambios de reportes"""
+    return conn.execute('SELECT COALESCE(MAX(seq), 0) FROM reportes_cambios').fetchone()[0]
+
+def evento_sse(evento, datos, id_evento=None):
+    """Formatear un mensaje Server-Sent Events"""
+    mensaje = ''
+    if id_evento is not None:
+        mensaje += f'id: {id_evento}\n'
+    if evento:
+        mensaje += f'event: {evento}\n'
+    return mensaje + f'data: {json.dumps(datos)}\n\n'
+
+@app.route('/admin/stream')
+@login_required
+def admin_stream():
+    """
+    Feed en vivo del panel (Server-Sent Events).
+    Devuelve los reportes insertados, actualizados o eliminados después del
+    watermark del cliente (Last-Event-ID o ?desde=) y cierra la respuesta;
+    EventSource vuelve a conectarse tras `retry` milisegundos.
+    """
+    fecha = normalizar_fecha(request.args.get('fecha') or get_now().strftime('%Y-%m-%d'))
+    if fecha is None:
+        return jsonify({'success': False, 'error': FECHA_INVALIDA}), 400
+    contratista = request.args.get('contratista', '')
+    try:
+        desde = int(request.headers.get('Last-Event-ID') or request.args.get('desde', ''))
+    except ValueError:
+        desde = None
+    
+    conn = get_db_connection()
+    eventos = []
+    hay_mas = False
+    
+    if desde is None:
+        # Sin watermark: solo informar la posición actual
+        eventos.append(f'id: {ultimo_cambio_reportes(conn)}\n\n')
+    else:
+        query = '''
+            SELECT seq, reporte_id, tipo
+            FROM reportes_cambios
+            WHERE fecha_reporte = ? AND seq > ?
+        '''
+        params = [fecha, desde]
+        if contratista:
+            query += ' AND contratista = ?'
+            params.append(contratista)
+        query += ' ORDER BY seq LIMIT ?'
+        params.append(STREAM_MAX_CAMBIOS + 1)
+        
+        cambios = conn.execute(query, params).fetchall()
+        hay_mas = len(cambios) > STREAM_MAX_CAMBIOS
+        cambios = cambios[:STREAM_MAX_CAMBIOS]
+        
+        # Solo interesa el último cambio de cada reporte
+        ultimos = {}
+        for cambio in cambios:
+            ultimos.pop(cambio['reporte_id'], None)
+            ultimos[cambio['reporte_id']] = cambio
+        
+        vigentes = [rid for rid, c in ultimos.items() if c['tipo'] != 'eliminado']
+        filas = {}
+        if vigentes:
+            marcadores = ','.join('?' * len(vigentes))
+            filas = {fila['id']: fila for fila in conn.execute(f'''
+                SELECT {COLUMNAS_REPORTE}
+                FROM reportes_rutas r
+                LEFT JOIN rutas ru ON r.ruta_id = ru.id
+                WHERE r.id IN ({marcadores})
+            ''', vigentes)}
+        
+        for reporte_id, cambio in ultimos.items():
+            reporte = filas.get(reporte_id)
+            if reporte is None:
+                datos = {'id': reporte_id, 'tipo': 'eliminado'}
+            else:
+                datos = {
+                    'id': reporte_id,
+                    'tipo': cambio['tipo'],
+                    'html': render_template('_fila_reporte.html', reporte=reporte)
+                }
+            eventos.append(evento_sse('reporte', datos, cambio['seq']))
+    
+    conn.close()
+    
+    # Si quedaron cambios pendientes, reconectar de inmediato
+    retry = 500 if hay_mas else STREAM_RETRY_MS
+    eventos.insert(0, f'retry: {retry}\n\n')
+    return Response(''.join(eventos), mimetype='text/event-stream',
+                    headers={'X-Accel-Buffering': 'no'})
 
 @app.route('/update_reporte_status', methods=['POST'])
 @login_required
@@ -638,93 +950,216 @@ def update_reporte_status():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Columnas de la exportación: (encabezado, campo de la consulta)
+COLUMNAS_EXPORTACION = [
+    ('ID', 'id'),
+    ('Fecha', 'fecha_reporte'),
+    ('Hora Reporte', 'hora_reporte'),
+    ('Contratista', 'contratista'),
+    ('Ruta', 'ruta_codigo'),
+    ('Supervisor', 'supervisor'),
+    ('Placa', 'placa'),
+    ('Clientes Pendientes', 'clientes_pendientes'),
+    ('Cajas en Camión', 'cajas_camion'),
+    ('Hora Aprox. Ingreso', 'hora_aproximada_ingreso'),
+    ('Hora Exacta Envío', 'hora_exacta_envio'),
+    ('Ubicación Exacta', 'ubicacion_exacta'),
+    ('Comentarios', 'comentarios'),
+    ('Estado', 'estado'),
+    ('Reportado Por', 'reportado_por'),
+]
+
+# Tamaño de los bloques enviados al cliente al descargar un archivo
+TAMANO_BLOQUE_DESCARGA = 64 * 1024
+
+def rango_exportacion():
+    """Obtener (fecha_desde, fecha_hasta) de los parámetros de exportación"""
+    fecha = request.args.get('fecha') or get_now().strftime('%Y-%m-%d')
+    fecha_desde = normalizar_fecha(request.args.get('fecha_desde') or fecha)
+    fecha_hasta = normalizar_fecha(request.args.get('fecha_hasta') or fecha)
+    if not fecha_desde or not fecha_hasta:
+        raise ValueError(FECHA_INVALIDA)
+    if fecha_desde > fecha_hasta:
+        fecha_desde, fecha_hasta = fecha_hasta, fecha_desde
+    return fecha_desde, fecha_hasta
+
+def consulta_exportacion(fecha_desde, fecha_hasta, ordenar=True, tabla='reportes_rutas'):
+    """SQL y parámetros de los reportes a exportar en un rango de fechas"""
+    query = f'''
+        SELECT {COLUMNAS_REPORTE}
+        FROM {tabla} r
+        LEFT JOIN rutas ru ON r.ruta_id = ru.id
+        WHERE r.fecha_reporte BETWEEN ? AND ?
+    '''
+    if ordenar:
+        query += ' ORDER BY r.fecha_reporte, r.contratista, r.hora_aproximada_ingreso'
+    return query, (fecha_desde, fecha_hasta)
+
+def anchos_columnas_exportacion(conn, fecha_desde, fecha_hasta, tabla='reportes_rutas'):
+    """
+    Ancho de cada columna calculado con un solo agregado en SQLite.
+    En modo write-only openpyxl escribe las columnas antes que las filas,
+    así que los anchos deben conocerse antes de recorrer el cursor.
+    """
+    maximos = ', '.join(f'MAX(LENGTH(q.{campo}))' for _, campo in COLUMNAS_EXPORTACION)
+    query, params = consulta_exportacion(fecha_desde, fecha_hasta, ordenar=False, tabla=tabla)
+    fila = conn.execute(f'SELECT {maximos} FROM ({query}) q', params).fetchone()
+    return [
+        min(max(len(encabezado), largo or 0) + 2, 50)
+        for (encabezado, _), largo in zip(COLUMNAS_EXPORTACION, fila)
+    ]
+
+def enviar_archivo_por_bloques(archivo):
+    """Generador que lee un archivo temporal por bloques y lo cierra al terminar"""
+    try:
+        archivo.seek(0)
+        while True:
+            bloque = archivo.read(TAMANO_BLOQUE_DESCARGA)
+            if not bloque:
+                break
+            yield bloque
+    finally:
+        archivo.close()
+
+# Filas leídas del cursor por cada bloque en las exportaciones de texto
+FILAS_POR_BLOQUE = 500
+
+def bloques_csv(lotes):
+    """Generador de bloques CSV (encabezado + un bloque por lote de filas)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([encabezado for encabezado, _ in COLUMNAS_EXPORTACION])
+    for filas in lotes:
+        writer.writerows([reporte[campo] for _, campo in COLUMNAS_EXPORTACION] for reporte in filas)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def bloques_jsonl(lotes):
+    """Generador de bloques JSON Lines (un objeto por reporte)"""
+    for filas in lotes:
+        yield ''.join(json.dumps(dict(reporte), ensure_ascii=False) + '\n' for reporte in filas)
+
+# Formatos de texto de la exportación: (generador, mimetype)
+FORMATOS_TEXTO = {
+    'csv': (bloques_csv, 'text/csv'),
+    'jsonl': (bloques_jsonl, 'application/x-ndjson'),
+}
+
+def exportar_texto(formato, fecha_desde, fecha_hasta, sufijo):
+    """
+    Exportación en streaming (CSV o JSON Lines): las filas pasan del cursor
+    a la respuesta por lotes, con memoria constante sin importar el rango.
+    """
+    generador, mimetype = FORMATOS_TEXTO[formato]
+    conn = get_db_connection()
+    tabla = archivador.tabla_reportes(conn, fecha_desde, fecha_hasta)
+    query, params = consulta_exportacion(fecha_desde, fecha_hasta, tabla=tabla)
+    cursor = conn.execute(query, params)
+    usuario_id = current_user.id
+    total = 0
+    
+    def lotes():
+        nonlocal total
+        while True:
+            filas = cursor.fetchmany(FILAS_POR_BLOQUE)
+            if not filas:
+                break
+            total += len(filas)
+            yield filas
+    
+    def generar():
+        try:
+            yield from generador(lotes())
+        finally:
+            conn.close()
+        log_activity(usuario_id, 'export_reportes',
+                     details=f'Exportó {total} reportes ({formato}) del {fecha_desde} al {fecha_hasta}')
+    
+    ceder_conexion(conn)
+    response = Response(stream_with_context(generar()), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=reportes_rutas_{sufijo}.{formato}'
+    return response
+
 @app.route('/export_reportes')
 @login_required
 def export_reportes():
-    """Exportar reportes a Excel"""
-    from flask import make_response
-    from io import BytesIO
-    from datetime import datetime
+    """
+    Exportar reportes de un día o de un rango fecha_desde/fecha_hasta.
+    format=xlsx (por defecto), csv o jsonl.
+    """
+    import tempfile
     
     try:
+        fecha_desde, fecha_hasta = rango_exportacion()
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        formato = request.args.get('format', 'xlsx').lower()
+        if formato != 'xlsx' and formato not in FORMATOS_TEXTO:
+            raise ValueError(f'Formato de exportación no soportado: {formato}')
+        
+        if fecha_desde == fecha_hasta:
+            titulo = f"Reportes Rutas {fecha_desde}"
+            sufijo = fecha_desde.replace('-', '')
+        else:
+            titulo = f"{fecha_desde} a {fecha_hasta}"
+            sufijo = f"{fecha_desde.replace('-', '')}_{fecha_hasta.replace('-', '')}"
+        
+        if formato in FORMATOS_TEXTO:
+            return exportar_texto(formato, fecha_desde, fecha_hasta, sufijo)
+        
         from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
         from openpyxl.styles import Font, PatternFill, Alignment
-        
-        fecha_filtro = request.args.get('fecha', get_now().strftime('%Y-%m-%d'))
+        from openpyxl.utils import get_column_letter
         
         conn = get_db_connection()
-        reportes = conn.execute('''
-            SELECT r.*, ru.supervisor, ru.placa, ru.tipo
-            FROM reportes_rutas r
-            LEFT JOIN rutas ru ON r.ruta_id = ru.id
-            WHERE DATE(r.fecha_reporte) = ?
-            ORDER BY r.contratista, r.hora_aproximada_ingreso
-        ''', (fecha_filtro,)).fetchall()
-        conn.close()
+        tabla = archivador.tabla_reportes(conn, fecha_desde, fecha_hasta)
+        anchos = anchos_columnas_exportacion(conn, fecha_desde, fecha_hasta, tabla)
+        
+        # Workbook en modo write-only: las filas se escriben a disco a medida que se agregan
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(title=titulo)
+        for col, ancho in enumerate(anchos, 1):
+            ws.column_dimensions[get_column_letter(col)].width = ancho
         
-        # Crear workbook y worksheet
-        wb = Workbook()
-        ws = wb.active
-        ws.title = f"Reportes Rutas {fecha_filtro}"
-        
-        # Encabezados
-        headers = [
-            'ID', 'Fecha', 'Hora Reporte', 'Contratista', 'Ruta', 'Supervisor',
-            'Placa', 'Clientes Pendientes', 'Cajas en Camión', 'Hora Aprox. Ingreso',
-            'Hora Exacta Envío', 'Ubicación Exacta', 'Comentarios', 'Estado', 'Reportado Por'
-        ]
-        
-        # Agregar encabezados con estilo
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
+        # Encabezados con estilo
+        encabezados = []
+        for encabezado, _ in COLUMNAS_EXPORTACION:
+            cell = WriteOnlyCell(ws, value=encabezado)
             cell.font = Font(bold=True, color="FFFFFF")
             cell.fill = PatternFill(start_color="2F5496", end_color="2F5496", fill_type="solid")
             cell.alignment = Alignment(horizontal="center")
+            encabezados.append(cell)
+        ws.append(encabezados)
         
-        # Agregar datos
-        for row_idx, reporte in enumerate(reportes, 2):
-            ws.cell(row=row_idx, column=1, value=reporte['id'])
-            ws.cell(row=row_idx, column=2, value=reporte['fecha_reporte'])
-            ws.cell(row=row_idx, column=3, value=reporte['hora_reporte'])
-            ws.cell(row=row_idx, column=4, value=reporte['contratista'])
-            ws.cell(row=row_idx, column=5, value=reporte['ruta_codigo'])
-            ws.cell(row=row_idx, column=6, value=reporte['supervisor'] or '')
-            ws.cell(row=row_idx, column=7, value=reporte['placa'] or '')
-            ws.cell(row=row_idx, column=8, value=reporte['clientes_pendientes'])
-            ws.cell(row=row_idx, column=9, value=reporte['cajas_camion'])
-            ws.cell(row=row_idx, column=10, value=reporte['hora_aproximada_ingreso'])
-            ws.cell(row=row_idx, column=11, value=reporte['hora_exacta_envio'] or '')
-            ws.cell(row=row_idx, column=12, value=reporte['ubicacion_exacta'] or '')
-            ws.cell(row=row_idx, column=13, value=reporte['comentarios'] or '')
-            ws.cell(row=row_idx, column=14, value=reporte['estado'])
-            ws.cell(row=row_idx, column=15, value=reporte['reportado_por'] or '')
-        
-        # Autoajustar columnas
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Guardar en memoria
-        excel_buffer = BytesIO()
-        wb.save(excel_buffer)
-        excel_buffer.seek(0)
+        # Agregar datos recorriendo el cursor sin cargarlo completo en memoria
+        query, params = consulta_exportacion(fecha_desde, fecha_hasta, tabla=tabla)
+        total = 0
+        for reporte in conn.execute(query, params):
+            ws.append([reporte[campo] for _, campo in COLUMNAS_EXPORTACION])
+            total += 1
+        conn.close()
+        
+        # Guardar en un archivo temporal y enviarlo por bloques
+        archivo = tempfile.TemporaryFile()
+        wb.save(archivo)
+        tamano = archivo.tell()
         
         # Log de actividad
-        log_activity(current_user.id, 'export_reportes', details=f'Exportó {len(reportes)} reportes del {fecha_filtro}')
+        log_activity(current_user.id, 'export_reportes',
+                     details=f'Exportó {total} reportes del {fecha_desde} al {fecha_hasta}')
         
         # Crear respuesta
-        response = make_response(excel_buffer.getvalue())
-        filename = f"reportes_rutas_{fecha_filtro.replace('-', '')}.xlsx"
+        response = Response(enviar_archivo_por_bloques(archivo),
+                            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        filename = f"reportes_rutas_{sufijo}.xlsx"
         response.headers['Content-Disposition'] = f'attachment; filename={filename}'
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        response.headers['Content-Length'] = str(tamano)
         return response
         
     except Exception as e:
@@ -798,19 +1233,11 @@ def logout():
     return redirect(url_for('login'))
 
 def log_activity(user_id, action, target_type=None, target_id=None, details=None):
-    """Registrar actividad del usuario"""
+    """Registrar actividad del usuario (se encola y se escribe en segundo plano)"""
     try:
-        conn = get_db_connection()
         # Obtener IP del cliente
         ip_address = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
-        
-        conn.execute('''
-            INSERT INTO activity_log (user_id, action, target_type, target_id, details, ip_address)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (user_id, action, target_type, target_id, details, ip_address))
-        
-        conn.commit()
-        conn.close()
+        registro_actividad.registrar(user_id, action, target_type, target_id, details, ip_address)
     except Exception as e:
         print(f"Error logging activity: {e}")
 
@@ -835,42 +1262,320 @@ def require_role(role):
 @login_required
 @require_role('admin')
 def reload_rutas():
-    """Recargar rutas desde el archivo Excel"""
-    if load_rutas_from_excel():
-        flash('Rutas recargadas exitosamente desde Excel', 'success')
-        log_activity(current_user.id, 'reload_rutas', details='Rutas recargadas desde Excel')
+    """Recargar rutas desde el archivo Excel (?force=1 lo lee aunque no haya cambiado)"""
+    cambios = load_rutas_from_excel(forzar=request.args.get('force') == '1')
+    if cambios and cambios.get('omitida'):
+        flash('El archivo Excel no cambió desde la última carga; use force=1 para recargarlo de todos modos', 'info')
+    elif cambios:
+        resumen = (f"{cambios['insertadas']} nuevas, {cambios['actualizadas']} actualizadas, "
+                   f"{cambios['retiradas']} retiradas")
+        flash(f'Rutas recargadas exitosamente desde Excel ({resumen})', 'success')
+        log_activity(current_user.id, 'reload_rutas', details=f'Rutas recargadas desde Excel: {resumen}')
     else:
         flash('Error recargando rutas desde Excel', 'error')
     
     return redirect(url_for('admin'))
 
+# Campos disponibles en /api/reportes (?fields=) y su expresión SQL
+CAMPOS_API_REPORTES = {
+    'id': 'r.id',
+    'contratista': 'r.contratista',
+    'ruta_id': 'r.ruta_id',
+    'ruta_codigo': 'r.ruta_codigo',
+    'clientes_pendientes': 'r.clientes_pendientes',
+    'cajas_camion': 'r.cajas_camion',
+    'hora_aproximada_ingreso': 'r.hora_aproximada_ingreso',
+    'ubicacion_exacta': 'r.ubicacion_exacta',
+    'latitud': 'r.latitud',
+    'longitud': 'r.longitud',
+    'hora_exacta_envio': 'r.hora_exacta_envio',
+    'comentarios': 'r.comentarios',
+    'fecha_reporte': 'r.fecha_reporte',
+    'hora_reporte': 'r.hora_reporte',
+    'estado': 'r.estado',
+    'reportado_por': 'r.reportado_por',
+    'supervisor': 'r.supervisor',
+    'placa': 'ru.placa',
+    'tipo': 'ru.tipo',
+}
+
+# Columnas de un reporte en el panel, el stream y la exportación. El
+# supervisor es el guardado en el reporte (el de la ruta al momento de
+# enviarlo), igual que en el resumen y los agregados
+COLUMNAS_REPORTE = ', '.join(f'{expresion} AS {campo}' for campo, expresion in CAMPOS_API_REPORTES.items())
+
+# Tamaño de página de /api/reportes
+API_LIMITE_DEFECTO = 500
+API_LIMITE_MAXIMO = 1000
+
+def etag_reportes(conn, fecha):
+    """
+    ETag de /api/reportes: combina los parámetros de la consulta con el
+    último cambio registrado para la fecha (inserciones, estados y borrados)
+    y la generación del catálogo de rutas (supervisor, placa, tipo).
+    """
+    ultimo_cambio = conn.execute(
+        'SELECT MAX(seq) FROM reportes_cambios WHERE fecha_reporte = ?', (fecha,)
+    ).fetchone()[0]
+    clave = f'{request.query_string.decode("utf-8", "replace")}|{fecha}|{ultimo_cambio}|{catalogo.generacion}'
+    return hashlib.sha1(clave.encode('utf-8')).hexdigest()
+
+def json_array_por_bloques(lotes, campos):
+    """Codificar un arreglo JSON por bloques a medida que se leen las filas"""
+    yield '['
+    primero = True
+    for filas in lotes:
+        bloque = ','.join(json.dumps({campo: fila[campo] for campo in campos}) for fila in filas)
+        yield bloque if primero else ',' + bloque
+        primero = False
+    yield ']'
+
 @app.route('/api/reportes')
 def api_reportes():
-    """API para obtener reportes"""
-    fecha = request.args.get('fecha', get_now().strftime('%Y-%m-%d'))
+    """
+    API para obtener reportes.
+    Parámetros: fecha, contratista, fields (lista separada por comas),
+    since_id (solo reportes con id mayor), limit y cursor (paginación).
+    Responde 304 si el If-None-Match coincide con el ETag actual.
+    """
+    fecha = normalizar_fecha(request.args.get('fecha') or get_now().strftime('%Y-%m-%d'))
+    if fecha is None:
+        return jsonify({'success': False, 'error': FECHA_INVALIDA}), 400
     contratista = request.args.get('contratista', '')
+    since_id = request.args.get('since_id', type=int)
+    cursor = decodificar_cursor(request.args.get('cursor'))
+    limite = request.args.get('limit', API_LIMITE_DEFECTO, type=int)
+    limite = min(max(limite, 1), API_LIMITE_MAXIMO)
+    
+    if request.args.get('fields'):
+        campos = [campo.strip() for campo in request.args['fields'].split(',') if campo.strip()]
+        desconocidos = [campo for campo in campos if campo not in CAMPOS_API_REPORTES]
+        if desconocidos:
+            return jsonify({'success': False, 'error': f'Campos desconocidos: {", ".join(desconocidos)}'}), 400
+    else:
+        campos = list(CAMPOS_API_REPORTES)
     
     conn = get_db_connection()
     
-    query = '''
-        SELECT r.*, ru.supervisor, ru.placa, ru.tipo
-        FROM reportes_rutas r
-        LEFT JOIN rutas ru ON r.ruta_id = ru.id
-        WHERE DATE(r.fecha_reporte) = ?
+    # Respuesta condicional: si nada cambió para la fecha, 304 sin consultar reportes
+    etag = etag_reportes(conn, fecha)
+    if request.if_none_match.contains_weak(etag):
+        conn.close()
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    where, params = filtros_reportes(fecha, contratista)
+    tabla = archivador.tabla_reportes(conn, fecha, fecha)
+    if since_id is not None:
+        where += ' AND r.id > ?'
+        params.append(since_id)
+    if cursor:
+        where += ' AND (r.hora_reporte, r.id) < (?, ?)'
+        params.extend(cursor)
+    
+    # Cursor de la siguiente página (consulta solo sobre el índice)
+    siguiente = conn.execute(f'''
+        SELECT r.hora_reporte, r.id
+        FROM {tabla} r
+        WHERE {where}
+        ORDER BY r.hora_reporte DESC, r.id DESC LIMIT 2 OFFSET ?
+    ''', params + [limite - 1]).fetchall()
+    
+    # Solo hace falta el JOIN con rutas si se piden campos de la ruta
+    columnas = ', '.join(f'{CAMPOS_API_REPORTES[campo]} AS {campo}' for campo in campos)
+    join = 'LEFT JOIN rutas ru ON r.ruta_id = ru.id' if any(
+        CAMPOS_API_REPORTES[campo].startswith('ru.') for campo in campos) else ''
+    query = f'''
+        SELECT {columnas}
+        FROM {tabla} r
+        {join}
+        WHERE {where}
+        ORDER BY r.hora_reporte DESC, r.id DESC LIMIT ?
     '''
-    params = [fecha]
+    resultado = conn.execute(query, params + [limite])
+    
+    def lotes():
+        while True:
+            filas = resultado.fetchmany(FILAS_POR_BLOQUE)
+            if not filas:
+                break
+            yield filas
+    
+    def generar():
+        try:
+            yield from json_array_por_bloques(lotes(), campos)
+        finally:
+            conn.close()
+    
+    ceder_conexion(conn)
+    response = Response(stream_with_context(generar()), mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    if len(siguiente) == 2:
+        siguiente_cursor = codificar_cursor(siguiente[0])
+        args = request.args.to_dict()
+        args['cursor'] = siguiente_cursor
+        response.headers['X-Next-Cursor'] = siguiente_cursor
+        response.headers['Link'] = f'<{url_for("api_reportes", **args)}>; rel="next"'
+    return response
+
+# Columnas de reportes_daily_summary que devuelve /api/resumen
+CAMPOS_RESUMEN = ['contratista', 'reportes', 'reportes_activos', 'clientes_pendientes',
+                  'cajas_camion', 'ultima_hora_ingreso']
+
+@app.route('/api/resumen')
+@login_required
+def api_resumen():
+    """
+    Resumen diario por contratista para los tableros de supervisores.
+    Parámetros: fecha y contratista. Lee reportes_daily_summary, que los
+    triggers mantienen al día, en lugar de agregar reportes_rutas.
+    """
+    fecha = normalizar_fecha(request.args.get('fecha') or get_now().strftime('%Y-%m-%d'))
+    if fecha is None:
+        return jsonify({'success': False, 'error': FECHA_INVALIDA}), 400
+    contratista = request.args.get('contratista', '')
+    
+    conn = get_db_connection()
     
+    etag = etag_reportes(conn, fecha)
+    if request.if_none_match.contains_weak(etag):
+        conn.close()
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    query = f'''
+        SELECT {', '.join(CAMPOS_RESUMEN)}
+        FROM reportes_daily_summary
+        WHERE fecha_reporte = ?
+    '''
+    params = [fecha]
     if contratista:
-        query += ' AND r.contratista = ?'
+        query += ' AND contratista = ?'
         params.append(contratista)
+    filas = conn.execute(query + ' ORDER BY contratista', params).fetchall()
+    conn.close()
     
-    query += ' ORDER BY r.hora_reporte DESC'
+    contratistas = [dict(fila) for fila in filas]
+    totales = {campo: sum(fila[campo] for fila in contratistas)
+               for campo in ('reportes', 'reportes_activos', 'clientes_pendientes', 'cajas_camion')}
+    totales['ultima_hora_ingreso'] = max(
+        (fila['ultima_hora_ingreso'] for fila in contratistas if fila['ultima_hora_ingreso']), default=None)
+    
+    response = jsonify({
+        'success': True,
+        'fecha': fecha,
+        'contratistas': contratistas,
+        'totales': totales,
+    })
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# Opciones de /api/analytics (dimensiones de reportes_agregados)
+AGRUPACIONES_ANALYTICS = ('contratista', 'ruta', 'supervisor')
+PERIODOS_ANALYTICS = ('dia', 'semana')
+ANALYTICS_DIAS_DEFECTO = 30
+ANALYTICS_DIAS_MAXIMO = 366
+MEDIDAS_ANALYTICS = ('reportes', 'clientes_pendientes', 'cajas_camion')
+
+@app.route('/api/analytics')
+@login_required
+def api_analytics():
+    """
+    Series de tiempo para un rango de fechas.
+    Parámetros: desde, hasta (por defecto los últimos 30 días), periodo
+    (dia o semana), agrupar (contratista, ruta o supervisor) y contratista.
+    Lee reportes_agregados, que los triggers mantienen al día; con periodo
+    semana se devuelven las semanas completas (inicio en lunes) que tocan
+    el rango. El supervisor es el que tenía la ruta al enviar cada reporte.
+    """
+    hoy = get_now().date()
+    hasta = normalizar_fecha(request.args.get('hasta') or hoy.strftime('%Y-%m-%d'))
+    desde = normalizar_fecha(request.args.get('desde') or
+                             (hoy - timedelta(days=ANALYTICS_DIAS_DEFECTO - 1)).strftime('%Y-%m-%d'))
+    periodo = request.args.get('periodo', 'dia')
+    agrupar = request.args.get('agrupar', 'contratista')
+    contratista = request.args.get('contratista', '')
     
-    reportes = conn.execute(query, params).fetchall()
+    if not desde or not hasta or desde > hasta:
+        return jsonify({'success': False, 'error': 'Rango de fechas inválido (desde y hasta en formato YYYY-MM-DD)'}), 400
+    dias = (datetime.strptime(hasta, '%Y-%m-%d') - datetime.strptime(desde, '%Y-%m-%d')).days + 1
+    if dias > ANALYTICS_DIAS_MAXIMO:
+        return jsonify({'success': False, 'error': f'El rango no puede superar {ANALYTICS_DIAS_MAXIMO} días'}), 400
+    if periodo not in PERIODOS_ANALYTICS:
+        return jsonify({'success': False, 'error': f'periodo debe ser uno de: {", ".join(PERIODOS_ANALYTICS)}'}), 400
+    if agrupar not in AGRUPACIONES_ANALYTICS:
+        return jsonify({'success': False, 'error': f'agrupar debe ser uno de: {", ".join(AGRUPACIONES_ANALYTICS)}'}), 400
+    
+    inicio_desde = desde
+    if periodo == 'semana':
+        fecha_desde = datetime.strptime(desde, '%Y-%m-%d')
+        inicio_desde = (fecha_desde - timedelta(days=fecha_desde.weekday())).strftime('%Y-%m-%d')
+    
+    conn = get_db_connection()
+    
+    # ETag: cualquier inserción, cambio o borrado de reportes lo invalida
+    ultimo_cambio = ultimo_cambio_reportes(conn)
+    clave = f'{request.query_string.decode("utf-8", "replace")}|{hoy}|{ultimo_cambio}'
+    etag = hashlib.sha1(clave.encode('utf-8')).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        conn.close()
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    # Las rutas se identifican por ruta + contratista; las demás dimensiones
+    # suman todos los contratistas salvo que se filtre por uno
+    grupo = 'clave, contratista' if agrupar == 'ruta' else 'clave'
+    where = 'periodo = ? AND dimension = ? AND inicio BETWEEN ? AND ?'
+    params = [periodo, agrupar, inicio_desde, hasta]
+    if contratista:
+        where += ' AND contratista = ?'
+        params.append(contratista)
+    
+    filas = conn.execute(f'''
+        SELECT {grupo}, inicio,
+               SUM(reportes) AS reportes,
+               SUM(clientes_pendientes) AS clientes_pendientes,
+               SUM(cajas_camion) AS cajas_camion
+        FROM reportes_agregados
+        WHERE {where}
+        GROUP BY {grupo}, inicio
+        ORDER BY {grupo}, inicio
+    ''', params).fetchall()
     conn.close()
     
-    data = [dict(reporte) for reporte in reportes]
-    return jsonify(data)
+    series = []
+    actual = None
+    for fila in filas:
+        clave_serie = (fila['clave'], fila['contratista']) if agrupar == 'ruta' else fila['clave']
+        if clave_serie != actual:
+            actual = clave_serie
+            serie = {'grupo': fila['clave'], 'puntos': [], 'totales': dict.fromkeys(MEDIDAS_ANALYTICS, 0)}
+            if agrupar == 'ruta':
+                serie['contratista'] = fila['contratista']
+            series.append(serie)
+        serie['puntos'].append({'inicio': fila['inicio'], **{medida: fila[medida] for medida in MEDIDAS_ANALYTICS}})
+        for medida in MEDIDAS_ANALYTICS:
+            serie['totales'][medida] += fila[medida]
+    
+    response = jsonify({
+        'success': True,
+        'desde': desde,
+        'hasta': hasta,
+        'periodo': periodo,
+        'agrupar': agrupar,
+        'series': series,
+    })
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/crear_reporte_prueba')
 @login_required
@@ -880,7 +1585,7 @@ def crear_reporte_prueba():
         conn = get_db_connection()
         
         # Obtener una ruta existente
-        ruta = conn.execute('SELECT id, ruta, contratista FROM rutas LIMIT 1').fetchone()
+        ruta = conn.execute('SELECT id, ruta, contratista, supervisor FROM rutas LIMIT 1').fetchone()
         
         if not ruta:
             conn.close()
@@ -899,8 +1604,8 @@ def crear_reporte_prueba():
             (contratista, ruta_id, ruta_codigo, clientes_pendientes, 
              cajas_camion, hora_aproximada_ingreso, ubicacion_exacta, 
              latitud, longitud, hora_exacta_envio, comentarios, reportado_por,
-             fecha_reporte)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+             fecha_reporte, supervisor)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             ruta['contratista'],
             ruta['id'],
@@ -914,7 +1619,8 @@ def crear_reporte_prueba():
             hora_exacta_envio,
             'Reporte de prueba creado automáticamente',
             current_user.username,
-            fecha_actual
+            fecha_actual,
+            ruta['supervisor']
         ))
         
         conn.commit()
@@ -967,6 +1673,40 @@ def eliminar_reporte(reporte_id):
         print(f"Error eliminando reporte: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Token para que Prometheus lea /metrics sin sesión (Authorization: Bearer <token>)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+def metricas_autorizadas():
+    """Un administrador con sesión iniciada, o el token interno de métricas"""
+    if METRICS_TOKEN and hmac.compare_digest(request.headers.get('Authorization', ''),
+                                             f'Bearer {METRICS_TOKEN}'):
+        return True
+    return current_user.is_authenticated and current_user.is_admin()
+
+@app.route('/metrics')
+def metrics():
+    """Métricas de este worker en formato de texto de Prometheus"""
+    if not metricas_autorizadas():
+        return Response('No autorizado\n', status=401, mimetype='text/plain',
+                        headers={'WWW-Authenticate': 'Bearer'})
+    adicionales = []
+    for nombre, valor in pool_conexiones.estadisticas().items():
+        tipo = 'gauge' if nombre in ('abiertas', 'libres', 'en_uso', 'max_conexiones') else 'counter'
+        adicionales.append((f'db_pool_{nombre}', tipo, f'Pool de conexiones: {nombre}', valor))
+    for nombre, valor in registro_actividad.estadisticas().items():
+        tipo = 'gauge' if nombre == 'pendientes' else 'counter'
+        adicionales.append((f'activity_log_{nombre}', tipo, f'Log de actividades: {nombre}', valor))
+    for nombre, valor in mantenimiento.estadisticas().items():
+        tipo = 'gauge' if nombre == 'responsable' else 'counter'
+        adicionales.append((f'mantenimiento_{nombre}', tipo, f'Mantenimiento de la base: {nombre}', valor))
+    try:
+        estado = estado_base(get_db_connection(), DATABASE)
+    except sqlite3.Error:
+        estado = {}
+    for nombre, valor in estado.items():
+        adicionales.append((f'db_{nombre}', 'gauge', f'Archivo de la base: {nombre}', valor))
+    return Response(metricas.exportar(adicionales), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health')
 def health_check():
     """Endpoint simple para verificar que la app está funcionando"""
@@ -974,7 +1714,10 @@ def health_check():
         "status": "ok",
         "timestamp": get_now().strftime('%Y-%m-%d %H:%M:%S'),
         "timezone": "America/Guatemala (GMT-6)",
-        "environment": os.environ.get('ENVIRONMENT', 'production')
+        "environment": os.environ.get('ENVIRONMENT', 'production'),
+        "db_pool": pool_conexiones.estadisticas(),
+        "activity_log": registro_actividad.estadisticas(),
+        "mantenimiento": mantenimiento.estadisticas()
     })
 
 if __name__ == '__main__':
@@ -996,16 +1739,15 @@ if __name__ == '__main__':
         init_db()
         
         # Cargar rutas desde Excel si existe el archivo
-        if os.path.exists('DB_Rutas.xlsx'):
+        if os.path.exists(ARCHIVO_EXCEL):
             print("📋 Cargando rutas desde Excel...")
             load_rutas_from_excel()
         else:
             print("⚠️ Archivo DB_Rutas.xlsx no encontrado")
     
-    # Verificar que las tablas existen después de la inicialización
+    # Verificar la versión del esquema después de la inicialización
     conn = get_db_connection()
-    tables = conn.execute("SELECT name FROM sqlite_master WHERE type='table';").fetchall()
-    print(f"📊 Tablas en la base de datos: {[t[0] for t in tables]}")
+    print(f"📊 Esquema de la base de datos en versión {version_esquema(conn)}")
     
     users_count = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
     print(f"👤 Usuarios en la base de datos: {users_count}")
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+"""
+Archivo de reportes antiguos (datos calientes y fríos).
+
+Las pantallas operativas solo miran un día, pero reportes_rutas guarda todo
+lo enviado. El archivador mueve los reportes con fecha_reporte anterior a
+la ventana de retención a un archivo SQLite por mes
+(archivo/reportes_YYYY_MM.db junto a la base), de modo que la tabla
+principal y sus índices se mantienen pequeños y en caché.
+
+- El movimiento va día por día, cada uno en su propia transacción: INSERT
+  OR IGNORE en el archivo y DELETE en la base principal. Con WAL una
+  transacción sobre varias bases no es atómica entre ellas; si se
+  interrumpe, volver a ejecutar termina el trabajo sin duplicar (el id se
+  conserva).
+- El resumen diario y los agregados de /api/analytics no cambian: los
+  triggers de borrado ignoran la transacción del archivador (ver
+  migraciones.CLAVE_ARCHIVANDO). El registro de cambios de esos días se
+  elimina porque ya no se pueden modificar.
+- Las consultas por fecha (panel, /api/reportes, exportación) usan
+  tabla_reportes(), que adjunta con ATTACH los meses archivados del rango
+  y devuelve un UNION ALL con la tabla principal. Los rangos posteriores a
+  la última fecha archivada (metadatos 'archivado_hasta'), como el día de
+  hoy, leen solo la tabla principal.
+
+El espacio liberado en la base principal queda en la lista libre y se
+reutiliza; para devolverlo al disco: python mantenimiento.py --vacuum.
+
+Uso:
+python archivador.py [--db sistema_rutas.db] [--retencion 90] [--directorio archivo] [--simular]
+"""
+import argparse
+import glob
+import os
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from itertools import groupby
+
+import pytz
+
+from migraciones import CLAVE_ARCHIVANDO
+
+# Última fecha_reporte archivada (metadatos): las consultas de fechas
+# posteriores no necesitan adjuntar ningún archivo
+CLAVE_ARCHIVADO_HASTA = 'archivado_hasta'
+
+# Formato de los archivos (PRAGMA user_version de cada uno).
+# 1: contratista sin espacios sobrantes, como la migración 6 de la base principal
+VERSION_ARCHIVO = 1
+
+
+def mes_de(fecha):
+    """'2026-07-15' -> '2026_07'"""
+    return fecha[:7].replace('-', '_')
+
+
+def meses_entre(desde, hasta):
+    """Meses ('YYYY_MM') que abarca el rango de fechas"""
+    anio, mes = int(desde[:4]), int(desde[5:7])
+    ultimo = (int(hasta[:4]), int(hasta[5:7]))
+    meses = []
+    while (anio, mes) <= ultimo:
+        meses.append(f'{anio:04d}_{mes:02d}')
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+    return meses
+
+
+def columnas_reportes(conn, esquema='main'):
+    """(nombre, tipo) de las columnas de reportes_rutas en `esquema`"""
+    return [(fila[1], fila[2]) for fila in conn.execute(f'PRAGMA {esquema}.table_info(reportes_rutas)')]
+
+
+def preparar_archivo(conn, esquema):
+    """
+    Crear reportes_rutas e índices en el archivo adjunto, o agregarle las
+    columnas nuevas. Tabla e índices (salvo los únicos) se copian de la base
+    principal; un archivo con formato anterior a VERSION_ARCHIVO se actualiza.
+    """
+    sql = conn.execute(
+        "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = 'reportes_rutas'"
+    ).fetchone()[0]
+    conn.execute(sql.replace('CREATE TABLE reportes_rutas',
+                             f'CREATE TABLE IF NOT EXISTS {esquema}.reportes_rutas', 1))
+    existentes = {nombre for nombre, _ in columnas_reportes(conn, esquema)}
+    for nombre, tipo in columnas_reportes(conn):
+        if nombre not in existentes:
+            conn.execute(f'ALTER TABLE {esquema}.reportes_rutas ADD COLUMN {nombre} {tipo}')
+    indices = conn.execute('''
+        SELECT name, sql FROM main.sqlite_master
+        WHERE type = 'index' AND tbl_name = 'reportes_rutas' AND sql LIKE 'CREATE INDEX %'
+    ''').fetchall()
+    for nombre, sql in indices:
+        conn.execute(sql.replace(f'CREATE INDEX {nombre}', f'CREATE INDEX IF NOT EXISTS {esquema}.{nombre}', 1))
+    if conn.execute(f'PRAGMA {esquema}.user_version').fetchone()[0] < 1:
+        recortado = "TRIM(contratista, ' ' || char(9, 10, 11, 12, 13, 160))"
+        conn.execute(f'UPDATE {esquema}.reportes_rutas SET contratista = {recortado} WHERE contratista <> {recortado}')
+    conn.execute(f'PRAGMA {esquema}.user_version = {VERSION_ARCHIVO}')
+    conn.commit()
+
+
+def leer_archivado_hasta(conn):
+    """Última fecha archivada ('YYYY-MM-DD'), o None si no hay registro"""
+    fila = conn.execute('SELECT valor FROM metadatos WHERE clave = ?', (CLAVE_ARCHIVADO_HASTA,)).fetchone()
+    return fila[0] if fila else None
+
+
+def registrar_archivado_hasta(conn, fecha):
+    """Adelantar la última fecha archivada a `fecha` (nunca la retrocede)"""
+    conn.execute('''
+        INSERT INTO metadatos (clave, valor) VALUES (?, ?)
+        ON CONFLICT(clave) DO UPDATE SET
+            valor = MAX(valor, excluded.valor),
+            actualizado_en = CURRENT_TIMESTAMP
+    ''', (CLAVE_ARCHIVADO_HASTA, fecha))
+
+
+class Archivador:
+    """Mueve reportes antiguos a archivos mensuales y los vuelve a reunir al consultar"""
+
+    def __init__(self, database, directorio=None, retencion_dias=90):
+        self.database = database
+        self._directorio = directorio
+        self.retencion_dias = retencion_dias
+
+    @property
+    def directorio(self):
+        return self._directorio or os.path.join(os.path.dirname(os.path.abspath(self.database)), 'archivo')
+
+    def ruta_mes(self, mes):
+        return os.path.join(self.directorio, f'reportes_{mes}.db')
+
+    def meses_archivados(self):
+        """Meses ('YYYY_MM') que ya tienen archivo"""
+        return sorted(os.path.basename(ruta)[len('reportes_'):-len('.db')]
+                      for ruta in glob.glob(os.path.join(self.directorio, 'reportes_????_??.db')))
+
+    def fecha_corte(self, hoy=None):
+        """Primera fecha que se queda en la base principal"""
+        hoy = hoy or datetime.now(pytz.timezone('America/Guatemala')).date()
+        return (hoy - timedelta(days=self.retencion_dias)).isoformat()
+
+    def pendientes(self, conn, corte):
+        """Fechas anteriores a `corte` que siguen en la base principal"""
+        return [fecha for fecha, in conn.execute('''
+            SELECT DISTINCT fecha_reporte FROM reportes_rutas
+            WHERE fecha_reporte < ? ORDER BY fecha_reporte
+        ''', (corte,))]
+
+    def archivar(self, hoy=None, simular=False):
+        """
+        Mover a los archivos mensuales los reportes anteriores a la ventana de
+        retención. Devuelve {mes: reportes movidos} (o por mover, con simular).
+        """
+        if self.retencion_dias <= 0:
+            raise ValueError('La retención debe ser de al menos un día')
+        corte = self.fecha_corte(hoy)
+        conn = sqlite3.connect(self.database, timeout=30)
+        movidos = {}
+        try:
+            fechas = self.pendientes(conn, corte)
+            if simular:
+                for fecha in fechas:
+                    cantidad = conn.execute('SELECT COUNT(*) FROM reportes_rutas WHERE fecha_reporte = ?',
+                                            (fecha,)).fetchone()[0]
+                    movidos[mes_de(fecha)] = movidos.get(mes_de(fecha), 0) + cantidad
+                return movidos
+
+            os.makedirs(self.directorio, exist_ok=True)
+            por_mes = {mes: list(dias) for mes, dias in groupby(fechas, key=mes_de)}
+            # Los archivos sin días nuevos también se ponen al día (columnas, formato)
+            for mes in sorted(set(por_mes) | set(self.meses_archivados())):
+                conn.execute('ATTACH DATABASE ? AS archivo', (self.ruta_mes(mes),))
+                try:
+                    preparar_archivo(conn, 'archivo')
+                    # Archivos creados antes de que existiera el registro
+                    ultima = conn.execute('SELECT MAX(fecha_reporte) FROM archivo.reportes_rutas').fetchone()[0]
+                    if ultima is not None:
+                        registrar_archivado_hasta(conn, ultima)
+                        conn.commit()
+                    if mes in por_mes:
+                        columnas = ', '.join(nombre for nombre, _ in columnas_reportes(conn))
+                        movidos[mes] = sum(self._mover_dia(conn, fecha, columnas) for fecha in por_mes[mes])
+                finally:
+                    conn.execute('DETACH DATABASE archivo')
+        finally:
+            conn.close()
+        return movidos
+
+    def _mover_dia(self, conn, fecha, columnas):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Marca para los triggers de borrado (solo visible en esta transacción)
+            conn.execute('INSERT OR REPLACE INTO metadatos (clave, valor) VALUES (?, ?)',
+                         (CLAVE_ARCHIVANDO, fecha))
+            conn.execute(f'''
+                INSERT OR IGNORE INTO archivo.reportes_rutas ({columnas})
+                SELECT {columnas} FROM main.reportes_rutas WHERE fecha_reporte = ?
+            ''', (fecha,))
+            movidos = conn.execute('DELETE FROM main.reportes_rutas WHERE fecha_reporte = ?',
+                                   (fecha,)).rowcount
+            conn.execute('DELETE FROM reportes_cambios WHERE fecha_reporte = ?', (fecha,))
+            registrar_archivado_hasta(conn, fecha)
+            conn.execute('DELETE FROM metadatos WHERE clave = ?', (CLAVE_ARCHIVANDO,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return movidos
+
+    def tabla_reportes(self, conn, desde, hasta):
+        """
+        Fuente de reportes_rutas para consultar fechas entre `desde` y `hasta`
+        ('YYYY-MM-DD'). Sin días archivados en el rango es 'reportes_rutas';
+        si no, adjunta los archivos a `conn` (conexión del pool, que los
+        desconecta al devolverse) y devuelve un UNION ALL con la tabla principal,
+        con una columna `archivado` (1 en las filas de los archivos, que ya no
+        se pueden modificar ni eliminar).
+        """
+        if not desde or not hasta:
+            return 'reportes_rutas'
+        # Las fechas posteriores a la última archivada (el día de hoy, en el
+        # panel y la API) solo están en la base principal
+        limite = leer_archivado_hasta(conn)
+        if limite is not None:
+            if desde > limite:
+                return 'reportes_rutas'
+            hasta = min(hasta, limite)
+        meses = [mes for mes in meses_entre(desde, hasta) if os.path.exists(self.ruta_mes(mes))]
+        if not meses:
+            return 'reportes_rutas'
+        maximo = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(meses) > maximo:
+            raise ValueError(f'El rango abarca {len(meses)} meses archivados; el máximo por consulta es {maximo}')
+
+        columnas = [nombre for nombre, _ in columnas_reportes(conn)]
+        partes = [f'SELECT {", ".join(columnas)}, 0 AS archivado FROM main.reportes_rutas']
+        for mes in meses:
+            esquema = f'archivo_{mes}'
+            conn.adjuntar(self.ruta_mes(mes), esquema)
+            # Un archivo viejo puede no tener las columnas agregadas después
+            existentes = {nombre for nombre, _ in columnas_reportes(conn, esquema)}
+            lista = ', '.join(nombre if nombre in existentes else f'NULL AS {nombre}' for nombre in columnas)
+            partes.append(f'SELECT {lista}, 1 AS archivado FROM {esquema}.reportes_rutas')
+        return '(' + ' UNION ALL '.join(partes) + ')'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Archivo de reportes antiguos por mes')
+    parser.add_argument('--db', default='sistema_rutas.db')
+    parser.add_argument('--retencion', type=int, default=90,
+                        help='días que se quedan en la base principal')
+    parser.add_argument('--directorio', help='carpeta de los archivos (por defecto archivo/ junto a la base)')
+    parser.add_argument('--hoy', type=date.fromisoformat, help='fecha de referencia (YYYY-MM-DD)')
+    parser.add_argument('--simular', action='store_true', help='solo contar lo que se movería')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ No existe la base {args.db}")
+        return 1
+
+    archivador = Archivador(args.db, args.directorio, args.retencion)
+    inicio = time.perf_counter()
+    try:
+        movidos = archivador.archivar(args.hoy, simular=args.simular)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    accion = 'por archivar' if args.simular else 'archivados'
+    print(f"📦 Corte: {archivador.fecha_corte(args.hoy)} | {sum(movidos.values())} reportes {accion} "
+          f"en {time.perf_counter() - inicio:.1f} s")
+    for mes, cantidad in movidos.items():
+        print(f"   {archivador.ruta_mes(mes)}: {cantidad}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
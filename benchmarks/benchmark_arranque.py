@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+Benchmark de arranque de un worker
+----------------------------------
+
+Importa la aplicación en procesos nuevos (como lo haría un worker de
+gunicorn) y mide el tiempo de importación y la memoria residente (RSS).
+También verifica que las dependencias pesadas (pandas, numpy, openpyxl)
+no se carguen al importar la aplicación, solo al recargar el Excel o al
+exportar.
+
+Sale con código 1 si se supera algún límite, para usarlo como control de
+regresiones en el despliegue.
+
+Uso:
+python benchmarks/benchmark_arranque.py [--repeticiones 5] [--max-segundos 1.0] [--max-rss-mb 50]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Dependencias que no deben cargarse al arrancar un worker
+PESADAS = ('pandas', 'numpy', 'openpyxl')
+
+MEDICION = '''
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+duracion = time.perf_counter() - inicio
+rss_kb = 0
+with open('/proc/self/status') as f:
+    for linea in f:
+        if linea.startswith('VmRSS:'):
+            rss_kb = int(linea.split()[1])
+print(json.dumps({{
+    'segundos': duracion,
+    'rss_mb': rss_kb / 1024,
+    'cargadas': [m for m in {pesadas!r} if m in sys.modules],
+}}))
+'''
+
+
+def medir_importacion(modulo, directorio):
+    """Importar `modulo` en un intérprete nuevo y devolver sus métricas"""
+    codigo = MEDICION.format(modulo=modulo, pesadas=PESADAS)
+    entorno = dict(os.environ, PYTHONPATH=RAIZ, PYTHONDONTWRITEBYTECODE='1')
+    salida = subprocess.run(
+        [sys.executable, '-c', codigo], cwd=directorio, env=entorno,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def resumir(mediciones):
+    return {
+        'segundos': statistics.median(m['segundos'] for m in mediciones),
+        'rss_mb': statistics.median(m['rss_mb'] for m in mediciones),
+        'cargadas': sorted({c for m in mediciones for c in m['cargadas']}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--max-segundos', type=float, default=1.0,
+                        help='límite para la mediana del tiempo de importación de app')
+    parser.add_argument('--max-rss-mb', type=float, default=50.0,
+                        help='límite para la mediana de RSS tras importar app')
+    args = parser.parse_args()
+
+    if not sys.platform.startswith('linux'):
+        print("⚠️ La medición de RSS usa /proc y requiere Linux")
+        return 0
+
+    with tempfile.TemporaryDirectory() as directorio:
+        # Se ejecuta en un directorio vacío para no tocar sistema_rutas.db
+        resultados = {
+            modulo: resumir([medir_importacion(modulo, directorio) for _ in range(args.repeticiones)])
+            for modulo in ('app', 'importar_rutas')
+        }
+
+    print(f"{'módulo':<16} {'importación (s)':>16} {'RSS (MB)':>9}  dependencias pesadas")
+    for modulo, r in resultados.items():
+        cargadas = ', '.join(r['cargadas']) or '-'
+        print(f"{modulo:<16} {r['segundos']:>16.3f} {r['rss_mb']:>9.1f}  {cargadas}")
+
+    app = resultados['app']
+    errores = []
+    if app['cargadas']:
+        errores.append(f"app importa dependencias pesadas al arrancar: {', '.join(app['cargadas'])}")
+    if app['segundos'] > args.max_segundos:
+        errores.append(f"importación de app {app['segundos']:.3f} s > {args.max_segundos} s")
+    if app['rss_mb'] > args.max_rss_mb:
+        errores.append(f"RSS de app {app['rss_mb']:.1f} MB > {args.max_rss_mb} MB")
+
+    for error in errores:
+        print(f"❌ {error}")
+    if errores:
+        return 1
+    print("✅ Arranque dentro de los límites")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
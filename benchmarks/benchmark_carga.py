@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+"""
+Prueba de carga de los endpoints de conductores y supervisores
+--------------------------------------------------------------
+
+Siembra una base con generar_datos_sinteticos.py (miles de rutas y meses
+de reportes), reproduce una mezcla de tráfico realista y reporta por
+endpoint p50, p95, p99 y peticiones por segundo. Los resultados se
+guardan en JSON junto con el commit actual para comparar entre versiones
+(--comparar).
+
+Fases de tráfico (los pesos son la proporción de peticiones de cada tipo):
+- rafaga_matutina: los conductores abren el formulario, cargan el
+  dropdown de rutas (/get_rutas) y envían su reporte (/submit_reporte).
+- operacion: los supervisores refrescan /admin cada 30 s y el tablero
+  consulta /api/reportes, /api/resumen y /api/analytics; siguen llegando
+  reportes y de vez en cuando alguien exporta el Excel del día.
+
+Por defecto usa el cliente de pruebas de Flask dentro del proceso. Con
+--url las peticiones van a un servidor ya levantado (p. ej. gunicorn con
+railway_entry:app) que debe usar la misma base sembrada en --db.
+
+Uso:
+python benchmarks/benchmark_carga.py [--rutas 2000] [--dias 90] [--peticiones 2000] [--hilos 8]
+                                     [--db carga.db] [--url http://127.0.0.1:8000]
+                                     [--salida resultados.json] [--comparar anterior.json]
+"""
+
+import argparse
+import contextlib
+import http.cookiejar
+import io
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from datetime import datetime, timedelta
+
+import pytz
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from generar_datos_sinteticos import generar  # noqa: E402
+
+FASES = [
+    ('rafaga_matutina', {'index': 10, 'get_rutas': 30, 'submit_reporte': 60}),
+    ('operacion', {'admin': 20, 'api_reportes': 35, 'api_resumen': 10, 'api_analytics': 5,
+                   'get_rutas': 10, 'submit_reporte': 15, 'export_reportes': 5}),
+]
+
+
+def hoy():
+    """Fecha actual en Guatemala, la misma que usa la aplicación"""
+    return datetime.now(pytz.timezone('America/Guatemala')).date()
+
+
+def sembrar(ruta_db, rutas, dias, participacion, semilla):
+    """
+    Llenar `ruta_db` con generar_datos_sinteticos (rutas, usuarios, actividad
+    y reportes de los `dias` anteriores a hoy). Si ya tiene rutas se reutiliza.
+    """
+    try:
+        conteos = generar(ruta_db, contratistas=max(1, rutas // 50), rutas=rutas, dias=dias,
+                          participacion=participacion, semilla=semilla, silencioso=True)
+    except ValueError:
+        return False
+    print(f"🌱 Base sembrada: {rutas} rutas, {conteos['reportes_rutas']} reportes en {dias} días")
+    return True
+
+
+def leer_contexto(ruta_db):
+    """Rutas y contratistas que usan las peticiones generadas"""
+    conn = sqlite3.connect(ruta_db)
+    rutas = conn.execute('SELECT id, contratista FROM rutas WHERE activa = 1').fetchall()
+    conn.close()
+    return {'rutas': rutas, 'contratistas': sorted({c for _, c in rutas}), 'hoy': hoy()}
+
+
+def peticion(tipo, rng, contexto):
+    """(método, ruta, cuerpo JSON) de una petición del tipo indicado"""
+    hoy = contexto['hoy']
+    contratista = rng.choice(contexto['contratistas'])
+    if tipo == 'index':
+        return 'GET', '/', None
+    if tipo == 'get_rutas':
+        return 'GET', f'/get_rutas/{urllib.parse.quote(contratista)}', None
+    if tipo == 'submit_reporte':
+        ruta_id, contratista = rng.choice(contexto['rutas'])
+        return 'POST', '/submit_reporte', {
+            'contratista': contratista,
+            'ruta_id': ruta_id,
+            'clientes_pendientes': rng.randint(1, 40),  # 0 lo rechaza validar_reporte
+            'cajas_camion': rng.randint(1, 300),
+            'hora_aproximada_ingreso': f'{rng.randint(13, 18):02d}:{rng.choice((0, 30)):02d}',
+            'latitud': 14.6349 + rng.uniform(-0.1, 0.1),
+            'longitud': -90.5069 + rng.uniform(-0.1, 0.1),
+            'clave_idempotencia': str(uuid.UUID(int=rng.getrandbits(128))),
+        }
+    if tipo == 'admin':
+        filtro = f'&contratista={urllib.parse.quote(contratista)}' if rng.random() < 0.3 else ''
+        return 'GET', f'/admin?fecha={hoy}{filtro}', None
+    if tipo == 'api_reportes':
+        filtro = f'&contratista={urllib.parse.quote(contratista)}' if rng.random() < 0.5 else ''
+        return 'GET', f'/api/reportes?fecha={hoy}{filtro}', None
+    if tipo == 'api_resumen':
+        return 'GET', f'/api/resumen?fecha={hoy}', None
+    if tipo == 'api_analytics':
+        agrupar = rng.choice(('contratista', 'supervisor'))
+        return 'GET', f'/api/analytics?desde={hoy - timedelta(days=89)}&hasta={hoy}&agrupar={agrupar}', None
+    if tipo == 'export_reportes':
+        return 'GET', f'/export_reportes?fecha={hoy - timedelta(days=rng.randint(1, 30))}', None
+    raise ValueError(tipo)
+
+
+class ClienteLocal:
+    """Cliente de pruebas de Flask sobre la aplicación importada"""
+
+    def __init__(self, app):
+        self._client = app.test_client()
+
+    def login(self, usuario, password):
+        self._client.post('/login', data={'username': usuario, 'password': password})
+
+    def enviar(self, metodo, ruta, cuerpo):
+        respuesta = self._client.open(ruta, method=metodo, json=cuerpo)
+        respuesta.get_data()  # consumir las respuestas en streaming
+        return respuesta.status_code
+
+
+class ClienteHTTP:
+    """Cliente HTTP con cookies contra un servidor ya levantado"""
+
+    def __init__(self, url):
+        self._url = url.rstrip('/')
+        self._opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def login(self, usuario, password):
+        datos = urllib.parse.urlencode({'username': usuario, 'password': password}).encode()
+        self._opener.open(self._url + '/login', datos).read()
+
+    def enviar(self, metodo, ruta, cuerpo):
+        datos = json.dumps(cuerpo).encode() if cuerpo is not None else None
+        solicitud = urllib.request.Request(self._url + ruta, data=datos, method=metodo,
+                                           headers={'Content-Type': 'application/json'})
+        try:
+            with self._opener.open(solicitud) as respuesta:
+                respuesta.read()
+                return respuesta.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    if not valores:
+        return None
+    return valores[min(len(valores) - 1, max(0, math.ceil(p / 100 * len(valores)) - 1))]
+
+
+def ejecutar_fase(crear_cliente, contexto, pesos, peticiones, hilos, semilla):
+    """Repartir `peticiones` entre `hilos` clientes y devolver las métricas por endpoint"""
+    tiempos = {tipo: [] for tipo in pesos}
+    errores = {tipo: 0 for tipo in pesos}
+    lock = threading.Lock()
+    tipos, ponderaciones = list(pesos), list(pesos.values())
+
+    def trabajar(numero):
+        rng = random.Random(semilla * 1000 + numero)
+        cliente = crear_cliente()
+        cliente.login('admin', 'admin123')
+        locales = {tipo: [] for tipo in pesos}
+        fallidas = {tipo: 0 for tipo in pesos}
+        for _ in range(peticiones // hilos):
+            tipo = rng.choices(tipos, ponderaciones)[0]
+            metodo, ruta, cuerpo = peticion(tipo, rng, contexto)
+            inicio = time.perf_counter()
+            estado = cliente.enviar(metodo, ruta, cuerpo)
+            locales[tipo].append((time.perf_counter() - inicio) * 1000)
+            if estado >= 400:
+                fallidas[tipo] += 1
+        with lock:
+            for tipo in pesos:
+                tiempos[tipo].extend(locales[tipo])
+                errores[tipo] += fallidas[tipo]
+
+    trabajadores = [threading.Thread(target=trabajar, args=(h,)) for h in range(hilos)]
+    inicio = time.perf_counter()
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    duracion = time.perf_counter() - inicio
+
+    endpoints = {}
+    for tipo, valores in tiempos.items():
+        valores.sort()
+        endpoints[tipo] = {
+            'peticiones': len(valores),
+            'errores': errores[tipo],
+            'rps': round(len(valores) / duracion, 1),
+            'p50_ms': round(percentil(valores, 50), 2) if valores else None,
+            'p95_ms': round(percentil(valores, 95), 2) if valores else None,
+            'p99_ms': round(percentil(valores, 99), 2) if valores else None,
+            'max_ms': round(valores[-1], 2) if valores else None,
+        }
+    total = sum(len(v) for v in tiempos.values())
+    return {'duracion_s': round(duracion, 3), 'peticiones': total,
+            'rps': round(total / duracion, 1), 'endpoints': endpoints}
+
+
+def imprimir_fase(nombre, resultado, anterior=None):
+    print(f"\n🚦 {nombre}: {resultado['peticiones']} peticiones en {resultado['duracion_s']:.1f} s "
+          f"({resultado['rps']:.0f} req/s)")
+    print(f"{'endpoint':<16} {'n':>6} {'err':>4} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+          + ('  Δp95' if anterior else ''))
+    for tipo, r in resultado['endpoints'].items():
+        if not r['peticiones']:
+            continue
+        linea = (f"{tipo:<16} {r['peticiones']:>6} {r['errores']:>4} {r['rps']:>7.1f} "
+                 f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+        previo = (anterior or {}).get('endpoints', {}).get(tipo, {}).get('p95_ms')
+        if previo:
+            linea += f"  {(r['p95_ms'] - previo) / previo * 100:+.0f}%"
+        print(linea)
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rutas', type=int, default=2000)
+    parser.add_argument('--dias', type=int, default=90, help='días de historia antes de hoy')
+    parser.add_argument('--participacion', type=float, default=0.7,
+                        help='fracción de rutas que reporta cada día')
+    parser.add_argument('--peticiones', type=int, default=2000, help='peticiones por fase')
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--db', help='base sembrada a usar o crear (por defecto una temporal)')
+    parser.add_argument('--solo-sembrar', action='store_true', help='sembrar --db y salir')
+    parser.add_argument('--url', help='servidor a probar en lugar del cliente de pruebas de Flask')
+    parser.add_argument('--salida', help='archivo JSON para guardar los resultados')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior para comparar p95')
+    args = parser.parse_args()
+
+    if (args.solo_sembrar or args.url) and not args.db:
+        parser.error('--solo-sembrar y --url requieren --db')
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_db = os.path.abspath(args.db or os.path.join(directorio, 'carga.db'))
+        inicio = time.perf_counter()
+        if sembrar(ruta_db, args.rutas, args.dias, args.participacion, args.semilla):
+            print(f"   ({time.perf_counter() - inicio:.1f} s)")
+        if args.solo_sembrar:
+            return 0
+        contexto = leer_contexto(ruta_db)
+
+        if args.url:
+            def crear_cliente():
+                return ClienteHTTP(args.url)
+        else:
+            import app as app_module
+            from db_pool import ConexionPool
+            app_module.DATABASE = ruta_db
+            app_module.mantenimiento.database = ruta_db
+            app_module.pool_conexiones = ConexionPool(ruta_db, max_conexiones=args.hilos + 2,
+                                                      observador=app_module.metricas)
+            app_module.logger.setLevel('ERROR')
+
+            def crear_cliente():
+                return ClienteLocal(app_module.app)
+
+        anterior = {}
+        if args.comparar:
+            with open(args.comparar, encoding='utf-8') as f:
+                anterior = json.load(f)
+
+        resultados = {
+            'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'commit': commit_actual(),
+            'python': platform.python_version(),
+            'modo': 'http' if args.url else 'test_client',
+            'parametros': {k: v for k, v in vars(args).items() if k not in ('salida', 'comparar')},
+            'fases': {},
+        }
+        with contextlib.redirect_stdout(io.StringIO()) if not args.url else contextlib.nullcontext():
+            # Calentamiento: conexiones del pool y catálogo de rutas
+            ejecutar_fase(crear_cliente, contexto, {'get_rutas': 1}, args.hilos * 5, args.hilos, 0)
+        for numero, (nombre, pesos) in enumerate(FASES, start=1):
+            resultado = ejecutar_fase(crear_cliente, contexto, pesos, args.peticiones, args.hilos,
+                                      args.semilla + numero)
+            resultados['fases'][nombre] = resultado
+            imprimir_fase(nombre, resultado, anterior.get('fases', {}).get(nombre))
+
+        if not args.url:
+            app_module.registro_actividad.cerrar()
+            app_module.pool_conexiones.cerrar()
+
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 Resultados guardados en {args.salida}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+Benchmark de la carga del catálogo de rutas
+-------------------------------------------
+
+Compara el cargador anterior (df.iterrows() + un INSERT por fila) con el
+actual (normalización vectorizada + un solo executemany) sobre hojas
+sintéticas de varios tamaños, y verifica que ambos inserten las mismas
+filas (el cargador actual además recorta espacios, p. ej. 'JUAN FERNANDEZ '
+en DB_Rutas.xlsx). Con --excel también mide la lectura de DB_Rutas.xlsx.
+
+Uso:
+python benchmarks/benchmark_importar_rutas.py [--filas 1000 5000 20000] [--excel DB_Rutas.xlsx]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from importar_rutas import (  # noqa: E402
+    leer_excel, normalizar_rutas, insertar_rutas
+)
+
+TABLA_RUTAS = '''
+    CREATE TABLE rutas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ruta TEXT NOT NULL,
+        codigo TEXT,
+        placa TEXT,
+        supervisor TEXT,
+        contratista TEXT NOT NULL,
+        tipo TEXT,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def hoja_sintetica(filas, semilla=7):
+    """Hoja con la forma de DB_Rutas.xlsx: códigos numéricos, NaN y contratistas vacíos"""
+    rng = np.random.default_rng(semilla)
+    codigos = rng.integers(1000, 9999, filas).astype(float)
+    codigos[rng.random(filas) < 0.05] = np.nan
+    contratistas = np.array([f'CONTRATISTA {i}' for i in range(40)], dtype=object)[rng.integers(0, 40, filas)]
+    contratistas[rng.random(filas) < 0.02] = np.nan
+    return pd.DataFrame({
+        'RUTA': [f'DS{i:05d}' for i in range(filas)],
+        'CODIGO': codigos,
+        'PLACA': [f'C{100000 + i}' for i in range(filas)],
+        'SUPERVISOR': np.array([f'SUPERVISOR {i}' for i in range(12)], dtype=object)[rng.integers(0, 12, filas)],
+        'CONTRATISTA': contratistas,
+        'TIPO': np.where(rng.random(filas) < 0.8, 'GC', 'MM'),
+    })
+
+
+def cargar_anterior(conn, df):
+    """Copia del cargador anterior de load_rutas_from_excel()"""
+    cursor = conn.cursor()
+    cursor.execute('DELETE FROM rutas')
+    for _, row in df.iterrows():
+        ruta = str(row['RUTA']) if pd.notna(row['RUTA']) else ''
+        codigo = str(row['CODIGO']) if pd.notna(row['CODIGO']) else ''
+        placa = str(row['PLACA']) if pd.notna(row['PLACA']) else ''
+        supervisor = str(row['SUPERVISOR']) if pd.notna(row['SUPERVISOR']) else ''
+        contratista = str(row['CONTRATISTA']) if pd.notna(row['CONTRATISTA']) else ''
+        tipo = str(row['TIPO']) if pd.notna(row['TIPO']) else ''
+        if not contratista:
+            continue
+        cursor.execute('''
+            INSERT INTO rutas (ruta, codigo, placa, supervisor, contratista, tipo)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (ruta, codigo, placa, supervisor, contratista, tipo))
+    conn.commit()
+
+
+def cargar_actual(conn, df):
+    filas, _ = normalizar_rutas(df)
+    conn.execute('DELETE FROM rutas')
+    insertar_rutas(conn, filas)
+    conn.commit()
+
+
+def medir(cargador, df, repeticiones=3):
+    """Mejor tiempo de varias corridas y las filas resultantes"""
+    mejor = None
+    for _ in range(repeticiones):
+        conn = sqlite3.connect(':memory:')
+        conn.execute(TABLA_RUTAS)
+        inicio = time.perf_counter()
+        cargador(conn, df)
+        duracion = time.perf_counter() - inicio
+        mejor = duracion if mejor is None else min(mejor, duracion)
+        filas = conn.execute(
+            'SELECT ruta, codigo, placa, supervisor, contratista, tipo FROM rutas ORDER BY id'
+        ).fetchall()
+        conn.close()
+    return mejor, filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--filas', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--excel', help='medir también la lectura de este archivo')
+    args = parser.parse_args()
+
+    hojas = [(cantidad, hoja_sintetica(cantidad)) for cantidad in args.filas]
+    if args.excel:
+        inicio = time.perf_counter()
+        df = leer_excel(args.excel)
+        print(f"📄 {args.excel}: {len(df)} filas leídas en {time.perf_counter() - inicio:.3f} s")
+        hojas.insert(0, (len(df), df))
+
+    print(f"{'filas':>7} {'anterior (s)':>13} {'actual (s)':>11} {'mejora':>8}  resultado")
+    for cantidad, df in hojas:
+        anterior, filas_anterior = medir(cargar_anterior, df)
+        actual, filas_actual = medir(cargar_actual, df)
+        recortadas = [tuple(valor.strip() for valor in fila) for fila in filas_anterior]
+        iguales = '✅ mismas filas' if recortadas == filas_actual else '❌ filas distintas'
+        print(f"{cantidad:>7} {anterior:>13.3f} {actual:>11.3f} {anterior / actual:>7.1f}x  {iguales}")
+
+
+if __name__ == '__main__':
+    main()
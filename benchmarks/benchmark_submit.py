@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+"""
+Benchmark de /submit_reporte
+----------------------------
+
+Compara envíos por segundo entre la implementación anterior de
+submit_reporte (SELECT de la ruta + INSERT + commit + SELECT de
+verificación + prints) y la actual (un solo INSERT ... SELECT).
+
+Ambas versiones se ejecutan con el cliente de pruebas de Flask sobre la
+misma base de datos temporal en modo WAL, primero en serie y luego con
+varios hilos enviando a la vez (la hora pico de la mañana).
+
+Uso:
+python benchmarks/benchmark_submit.py [--envios 2000] [--hilos 8]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import request, jsonify  # noqa: E402
+
+import app as app_module  # noqa: E402
+from db_pool import ConexionPool  # noqa: E402
+
+RUTAS = 50
+
+
+def submit_reporte_anterior():
+    """Copia de submit_reporte antes del cambio (con ida y vuelta de verificación)"""
+    try:
+        data = request.get_json()
+
+        required_fields = ['contratista', 'ruta_id', 'clientes_pendientes',
+                           'cajas_camion', 'hora_aproximada_ingreso']
+        for field in required_fields:
+            if not data.get(field):
+                return jsonify({'success': False, 'error': f'Campo requerido: {field}'}), 400
+
+        try:
+            app_module.datetime.strptime(data['hora_aproximada_ingreso'], '%H:%M').time()
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Formato de hora inválido. Use HH:MM'}), 400
+
+        conn = app_module.get_db_connection()
+        ruta_info = conn.execute(
+            'SELECT ruta FROM rutas WHERE id = ?',
+            (data['ruta_id'],)
+        ).fetchone()
+        if not ruta_info:
+            conn.close()
+            return jsonify({'success': False, 'error': 'Ruta no encontrada'}), 404
+
+        cursor = conn.cursor()
+        ahora = app_module.get_now()
+        fecha_actual = ahora.strftime('%Y-%m-%d')
+        hora_actual = ahora.strftime('%Y-%m-%d %H:%M:%S')
+        cursor.execute('''
+            INSERT INTO reportes_rutas
+            (contratista, ruta_id, ruta_codigo, clientes_pendientes,
+             cajas_camion, hora_aproximada_ingreso, ubicacion_exacta,
+             latitud, longitud, hora_exacta_envio, comentarios, reportado_por,
+             fecha_reporte, hora_reporte)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            data['contratista'], data['ruta_id'], ruta_info['ruta'],
+            int(data['clientes_pendientes']), int(data['cajas_camion']),
+            data['hora_aproximada_ingreso'], data.get('ubicacion_exacta', ''),
+            data.get('latitud'), data.get('longitud'), hora_actual,
+            data.get('comentarios', ''), data.get('reportado_por', 'Sistema'),
+            fecha_actual, hora_actual
+        ))
+        reporte_id = cursor.lastrowid
+        conn.commit()
+
+        verificacion = conn.execute(
+            'SELECT id, fecha_reporte, hora_reporte FROM reportes_rutas WHERE id = ?',
+            (reporte_id,)
+        ).fetchone()
+        conn.close()
+
+        print(f"✅ REPORTE GUARDADO - ID: {reporte_id}")
+        print(f"   Contratista: {data['contratista']}")
+        print(f"   Ruta: {ruta_info['ruta']}")
+        print(f"   Fecha guardada: {verificacion['fecha_reporte'] if verificacion else 'ERROR'}")
+        print(f"   Hora guardada: {verificacion['hora_reporte'] if verificacion else 'ERROR'}")
+
+        return jsonify({
+            'success': True,
+            'message': 'Reporte de ruta enviado exitosamente',
+            'reporte_id': reporte_id,
+            'fecha_guardada': verificacion['fecha_reporte'] if verificacion else None
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+def preparar_base_datos(ruta_db):
+    """Esquema completo y un catálogo pequeño de rutas"""
+    app_module.DATABASE = ruta_db
+    app_module.pool_conexiones = ConexionPool(ruta_db, max_conexiones=16)
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_module.init_db()
+
+    conn = sqlite3.connect(ruta_db)
+    conn.executemany('''
+        INSERT INTO rutas (ruta, codigo, placa, supervisor, contratista, tipo)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        (f'DS{i:04d}', f'SV-{i:04d}', f'C{100000 + i}', f'SUPERVISOR {i % 5}',
+         f'CONTRATISTA {i % 7}', 'GC')
+        for i in range(1, RUTAS + 1)
+    ])
+    conn.commit()
+    conn.close()
+
+
+def datos_envio(i):
+    return {
+        'contratista': f'CONTRATISTA {i % 7}',
+        'ruta_id': i % RUTAS + 1,
+        'clientes_pendientes': 1 + i % 20,
+        'cajas_camion': 5 + i % 60,
+        'hora_aproximada_ingreso': '15:30',
+        'latitud': 14.6349,
+        'longitud': -90.5069,
+        'comentarios': 'benchmark',
+    }
+
+
+def medir(url, envios, hilos):
+    """Envíos por segundo repartidos entre `hilos` clientes concurrentes"""
+    errores = []
+    por_hilo = envios // hilos
+
+    def trabajar(inicio):
+        client = app_module.app.test_client()
+        for i in range(inicio, inicio + por_hilo):
+            respuesta = client.post(url, json=datos_envio(i))
+            if respuesta.status_code != 200:
+                errores.append(respuesta.status_code)
+
+    trabajadores = [threading.Thread(target=trabajar, args=(h * por_hilo,)) for h in range(hilos)]
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for t in trabajadores:
+            t.start()
+        for t in trabajadores:
+            t.join()
+    duracion = time.perf_counter() - inicio
+
+    total = por_hilo * hilos
+    return total / duracion, len(errores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--envios', type=int, default=2000)
+    parser.add_argument('--hilos', type=int, default=8)
+    args = parser.parse_args()
+
+    app_module.app.add_url_rule('/submit_reporte_anterior', 'submit_reporte_anterior',
+                                submit_reporte_anterior, methods=['POST'])
+    app_module.logger.setLevel('WARNING')
+
+    with tempfile.TemporaryDirectory() as directorio:
+        preparar_base_datos(os.path.join(directorio, 'benchmark.db'))
+
+        # Calentamiento (conexiones del pool, caches de sentencias)
+        medir('/submit_reporte_anterior', 50, 1)
+        medir('/submit_reporte', 50, 1)
+
+        print(f"📊 {args.envios} envíos por escenario\n")
+        print(f"{'escenario':<12} {'hilos':>5} {'antes (env/s)':>14} {'después (env/s)':>16} {'mejora':>8}")
+        for hilos in sorted({1, args.hilos}):
+            antes, errores_antes = medir('/submit_reporte_anterior', args.envios, hilos)
+            despues, errores_despues = medir('/submit_reporte', args.envios, hilos)
+            escenario = 'serie' if hilos == 1 else 'concurrente'
+            print(f"{escenario:<12} {hilos:>5} {antes:>14.0f} {despues:>16.0f} {despues / antes:>7.2f}x")
+            if errores_antes or errores_despues:
+                print(f"   ⚠️ errores: antes={errores_antes} después={errores_despues}")
+
+        app_module.pool_conexiones.cerrar()
+
+
+if __name__ == '__main__':
+    main()
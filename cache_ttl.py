@@ -0,0 +1,50 @@
+"""
+Cache en memoria con expiración (TTL) y límite de entradas (LRU).
+
+Cada worker mantiene su propia copia; los valores se consideran
+aproximados durante el tiempo de vida configurado.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+_AUSENTE = object()
+
+
+class CacheTTL:
+    """Diccionario thread-safe con expiración por entrada y desalojo LRU"""
+
+    def __init__(self, ttl=30.0, max_entradas=256):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, defecto=None):
+        """Devolver el valor vigente para la clave o `defecto` si expiró"""
+        with self._lock:
+            entrada = self._datos.get(clave, _AUSENTE)
+            if entrada is _AUSENTE:
+                return defecto
+            valor, expira = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                return defecto
+            self._datos.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor):
+        """Guardar un valor renovando su tiempo de vida"""
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + self.ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, clave=_AUSENTE):
+        """Eliminar una clave, o todas si no se indica ninguna"""
+        with self._lock:
+            if clave is _AUSENTE:
+                self._datos.clear()
+            else:
+                self._datos.pop(clave, None)
@@ -0,0 +1,166 @@
+"""
+Cache en memoria del catálogo de rutas.
+
+La tabla rutas solo cambia al recargar el Excel, así que cada worker guarda
+una copia del catálogo y la sirve sin consultar SQLite. La copia está
+versionada con un contador de generación guardado en la tabla metadatos:
+los triggers de rutas (migración 7) lo incrementan con cada inserción,
+cambio o borrado, venga de la recarga del Excel o de cualquier otro lado, y
+los workers lo revisan como máximo cada `revalidar_cada` segundos.
+
+En la misma tabla se guarda la huella (tamaño, mtime y SHA-256) del Excel
+cargado por última vez, para no volver a leerlo si no cambió.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+ARCHIVO_EXCEL = 'DB_Rutas.xlsx'
+
+# La incrementan los triggers de rutas (migraciones.migracion_7)
+CLAVE_GENERACION = 'catalogo_generacion'
+CLAVE_HUELLA_EXCEL = 'excel_rutas_huella'
+
+
+def leer_generacion(conn):
+    """Generación actual del catálogo (0 si la tabla rutas nunca ha cambiado)"""
+    fila = conn.execute(
+        'SELECT valor FROM metadatos WHERE clave = ?', (CLAVE_GENERACION,)
+    ).fetchone()
+    return int(fila[0]) if fila else 0
+
+
+def leer_huella_excel(conn):
+    """Huella del Excel cargado por última vez (None si no hay registro)"""
+    fila = conn.execute(
+        'SELECT valor FROM metadatos WHERE clave = ?', (CLAVE_HUELLA_EXCEL,)
+    ).fetchone()
+    return json.loads(fila[0]) if fila else None
+
+
+def guardar_huella_excel(conn, huella):
+    """Registrar la huella del Excel (llamar dentro de la transacción de recarga)"""
+    conn.execute('''
+        INSERT INTO metadatos (clave, valor) VALUES (?, ?)
+        ON CONFLICT(clave) DO UPDATE SET
+            valor = excluded.valor,
+            actualizado_en = CURRENT_TIMESTAMP
+    ''', (CLAVE_HUELLA_EXCEL, json.dumps(huella)))
+
+
+def calcular_huella_excel(archivo, anterior=None):
+    """
+    Tamaño, mtime y SHA-256 del archivo. Si tamaño y mtime coinciden con la
+    huella anterior se reutiliza su hash sin volver a leer el archivo.
+    """
+    info = os.stat(archivo)
+    huella = {'tamano': info.st_size, 'mtime_ns': info.st_mtime_ns}
+    if anterior and all(anterior.get(k) == v for k, v in huella.items()):
+        huella['sha256'] = anterior['sha256']
+        return huella
+
+    sha256 = hashlib.sha256()
+    with open(archivo, 'rb') as f:
+        for bloque in iter(lambda: f.read(64 * 1024), b''):
+            sha256.update(bloque)
+    huella['sha256'] = sha256.hexdigest()
+    return huella
+
+
+def excel_sin_cambios(conn, archivo):
+    """
+    Comparar el archivo con la huella registrada.
+    Devuelve (sin_cambios, huella_actual).
+    """
+    anterior = leer_huella_excel(conn)
+    huella = calcular_huella_excel(archivo, anterior)
+    return bool(anterior) and anterior.get('sha256') == huella['sha256'], huella
+
+
+class CatalogoRutas:
+    """Copia en memoria de las rutas activas y sus contratistas, versionada por generación"""
+
+    def __init__(self, obtener_conexion, revalidar_cada=60.0):
+        self._obtener_conexion = obtener_conexion
+        self.revalidar_cada = revalidar_cada
+        self._lock = threading.Lock()
+        self._generacion = None
+        self._revisado_en = 0.0
+        self._contratistas = []
+        self._rutas_por_contratista = {}
+        self._rutas_por_id = {}
+
+    def _cargar(self, conn, generacion):
+        rutas = conn.execute('''
+            SELECT id, ruta, codigo, supervisor, placa, tipo, contratista
+            FROM rutas
+            WHERE activa = 1
+            ORDER BY contratista, ruta
+        ''').fetchall()
+
+        por_contratista = {}
+        por_id = {}
+        for fila in rutas:
+            ruta = {
+                'id': fila['id'],
+                'ruta': fila['ruta'],
+                'codigo': fila['codigo'],
+                'supervisor': fila['supervisor'],
+                'placa': fila['placa'],
+                'tipo': fila['tipo'],
+            }
+            por_id[fila['id']] = dict(ruta, contratista=fila['contratista'])
+            if fila['contratista']:
+                por_contratista.setdefault(fila['contratista'], []).append(ruta)
+
+        self._contratistas = sorted(por_contratista)
+        self._rutas_por_contratista = por_contratista
+        self._rutas_por_id = por_id
+        self._generacion = generacion
+
+    def _vigente(self):
+        """Recargar la copia si otra instancia incrementó la generación"""
+        ahora = time.monotonic()
+        if self._generacion is not None and ahora - self._revisado_en < self.revalidar_cada:
+            return
+        with self._lock:
+            if self._generacion is not None and ahora - self._revisado_en < self.revalidar_cada:
+                return
+            conn = self._obtener_conexion()
+            try:
+                generacion = leer_generacion(conn)
+                if generacion != self._generacion:
+                    self._cargar(conn, generacion)
+            finally:
+                conn.close()
+            self._revisado_en = ahora
+
+    def invalidar(self):
+        """Forzar la revisión de la generación en el próximo acceso"""
+        with self._lock:
+            self._revisado_en = 0.0
+
+    @property
+    def generacion(self):
+        self._vigente()
+        return self._generacion
+
+    def contratistas(self):
+        """Contratistas con rutas, en orden alfabético"""
+        self._vigente()
+        return self._contratistas
+
+    def rutas_de(self, contratista):
+        """Rutas de un contratista ordenadas por nombre de ruta"""
+        self._vigente()
+        return self._rutas_por_contratista.get(contratista, [])
+
+    def ruta(self, ruta_id):
+        """Datos de una ruta por id (None si no existe en el catálogo)"""
+        self._vigente()
+        try:
+            return self._rutas_por_id.get(int(ruta_id))
+        except (TypeError, ValueError):
+            return None
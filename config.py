@@ -42,7 +42,7 @@ class Config:
     ]
     
     # Configuración de exportación
-    EXPORT_FORMATS = ['json', 'csv', 'xlsx']
+    EXPORT_FORMATS = ['xlsx', 'csv', 'jsonl']
     
     # Configuración de usuarios por defecto
     DEFAULT_USERS = [
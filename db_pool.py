@@ -0,0 +1,269 @@
+"""
+Pool de conexiones SQLite para el Sistema de Gestión de Rutas.
+
+Cada proceso (worker de gunicorn) mantiene su propio pool: las conexiones
+se abren una sola vez, se configuran con los PRAGMAs de la aplicación y se
+reutilizan entre requests en lugar de abrir y cerrar una conexión por
+llamada a get_db_connection().
+
+Si el pool tiene un `observador` (metricas.Metricas), cada sentencia
+ejecutada a través de la conexión prestada informa su duración y las filas
+leídas del resultado.
+"""
+import os
+import sqlite3
+import threading
+import time
+
+# PRAGMAs por conexión (journal_mode=WAL es persistente y lo aplica init_db)
+PRAGMAS_CONEXION = (
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+class CursorMedido:
+    """Cursor que informa al observador el tiempo de cada sentencia y las filas leídas"""
+
+    def __init__(self, cursor, observador):
+        self._cursor = cursor
+        self._observador = observador
+        self._sql = ''
+
+    def execute(self, sql, parametros=()):
+        inicio = time.perf_counter()
+        self._cursor.execute(sql, parametros)
+        self._sql = sql
+        self._observador.observar_consulta(sql, time.perf_counter() - inicio)
+        return self
+
+    def executemany(self, sql, parametros):
+        inicio = time.perf_counter()
+        self._cursor.executemany(sql, parametros)
+        self._sql = sql
+        self._observador.observar_consulta(sql, time.perf_counter() - inicio)
+        return self
+
+    def _leer(self, leer, *args):
+        inicio = time.perf_counter()
+        resultado = leer(*args)
+        return resultado, time.perf_counter() - inicio
+
+    def fetchone(self):
+        fila, segundos = self._leer(self._cursor.fetchone)
+        self._observador.observar_filas(self._sql, 0 if fila is None else 1, segundos)
+        return fila
+
+    def fetchmany(self, *args):
+        filas, segundos = self._leer(self._cursor.fetchmany, *args)
+        self._observador.observar_filas(self._sql, len(filas), segundos)
+        return filas
+
+    def fetchall(self):
+        filas, segundos = self._leer(self._cursor.fetchall)
+        self._observador.observar_filas(self._sql, len(filas), segundos)
+        return filas
+
+    def __iter__(self):
+        filas = 0
+        segundos = 0.0
+        try:
+            while True:
+                fila, duracion = self._leer(next, self._cursor, None)
+                segundos += duracion
+                if fila is None:
+                    break
+                filas += 1
+                yield fila
+        finally:
+            self._observador.observar_filas(self._sql, filas, segundos)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class ConexionPrestada:
+    """
+    Envoltorio de una conexión tomada del pool.
+    close() devuelve la conexión al pool en lugar de cerrarla, de modo que
+    el código existente (conn.execute / conn.commit / conn.close) no cambia.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._adjuntas = []
+
+    @property
+    def closed(self):
+        return self._conn is None
+
+    def close(self):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.devolver(conn, self._adjuntas)
+
+    def adjuntar(self, ruta, alias):
+        """ATTACH de otra base solo durante este préstamo: close() hace el DETACH"""
+        if alias not in self._adjuntas:
+            self.__getattr__('execute')(f'ATTACH DATABASE ? AS {alias}', (ruta,))
+            self._adjuntas.append(alias)
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('La conexión ya fue devuelta al pool')
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        cursor = self.__getattr__('cursor')()
+        observador = self._pool.observador
+        return cursor if observador is None else CursorMedido(cursor, observador)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+
+class ConexionPool:
+    """Pool acotado y thread-safe de conexiones SQLite"""
+
+    def __init__(self, database, max_conexiones=5, timeout=10.0, verificar_tras=30.0, observador=None):
+        self.database = database
+        self.observador = observador
+        self.max_conexiones = max_conexiones
+        self.timeout = timeout
+        self.verificar_tras = verificar_tras
+        self._cond = threading.Condition(threading.Lock())
+        self._reiniciar()
+
+    def _reiniciar(self):
+        """Estado inicial del pool (también tras un fork del proceso)"""
+        self._pid = os.getpid()
+        self._libres = []  # [(conexion, ultimo_uso)]
+        self._abiertas = 0
+        self._stats = {
+            'checkouts': 0,
+            'hits': 0,
+            'creadas': 0,
+            'esperas': 0,
+            'timeouts': 0,
+            'descartadas': 0,
+        }
+
+    def _verificar_proceso(self):
+        # Las conexiones heredadas de un fork no se pueden compartir entre procesos
+        if self._pid != os.getpid():
+            self._reiniciar()
+
+    def _crear_conexion(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS_CONEXION:
+            conn.execute(pragma)
+        return conn
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._cond:
+            self._abiertas -= 1
+            self._stats['descartadas'] += 1
+            self._cond.notify()
+
+    def _conexion_sana(self, conn, ultimo_uso):
+        """Health check: solo se consulta si la conexión estuvo inactiva un tiempo"""
+        if time.monotonic() - ultimo_uso < self.verificar_tras:
+            return True
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def obtener(self):
+        """Tomar una conexión del pool, esperando si todas están en uso"""
+        limite = time.monotonic() + self.timeout
+        while True:
+            crear = False
+            with self._cond:
+                self._verificar_proceso()
+                esperando = False
+                while not self._libres and self._abiertas >= self.max_conexiones:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._stats['timeouts'] += 1
+                        raise sqlite3.OperationalError(
+                            f'Pool de conexiones agotado ({self.max_conexiones} en uso)'
+                        )
+                    if not esperando:
+                        self._stats['esperas'] += 1
+                        esperando = True
+                    self._cond.wait(restante)
+
+                self._stats['checkouts'] += 1
+                if self._libres:
+                    conn, ultimo_uso = self._libres.pop()
+                    self._stats['hits'] += 1
+                else:
+                    self._abiertas += 1
+                    self._stats['creadas'] += 1
+                    crear = True
+
+            if crear:
+                try:
+                    conn = self._crear_conexion()
+                except Exception:
+                    with self._cond:
+                        self._abiertas -= 1
+                        self._cond.notify()
+                    raise
+                return ConexionPrestada(self, conn)
+
+            if self._conexion_sana(conn, ultimo_uso):
+                return ConexionPrestada(self, conn)
+            self._descartar(conn)
+
+    def devolver(self, conn, adjuntas=()):
+        """Regresar una conexión al pool descartando transacciones abiertas y bases adjuntas"""
+        if self._pid != os.getpid():
+            return
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            for alias in adjuntas:
+                conn.execute(f'DETACH DATABASE {alias}')
+        except sqlite3.Error:
+            self._descartar(conn)
+            return
+        with self._cond:
+            self._libres.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def cerrar(self):
+        """Cerrar todas las conexiones libres"""
+        with self._cond:
+            libres, self._libres = self._libres, []
+            self._abiertas -= len(libres)
+        for conn, _ in libres:
+            conn.close()
+
+    def estadisticas(self):
+        """Contadores del pool para monitoreo"""
+        with self._cond:
+            stats = dict(self._stats)
+            stats['abiertas'] = self._abiertas
+            stats['libres'] = len(self._libres)
+            stats['en_uso'] = self._abiertas - len(self._libres)
+            stats['max_conexiones'] = self.max_conexiones
+        return stats
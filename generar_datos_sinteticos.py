@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+"""
+Generador de datos sintéticos para pruebas de escala.
+
+Crea una base con el esquema actual (migraciones.inicializar_base_datos) y
+la llena con volúmenes configurables de contratistas, rutas, usuarios,
+reportes_rutas y activity_log con distribuciones parecidas a las reales:
+
+- Contratistas de tamaño desigual (pocos concentran muchas rutas), un
+  supervisor cada ~15 rutas y una fracción de rutas retiradas (activa = 0).
+- Reportes con hora_reporte concentrada en la ráfaga matutina (6:00-8:30)
+  y una cola durante el día; la hora de ingreso es más tarde cuantos más
+  clientes pendientes. El GPS cae alrededor del punto de salida de cada
+  ruta, cerca de la Ciudad de Guatemala.
+- Estados: cada reporte entra 'activo' y pasa a 'completado' al ingresar
+  el camión; los de días anteriores casi siempre terminan completados.
+  Cada transición queda en activity_log como update_reporte_status, junto
+  con logins, accesos al panel, exportaciones y logouts de los usuarios.
+
+La carga va día por día en lotes de executemany con PRAGMAs de carga
+masiva (sin journal, synchronous=OFF, caché grande, lock exclusivo). Los
+índices secundarios y los triggers de reportes_cambios,
+reportes_daily_summary y reportes_agregados se quitan durante la carga; al
+final se recrean y el resumen y los agregados se llenan en una sola pasada
+(migraciones.llenar_derivados). reportes_cambios queda vacío:
+solo alimenta el feed en vivo del panel.
+
+Uso:
+python generar_datos_sinteticos.py [--db sintetico.db] [--contratistas 40] [--rutas 2000]
+                                   [--usuarios 50] [--dias 90] [--participacion 0.8]
+                                   [--sesiones 2] [--incluir-hoy] [--semilla 42] [--reemplazar]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytz
+from werkzeug.security import generate_password_hash
+
+from migraciones import inicializar_base_datos, llenar_derivados
+
+# Centro de la Ciudad de Guatemala
+CENTRO_GPS = (14.6349, -90.5069)
+
+FILAS_POR_LOTE = 50000
+
+# PRAGMAs de la carga masiva (la base es nueva y nadie más la usa)
+PRAGMAS_CARGA = (
+    'PRAGMA journal_mode=OFF',
+    'PRAGMA synchronous=OFF',
+    'PRAGMA locking_mode=EXCLUSIVE',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-262144',  # 256 MB
+)
+
+# activity_log se guarda en UTC (CURRENT_TIMESTAMP); Guatemala es UTC-6
+DESFASE_UTC = timedelta(hours=6)
+
+SQL_INSERTAR_RUTA = '''
+    INSERT INTO rutas (id, ruta, codigo, placa, supervisor, contratista, tipo, activa)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SQL_INSERTAR_USUARIO = '''
+    INSERT INTO users (username, email, password_hash, role, created_by)
+    VALUES (?, ?, ?, ?, 1)
+'''
+
+SQL_INSERTAR_REPORTE = '''
+    INSERT INTO reportes_rutas
+    (id, contratista, ruta_id, ruta_codigo, clientes_pendientes, cajas_camion,
+     hora_aproximada_ingreso, ubicacion_exacta, latitud, longitud, hora_exacta_envio,
+     comentarios, fecha_reporte, hora_reporte, estado, reportado_por, supervisor)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+SQL_INSERTAR_ACTIVIDAD = '''
+    INSERT INTO activity_log (user_id, action, target_type, target_id, details, ip_address, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+PREFIJOS_CONTRATISTA = ('Transportes', 'Logística', 'Distribuidora', 'Fletes', 'Servicios')
+NOMBRES_CONTRATISTA = ('Guatemala', 'Central', 'del Norte', 'del Sur', 'Occidente', 'Oriente',
+                       'Altiplano', 'Pacífico', 'Atlántico', 'Metropolitana', 'Maya', 'Quetzal')
+NOMBRES = ('Juan', 'María', 'Carlos', 'Ana', 'Pedro', 'Lucía', 'José', 'Carmen', 'Luis',
+           'Rosa', 'Miguel', 'Sofía', 'Jorge', 'Elena', 'Mario', 'Gabriela')
+APELLIDOS = ('Pérez', 'López', 'Rodríguez', 'Martínez', 'Gómez', 'García', 'Hernández',
+             'Morales', 'Castillo', 'Ramírez', 'Cruz', 'Mendoza', 'Barrios', 'Estrada')
+COMENTARIOS = ('Tráfico en la salida', 'Cliente cerrado', 'Entrega parcial', 'Lluvia en la ruta',
+               'Cliente sin efectivo', 'Sin novedad')
+
+
+def nombre_persona(rng):
+    return f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}'
+
+
+def generar_catalogo(rng, contratistas, rutas):
+    """
+    Filas de la tabla rutas (con id explícito). El tamaño de los contratistas
+    sigue una ley tipo Zipf: el primero tiene muchas más rutas que el último.
+    """
+    nombres = [f'{PREFIJOS_CONTRATISTA[i % len(PREFIJOS_CONTRATISTA)]} '
+               f'{NOMBRES_CONTRATISTA[i // len(PREFIJOS_CONTRATISTA) % len(NOMBRES_CONTRATISTA)]}'
+               for i in range(contratistas)]
+    ciclo = len(PREFIJOS_CONTRATISTA) * len(NOMBRES_CONTRATISTA)
+    nombres = [f'{nombre} {i // ciclo + 1}' if i >= ciclo else nombre for i, nombre in enumerate(nombres)]
+    pesos = [1 / (posicion + 1) ** 0.8 for posicion in range(contratistas)]
+    supervisores = [f'{nombre_persona(rng)} {i + 1}' for i in range(max(1, rutas // 15))]
+
+    filas = []
+    for ruta_id in range(1, rutas + 1):
+        placa = f'C{rng.randint(100, 999)}{"".join(rng.choices("BCDFGHJKLMNPQRSTVWXYZ", k=3))}'
+        filas.append((ruta_id, f'GT{ruta_id:05d}', str(1000 + ruta_id), placa,
+                      supervisores[ruta_id % len(supervisores)], rng.choices(nombres, pesos)[0],
+                      'GC' if rng.random() < 0.8 else 'MM', 0 if rng.random() < 0.03 else 1))
+    return filas
+
+
+def generar_usuarios(rng, usuarios):
+    """Supervisores y algunos administradores; todos con la contraseña 'sintetico123'"""
+    # Un solo hash para todos: generate_password_hash es lento a propósito
+    password_hash = generate_password_hash('sintetico123')
+    return [(f'usuario{i:04d}', f'usuario{i:04d}@sintetico.local', password_hash,
+             'admin' if rng.random() < 0.1 else 'supervisor')
+            for i in range(1, usuarios + 1)]
+
+
+def minuto_del_dia(rng):
+    """Minuto del día de un envío: ráfaga matutina y una cola durante el día"""
+    if rng.random() < 0.85:
+        return min(max(int(rng.gauss(7 * 60 + 15, 35)), 5 * 60), 11 * 60)
+    return rng.randint(9 * 60, 17 * 60)
+
+
+def reportes_del_dia(rng, rutas, puntos, fecha, participacion, ahora, primer_id):
+    """
+    Reportes de `fecha` para las rutas activas y las transiciones a completado
+    (reporte_id, ruta, contratista, hora local) de los que ya ingresaron.
+    """
+    dia = fecha.isoformat()
+    # Los domingos salen menos rutas
+    if fecha.weekday() == 6:
+        participacion *= 0.5
+    reportes, transiciones = [], []
+    reporte_id = primer_id
+    for (ruta_id, ruta, _, _, supervisor, contratista, _, activa), (lat0, lng0) in zip(rutas, puntos):
+        if not activa or rng.random() >= participacion:
+            continue
+        minuto = minuto_del_dia(rng)
+        hora_reporte = f'{dia} {minuto // 60:02d}:{minuto % 60:02d}:{rng.randint(0, 59):02d}'
+        if hora_reporte > ahora:
+            continue
+        clientes = min(int(rng.expovariate(1 / 10)), 80)
+        cajas = max(1, int(rng.gauss(60 + clientes * 4, 30)))
+        # Más clientes pendientes, ingreso más tarde (en cuartos de hora)
+        ingreso = min(max(13 * 60 + clientes * 5 + int(rng.gauss(0, 40)), minuto + 60), 22 * 60)
+        ingreso -= ingreso % 15
+        hora_ingreso = f'{dia} {ingreso // 60:02d}:{ingreso % 60:02d}:00'
+        lat = round(lat0 + rng.gauss(0, 0.004), 6)
+        lng = round(lng0 + rng.gauss(0, 0.004), 6)
+
+        # Los de hoy se completan al ingresar; los anteriores casi todos
+        completado = hora_ingreso <= ahora and rng.random() < 0.97
+        reporte_id += 1
+        if completado:
+            transiciones.append((reporte_id, ruta, contratista, hora_ingreso))
+        reportes.append((
+            reporte_id, contratista, ruta_id, ruta, clientes, cajas, hora_ingreso[11:16],
+            f'{lat}, {lng}', lat, lng, hora_reporte,
+            rng.choice(COMENTARIOS) if rng.random() < 0.2 else '',
+            dia, hora_reporte, 'completado' if completado else 'activo',
+            nombre_persona(rng) if rng.random() < 0.6 else 'Sistema', supervisor,
+        ))
+    return reportes, transiciones
+
+
+def en_utc(hora_local, segundos=0):
+    momento = datetime.fromisoformat(hora_local) + DESFASE_UTC + timedelta(seconds=segundos)
+    return momento.isoformat(' ')
+
+
+def actividad_del_dia(rng, usuarios, fecha, sesiones, transiciones, ahora):
+    """Eventos de activity_log de `fecha`: sesiones de los usuarios y cambios de estado"""
+    dia = fecha.isoformat()
+    eventos = []
+    for _ in range(round(len(usuarios) * sesiones)):
+        user_id, username, ip = rng.choice(usuarios)
+        minuto = minuto_del_dia(rng)
+        inicio = f'{dia} {minuto // 60:02d}:{minuto % 60:02d}:{rng.randint(0, 59):02d}'
+        if inicio > ahora:
+            continue
+        if rng.random() < 0.05:
+            eventos.append((None, 'failed_login', None, None,
+                            f'Intento de login fallido para usuario: {username}', ip, en_utc(inicio)))
+        segundos = rng.randint(5, 60)
+        eventos.append((user_id, 'login', None, None, f'Usuario {username} inició sesión',
+                        ip, en_utc(inicio, segundos)))
+        # Refrescos del panel: la mayoría en la primera página
+        for _ in range(1 + min(int(rng.expovariate(1 / 4)), 30)):
+            segundos += rng.randint(30, 600)
+            pagina = 1 if rng.random() < 0.8 else rng.randint(2, 5)
+            eventos.append((user_id, 'access_admin', None, None,
+                            f'Acceso al panel de administración de rutas - Página {pagina}',
+                            ip, en_utc(inicio, segundos)))
+        if rng.random() < 0.1:
+            segundos += rng.randint(30, 300)
+            eventos.append((user_id, 'export_reportes', None, None,
+                            f'Exportó reportes del {dia} al {dia}', ip, en_utc(inicio, segundos)))
+        if rng.random() < 0.4:
+            segundos += rng.randint(30, 900)
+            eventos.append((user_id, 'logout', None, None, f'Usuario {username} cerró sesión',
+                            ip, en_utc(inicio, segundos)))
+
+    for reporte_id, ruta, contratista, hora in transiciones:
+        user_id, _, ip = rng.choice(usuarios)
+        eventos.append((user_id, 'update_reporte_status', 'reporte', reporte_id,
+                        f'Ruta {ruta} ({contratista}): activo → completado',
+                        ip, en_utc(hora, rng.randint(0, 1800))))
+    return eventos
+
+
+def quitar_derivados(conn):
+    """
+    Quitar índices secundarios y triggers de reportes_rutas antes de la carga.
+    Devuelve sus definiciones (sqlite_master) para reconstruir_derivados.
+    """
+    definiciones = conn.execute('''
+        SELECT type, name, sql FROM sqlite_master
+        WHERE (type = 'index' AND sql IS NOT NULL)
+           OR (type = 'trigger' AND tbl_name = 'reportes_rutas')
+    ''').fetchall()
+    for tipo, nombre, _ in definiciones:
+        conn.execute(f'DROP {tipo.upper()} {nombre}')
+    return [sql for _, _, sql in definiciones]
+
+
+def reconstruir_derivados(conn, definiciones):
+    """Recrear índices y triggers y llenar el resumen diario y los agregados"""
+    llenar_derivados(conn)
+    for sql in definiciones:
+        conn.execute(sql)
+
+
+def generar(ruta_db, contratistas=40, rutas=2000, usuarios=50, dias=90, participacion=0.8,
+            sesiones=2.0, incluir_hoy=False, semilla=42, lote=FILAS_POR_LOTE, silencioso=False):
+    """
+    Crear `ruta_db` y llenarla. Los reportes cubren los `dias` anteriores a hoy
+    (y hoy hasta la hora actual con incluir_hoy). Devuelve los conteos por tabla.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicializar_base_datos(ruta_db)
+    conn = sqlite3.connect(ruta_db)
+    if conn.execute('SELECT COUNT(*) FROM rutas').fetchone()[0]:
+        conn.close()
+        raise ValueError(f'{ruta_db} ya tiene rutas; use --reemplazar o otra base')
+
+    rng = random.Random(semilla)
+    for pragma in PRAGMAS_CARGA:
+        conn.execute(pragma)
+
+    filas_rutas = generar_catalogo(rng, contratistas, rutas)
+    # Punto de salida de cada ruta a unos kilómetros del centro
+    puntos = [(CENTRO_GPS[0] + rng.gauss(0, 0.05), CENTRO_GPS[1] + rng.gauss(0, 0.05))
+              for _ in filas_rutas]
+    conn.execute('BEGIN')
+    derivados = quitar_derivados(conn)
+    conn.executemany(SQL_INSERTAR_RUTA, filas_rutas)
+    conn.executemany(SQL_INSERTAR_USUARIO, generar_usuarios(rng, usuarios))
+    cuentas = [(fila[0], fila[1], f'190.56.{rng.randint(0, 255)}.{rng.randint(1, 254)}')
+               for fila in conn.execute('SELECT id, username FROM users ORDER BY id')]
+
+    ahora = datetime.now(pytz.timezone('America/Guatemala')).strftime('%Y-%m-%d %H:%M:%S')
+    hoy = datetime.strptime(ahora[:10], '%Y-%m-%d').date()
+    fechas = [hoy - timedelta(days=dia) for dia in range(dias, 0, -1)]
+    if incluir_hoy:
+        fechas.append(hoy)
+
+    conteos = {'reportes_rutas': 0, 'activity_log': 0}
+    pendientes = {SQL_INSERTAR_REPORTE: [], SQL_INSERTAR_ACTIVIDAD: []}
+
+    def volcar(forzar=False):
+        for sql, filas in pendientes.items():
+            if filas and (forzar or len(filas) >= lote):
+                conn.executemany(sql, filas)
+                filas.clear()
+
+    for fecha in fechas:
+        reportes, transiciones = reportes_del_dia(
+            rng, filas_rutas, puntos, fecha, participacion, ahora, conteos['reportes_rutas'])
+        eventos = actividad_del_dia(rng, cuentas, fecha, sesiones, transiciones, ahora)
+        pendientes[SQL_INSERTAR_REPORTE].extend(reportes)
+        pendientes[SQL_INSERTAR_ACTIVIDAD].extend(eventos)
+        conteos['reportes_rutas'] += len(reportes)
+        conteos['activity_log'] += len(eventos)
+        volcar()
+    volcar(forzar=True)
+
+    inicio = time.perf_counter()
+    reconstruir_derivados(conn, derivados)
+    conn.commit()
+    if not silencioso:
+        print(f"🔧 Índices, triggers, resumen y agregados en {time.perf_counter() - inicio:.1f} s")
+
+    conn.execute('PRAGMA locking_mode=NORMAL')
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('ANALYZE')
+    conn.close()
+
+    conteos.update(contratistas=len({fila[5] for fila in filas_rutas}), rutas=len(filas_rutas),
+                   users=len(cuentas))
+    return conteos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generador de datos sintéticos para pruebas de escala')
+    parser.add_argument('--db', default='sintetico.db', help='base a crear')
+    parser.add_argument('--contratistas', type=int, default=40)
+    parser.add_argument('--rutas', type=int, default=2000)
+    parser.add_argument('--usuarios', type=int, default=50)
+    parser.add_argument('--dias', type=int, default=90, help='días de historia antes de hoy')
+    parser.add_argument('--participacion', type=float, default=0.8,
+                        help='fracción de rutas activas que reporta cada día')
+    parser.add_argument('--sesiones', type=float, default=2.0,
+                        help='sesiones en el panel por usuario y día (activity_log)')
+    parser.add_argument('--incluir-hoy', action='store_true', help='generar también los reportes de hoy')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--lote', type=int, default=FILAS_POR_LOTE, help='filas por executemany')
+    parser.add_argument('--reemplazar', action='store_true', help='borrar --db si ya existe')
+    args = parser.parse_args()
+
+    if args.reemplazar:
+        for sufijo in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + sufijo):
+                os.remove(args.db + sufijo)
+
+    inicio = time.perf_counter()
+    try:
+        conteos = generar(args.db, args.contratistas, args.rutas, args.usuarios, args.dias,
+                          args.participacion, args.sesiones, args.incluir_hoy, args.semilla, args.lote)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    duracion = time.perf_counter() - inicio
+
+    filas = conteos['reportes_rutas'] + conteos['activity_log']
+    print(f"✅ {args.db}: {os.path.getsize(args.db) / 1024 ** 2:.1f} MB en {duracion:.1f} s "
+          f"({filas / duracion:,.0f} filas/s)")
+    for tabla, cantidad in conteos.items():
+        print(f"   {tabla}: {cantidad:,}")
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
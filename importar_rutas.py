@@ -0,0 +1,132 @@
+"""
+Importación del catálogo de rutas desde DB_Rutas.xlsx.
+
+La hoja se normaliza con operaciones vectorizadas de pandas (sin recorrer
+fila por fila) y las rutas válidas se insertan con un solo executemany.
+Las filas rechazadas se reportan juntas al final en lugar de una por una.
+
+La recarga compara la hoja con la tabla rutas usando ruta + contratista
+como clave (CODIGO tiene repetidos y vacíos) y aplica solo las diferencias:
+las rutas existentes conservan su id, de modo que los reportes siguen
+enlazados, y las que ya no aparecen en el Excel se retiran (activa = 0).
+
+pandas se importa al cargar este módulo: app.py solo lo importa dentro de
+load_rutas_from_excel para que los workers no paguen su costo al arrancar.
+"""
+import pandas as pd
+
+from catalogo import ARCHIVO_EXCEL
+
+# Columnas del Excel en el orden de las columnas de la tabla rutas
+COLUMNAS_EXCEL = ['RUTA', 'CODIGO', 'PLACA', 'SUPERVISOR', 'CONTRATISTA', 'TIPO']
+COLUMNAS_REQUERIDAS = ['RUTA', 'CODIGO', 'CONTRATISTA']
+
+SQL_INSERTAR_RUTA = '''
+    INSERT INTO rutas (ruta, codigo, placa, supervisor, contratista, tipo)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+SQL_ACTUALIZAR_RUTA = '''
+    UPDATE rutas
+    SET ruta = ?, codigo = ?, placa = ?, supervisor = ?, contratista = ?, tipo = ?, activa = 1
+    WHERE id = ?
+'''
+
+
+def leer_excel(archivo=ARCHIVO_EXCEL):
+    """Leer la primera hoja del Excel de rutas"""
+    return pd.read_excel(archivo)
+
+
+def normalizar_rutas(df):
+    """
+    Convertir la hoja en filas listas para insertar.
+    Devuelve (filas, rechazadas): filas es una lista de tuplas en el orden de
+    SQL_INSERTAR_RUTA y rechazadas un DataFrame con la fila de Excel y el motivo.
+    """
+    faltantes = [columna for columna in COLUMNAS_REQUERIDAS if columna not in df.columns]
+    if faltantes:
+        raise ValueError(f"Faltan columnas requeridas en el Excel: {', '.join(faltantes)}")
+
+    # Las columnas opcionales ausentes quedan vacías
+    datos = df.reindex(columns=COLUMNAS_EXCEL).fillna('').astype(str)
+    datos = datos.apply(lambda columna: columna.str.strip())
+
+    # contratista es NOT NULL en la tabla rutas; ruta + contratista es la clave
+    motivos = pd.Series('', index=datos.index)
+    motivos[datos.duplicated(['RUTA', 'CONTRATISTA'])] = 'ruta + contratista repetida'
+    motivos[datos['CONTRATISTA'] == ''] = 'sin contratista'
+    rechazada = motivos != ''
+
+    rechazadas = datos.loc[rechazada, ['RUTA']].assign(
+        fila_excel=datos.index[rechazada] + 2,  # encabezado + base 1
+        motivo=motivos[rechazada]
+    )
+
+    filas = list(datos.loc[~rechazada].itertuples(index=False, name=None))
+    return filas, rechazadas
+
+
+def reportar_rechazadas(rechazadas, limite=20):
+    """Imprimir un resumen de las filas rechazadas"""
+    if rechazadas.empty:
+        return
+    print(f"⚠️ {len(rechazadas)} fila(s) rechazada(s):")
+    for motivo, grupo in rechazadas.groupby('motivo'):
+        filas = ', '.join(str(f) for f in grupo['fila_excel'].head(limite))
+        extra = f" y {len(grupo) - limite} más" if len(grupo) > limite else ''
+        print(f"   - {motivo}: filas {filas}{extra}")
+
+
+def clave_ruta(ruta, contratista):
+    return (ruta.strip(), contratista.strip())
+
+
+def sincronizar_rutas(conn, filas):
+    """
+    Aplicar sobre la tabla rutas solo las diferencias con `filas`
+    (dentro de la transacción del llamador). Devuelve los contadores
+    insertadas, actualizadas, retiradas y sin_cambios.
+    """
+    existentes = {}
+    duplicadas = []
+    for fila in conn.execute('''
+        SELECT id, ruta, codigo, placa, supervisor, contratista, tipo, activa
+        FROM rutas ORDER BY activa DESC, id
+    '''):
+        clave = clave_ruta(fila[1], fila[5])
+        if clave in existentes:
+            # Restos de cargas anteriores: se conserva el id activo más antiguo
+            if fila[7]:
+                duplicadas.append(fila[0])
+        else:
+            existentes[clave] = fila
+
+    insertar, actualizar = [], []
+    for fila in filas:
+        actual = existentes.pop(clave_ruta(fila[0], fila[4]), None)
+        if actual is None:
+            insertar.append(fila)
+        elif tuple(actual[1:7]) != fila or not actual[7]:
+            actualizar.append(fila + (actual[0],))
+
+    # Lo que quedó en `existentes` ya no aparece en el Excel
+    retirar = [(fila[0],) for fila in existentes.values() if fila[7]]
+    retirar += [(ruta_id,) for ruta_id in duplicadas]
+
+    conn.executemany(SQL_INSERTAR_RUTA, insertar)
+    conn.executemany(SQL_ACTUALIZAR_RUTA, actualizar)
+    conn.executemany('UPDATE rutas SET activa = 0 WHERE id = ?', retirar)
+
+    return {
+        'insertadas': len(insertar),
+        'actualizadas': len(actualizar),
+        'retiradas': len(retirar),
+        'sin_cambios': len(filas) - len(insertar) - len(actualizar),
+    }
+
+
+def insertar_rutas(conn, filas):
+    """Insertar las filas normalizadas (dentro de la transacción del llamador)"""
+    conn.executemany(SQL_INSERTAR_RUTA, filas)
+    return len(filas)
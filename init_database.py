@@ -3,7 +3,9 @@
 
 import sqlite3
 import os
-from werkzeug.security import generate_password_hash
+import sys
+from migraciones import inicializar_base_datos
+from catalogo import excel_sin_cambios, guardar_huella_excel
 
 # Definir ruta de base de datos
 DATABASE = 'sistema_rutas.db'
@@ -17,126 +19,41 @@ def init_db():
         print(f"📁 Archivo de base de datos encontrado: {DATABASE}")
     else:
         print(f"⚠️ Creando nuevo archivo de base de datos: {DATABASE}")
-        
-    conn = sqlite3.connect(DATABASE)
-    cursor = conn.cursor()
-    
-    # Configurar SQLite para mejor rendimiento
-    cursor.execute("PRAGMA journal_mode=WAL")
-    cursor.execute("PRAGMA synchronous=NORMAL")
-    cursor.execute("PRAGMA foreign_keys=ON")
-    cursor.execute("PRAGMA temp_store=MEMORY")
-    
-    # Tabla para almacenar datos de rutas (cargados desde Excel)
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS rutas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ruta TEXT NOT NULL,
-            codigo TEXT,
-            placa TEXT,
-            supervisor TEXT,
-            contratista TEXT NOT NULL,
-            tipo TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Tabla para reportes de rutas diarios
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reportes_rutas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            contratista TEXT NOT NULL,
-            ruta_id INTEGER NOT NULL,
-            ruta_codigo TEXT NOT NULL,
-            clientes_pendientes INTEGER NOT NULL DEFAULT 0,
-            cajas_camion INTEGER NOT NULL DEFAULT 0,
-            hora_aproximada_ingreso TIME NOT NULL,
-            ubicacion_exacta TEXT,
-            latitud REAL,
-            longitud REAL,
-            hora_exacta_envio DATETIME DEFAULT CURRENT_TIMESTAMP,
-            comentarios TEXT,
-            fecha_reporte DATE DEFAULT (date('now')),
-            hora_reporte DATETIME DEFAULT CURRENT_TIMESTAMP,
-            estado TEXT DEFAULT 'activo',
-            reportado_por TEXT,
-            FOREIGN KEY (ruta_id) REFERENCES rutas (id)
-        )
-    ''')
-    
-    # Tabla para usuarios del sistema
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT UNIQUE,
-            password_hash TEXT NOT NULL,
-            role TEXT NOT NULL DEFAULT 'user',
-            is_active INTEGER DEFAULT 1,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            last_login DATETIME,
-            created_by INTEGER
-        )
-    ''')
-    
-    # Tabla para log de actividades
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS activity_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            action TEXT NOT NULL,
-            target_type TEXT,
-            target_id INTEGER,
-            details TEXT,
-            ip_address TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Crear usuario administrador por defecto si no existe
-    existing_admin = cursor.execute(
-        'SELECT id FROM users WHERE username = ?', ('admin',)
-    ).fetchone()
     
-    if not existing_admin:
-        admin_password_hash = generate_password_hash('admin123')
-        cursor.execute('''
-            INSERT INTO users (username, email, password_hash, role, is_active)
-            VALUES (?, ?, ?, ?, ?)
-        ''', ('admin', 'admin@sistema-rutas.com', admin_password_hash, 'admin', 1))
-        print("✅ Usuario admin creado")
-    
-    # Crear supervisor de ejemplo si no existe
-    existing_supervisor = cursor.execute(
-        'SELECT id FROM users WHERE username = ?', ('supervisor',)
-    ).fetchone()
-    
-    if not existing_supervisor:
-        supervisor_password_hash = generate_password_hash('supervisor123')
-        cursor.execute('''
-            INSERT INTO users (username, email, password_hash, role, is_active)
-            VALUES (?, ?, ?, ?, ?)
-        ''', ('supervisor', 'supervisor@sistema-rutas.com', supervisor_password_hash, 'supervisor', 1))
-    
-    print("✅ Usuarios por defecto creados:")
-    print("\n   Admin: admin / admin123")
-    print("\n   Supervisor: supervisor / supervisor123")
+    # Tablas, índices, registro de cambios y usuarios por defecto (migraciones versionadas)
+    version = inicializar_base_datos(DATABASE)
+    print(f"📊 Esquema de la base de datos en versión {version}")
     
     # Verificar si hay rutas
-    rutas_count = cursor.execute('SELECT COUNT(*) FROM rutas').fetchone()[0]
-    print(f"📊 La base de datos tiene {rutas_count} rutas registradas")
-    
-    conn.commit()
+    conn = sqlite3.connect(DATABASE)
+    rutas_count = conn.execute('SELECT COUNT(*) FROM rutas').fetchone()[0]
     conn.close()
+    print(f"📊 La base de datos tiene {rutas_count} rutas registradas")
     print("✅ Base de datos inicializada correctamente")
 
-def cargar_datos_excel():
-    """Cargar datos desde el archivo Excel"""
+def cargar_datos_excel(forzar=False):
+    """Cargar datos desde el archivo Excel (se omite si no cambió desde la última carga)"""
     try:
+        # Verificar si existe el archivo Excel
+        excel_path = 'DB_Rutas.xlsx'
+        if not os.path.exists(excel_path):
+            print(f"❌ No se encontró el archivo {excel_path}")
+            return False
+        
+        # Comparar con la huella de la última carga antes de importar pandas
+        conn = sqlite3.connect(DATABASE)
+        sin_cambios, huella = excel_sin_cambios(conn, excel_path)
+        if sin_cambios and not forzar:
+            guardar_huella_excel(conn, huella)
+            conn.commit()
+            conn.close()
+            print(f"✅ {excel_path} sin cambios desde la última carga, se omite la lectura")
+            return True
+        conn.close()
+        
         # Verificar si existe pandas
         try:
-            import pandas as pd
+            from importar_rutas import leer_excel, normalizar_rutas, reportar_rechazadas, sincronizar_rutas
             PANDAS_AVAILABLE = True
             print("✅ Pandas importado correctamente")
         except ImportError as e:
@@ -144,65 +61,34 @@ def cargar_datos_excel():
             print("❌ No se pueden cargar datos desde Excel")
             return False
         
-        # Verificar si existe el archivo Excel
-        excel_path = 'DB_Rutas.xlsx'
-        if not os.path.exists(excel_path):
-            print(f"❌ No se encontró el archivo {excel_path}")
-            return False
-        
         print(f"📊 Cargando datos desde {excel_path}...")
-        df = pd.read_excel(excel_path)
-        
+        df = leer_excel(excel_path)
         print(f"📋 Excel leído correctamente. Encontradas {len(df)} filas")
         print(f"📋 Columnas en el Excel: {', '.join(df.columns.tolist())}")
         
-        # Verificar columnas requeridas
-        required_columns = ['RUTA', 'CODIGO', 'CONTRATISTA']
-        missing_columns = [col for col in required_columns if col not in df.columns]
-        if missing_columns:
-            print(f"❌ Error: Faltan columnas requeridas en el Excel: {', '.join(missing_columns)}")
+        # Normalizar la hoja (verifica las columnas requeridas)
+        try:
+            filas, rechazadas = normalizar_rutas(df)
+        except ValueError as e:
+            print(f"❌ Error: {e}")
             return False
         
         conn = sqlite3.connect(DATABASE)
         cursor = conn.cursor()
         
-        # Limpiar tabla de rutas existente
-        rutas_count = cursor.execute('SELECT COUNT(*) FROM rutas').fetchone()[0]
-        print(f"🔄 Eliminando {rutas_count} rutas existentes...")
-        cursor.execute('DELETE FROM rutas')
+        # Aplicar solo las diferencias con las rutas existentes (los ids se conservan)
+        cambios = sincronizar_rutas(cursor, filas)
+        reportar_rechazadas(rechazadas)
         
-        # Insertar datos desde Excel
-        loaded_count = 0
-        for idx, row in df.iterrows():
-            try:
-                ruta = str(row['RUTA']) if pd.notna(row['RUTA']) else ''
-                codigo = str(row['CODIGO']) if pd.notna(row['CODIGO']) else ''
-                placa = str(row['PLACA']) if pd.notna(row['PLACA']) else ''
-                supervisor = str(row['SUPERVISOR']) if pd.notna(row['SUPERVISOR']) else ''
-                contratista = str(row['CONTRATISTA']) if pd.notna(row['CONTRATISTA']) else ''
-                tipo = str(row['TIPO']) if pd.notna(row['TIPO']) else ''
-                
-                # Verificar que contratista no sea vacío (es NOT NULL)
-                if not contratista:
-                    print(f"⚠️ Fila {idx+2}: Saltando ruta sin contratista: {ruta}")
-                    continue
-                
-                cursor.execute('''
-                    INSERT INTO rutas (ruta, codigo, placa, supervisor, contratista, tipo)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (ruta, codigo, placa, supervisor, contratista, tipo))
-                
-                loaded_count += 1
-                if loaded_count % 50 == 0:
-                    print(f"🔄 {loaded_count} rutas procesadas...")
-            except Exception as row_error:
-                print(f"⚠️ Error en fila {idx+2}: {row_error}")
-                continue
+        # Los triggers de rutas ya avisaron a los workers que el catálogo cambió
+        guardar_huella_excel(conn, huella)
         
         conn.commit()
         conn.close()
         
-        print(f"✅ {loaded_count} rutas cargadas desde Excel correctamente")
+        print(f"✅ Rutas sincronizadas desde Excel: {cambios['insertadas']} nuevas, "
+              f"{cambios['actualizadas']} actualizadas, {cambios['retiradas']} retiradas, "
+              f"{cambios['sin_cambios']} sin cambios")
         return True
         
     except Exception as e:
@@ -219,7 +105,7 @@ if __name__ == "__main__":
     print("\n🔄 Verificando archivo Excel para cargar datos...")
     if os.path.exists("DB_Rutas.xlsx"):
         print("📋 Archivo DB_Rutas.xlsx encontrado")
-        cargar_datos_excel()
+        cargar_datos_excel(forzar='--force' in sys.argv)
     else:
         print("⚠️ No se encontró el archivo DB_Rutas.xlsx")
         print("⚠️ La aplicación no tendrá rutas disponibles")
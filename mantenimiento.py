@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+"""
+Mantenimiento de la base SQLite del Sistema de Gestión de Rutas.
+
+SQLite hace checkpoints automáticos del WAL cada ~1000 páginas, pero en modo
+PASSIVE: con lectores activos no alcanza a copiar todo y el archivo -wal
+nunca se reduce, así que crece con las escrituras continuas y las lecturas
+se vuelven más lentas. Este módulo:
+
+- hace un checkpoint PASSIVE cuando el WAL pasa de `wal_pasivo` bytes y
+  uno TRUNCATE (que deja el -wal en 0 bytes) cuando pasa de `wal_truncar`;
+- ejecuta PRAGMA optimize cada `optimizar_cada` segundos y un ANALYZE
+  acotado (analysis_limit) cada `analizar_cada` segundos;
+- cada `depurar_cada` segundos borra de reportes_cambios lo registrado hace
+  más de `cambios_dias` días (el feed en vivo del panel solo lee los
+  cambios recientes);
+- con un `archivador` (archivador.Archivador), mueve una vez por
+  `archivar_cada` segundos los reportes viejos a los archivos mensuales;
+- informa el tamaño del WAL, las páginas y la fragmentación (páginas en
+  la lista libre) para /metrics.
+
+En la aplicación cada worker arranca un hilo (MantenimientoBD.iniciar),
+pero solo trabaja el que tiene el lock de <base>.mantenimiento.lock (flock):
+así los checkpoints, el ANALYZE y el archivado no se repiten por worker ni
+compiten por la escritura. Si ese worker termina, el sistema libera el lock
+y lo toma otro en su siguiente vuelta.
+Usa su propia conexión con un busy timeout corto: un checkpoint TRUNCATE
+espera a los lectores y mientras tanto detiene a los escritores, así que
+si no lo logra en `espera` segundos se reintenta en la siguiente vuelta.
+VACUUM reescribe toda la base y solo se ofrece por línea de comandos.
+
+Uso:
+python mantenimiento.py [--db sistema_rutas.db] [--checkpoint PASSIVE|TRUNCATE]
+                        [--optimizar] [--analizar] [--depurar] [--cambios-dias 7]
+                        [--vacuum] [--cada SEGUNDOS]
+"""
+import argparse
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: sin gunicorn hay un solo proceso y no hace falta elegir
+    fcntl = None
+
+MODOS_CHECKPOINT = ('PASSIVE', 'TRUNCATE')
+
+# Filas por índice que lee ANALYZE (0 = sin límite)
+LIMITE_ANALISIS = 1000
+
+# Filas de reportes_cambios borradas por transacción al depurar
+LOTE_DEPURACION = 5000
+
+
+def tamano_wal(database):
+    """Tamaño en bytes del archivo -wal (0 si no existe)"""
+    try:
+        return os.path.getsize(database + '-wal')
+    except OSError:
+        return 0
+
+
+def estado_base(conn, database):
+    """Tamaño del WAL, páginas de la base y fragmentación (fracción de páginas libres)"""
+    tamano_pagina = conn.execute('PRAGMA page_size').fetchone()[0]
+    paginas = conn.execute('PRAGMA page_count').fetchone()[0]
+    libres = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return {
+        'wal_bytes': tamano_wal(database),
+        'bytes': paginas * tamano_pagina,
+        'tamano_pagina': tamano_pagina,
+        'paginas': paginas,
+        'paginas_libres': libres,
+        'fragmentacion': libres / paginas if paginas else 0.0,
+    }
+
+
+def checkpoint(conn, modo='PASSIVE'):
+    """
+    Checkpoint del WAL. Devuelve (completo, paginas_wal, paginas_copiadas):
+    completo es False si algún lector o escritor impidió terminarlo.
+    """
+    modo = modo.upper()
+    if modo not in MODOS_CHECKPOINT:
+        raise ValueError(f'Modo de checkpoint inválido: {modo}')
+    ocupado, paginas_wal, copiadas = conn.execute(f'PRAGMA wal_checkpoint({modo})').fetchone()
+    return not ocupado and copiadas == paginas_wal, paginas_wal, copiadas
+
+
+def optimizar(conn, analizar=False):
+    """PRAGMA optimize, o un ANALYZE completo pero acotado a LIMITE_ANALISIS filas por índice"""
+    if analizar:
+        conn.execute(f'PRAGMA analysis_limit={LIMITE_ANALISIS}')
+        conn.execute('ANALYZE')
+    else:
+        conn.execute('PRAGMA optimize')
+
+
+def depurar_cambios(conn, dias):
+    """
+    Borrar de reportes_cambios lo registrado hace más de `dias` días, por
+    lotes para no retener el lock de escritura. Siempre queda el último
+    cambio: su seq es el watermark que reciben los clientes nuevos del feed.
+    Devuelve las filas borradas.
+    """
+    fila = conn.execute('''
+        SELECT seq FROM reportes_cambios
+        WHERE registrado_en >= datetime('now', ?)
+        ORDER BY seq LIMIT 1
+    ''', (f'-{dias} days',)).fetchone()
+    limite = fila[0] if fila else conn.execute('SELECT MAX(seq) FROM reportes_cambios').fetchone()[0]
+    if limite is None:
+        return 0
+    borradas = 0
+    while True:
+        cursor = conn.execute('''
+            DELETE FROM reportes_cambios WHERE seq IN (
+                SELECT seq FROM reportes_cambios WHERE seq < ? ORDER BY seq LIMIT ?
+            )
+        ''', (limite, LOTE_DEPURACION))
+        conn.commit()
+        borradas += cursor.rowcount
+        if cursor.rowcount < LOTE_DEPURACION:
+            return borradas
+
+
+class MantenimientoBD:
+    """Checkpoints y estadísticas del planificador en un hilo en segundo plano"""
+
+    def __init__(self, database, intervalo=60.0, wal_pasivo=4 * 1024 ** 2,
+                 wal_truncar=64 * 1024 ** 2, optimizar_cada=3600.0,
+                 analizar_cada=86400.0, espera=1.0, archivador=None, archivar_cada=86400.0,
+                 cambios_dias=7, depurar_cada=3600.0):
+        self.database = database
+        self.intervalo = intervalo
+        self.wal_pasivo = wal_pasivo
+        self.wal_truncar = wal_truncar
+        self.optimizar_cada = optimizar_cada
+        self.analizar_cada = analizar_cada
+        self.espera = espera
+        self.archivador = archivador
+        self.archivar_cada = archivar_cada
+        self.cambios_dias = cambios_dias
+        self.depurar_cada = depurar_cada
+        self._lock = threading.Lock()
+        self._pid = None
+        self._hilo = None
+        self._detener = None
+        # La primera vuelta no optimiza: el arranque ya es bastante trabajo
+        self._ultimo_optimize = self._ultimo_analyze = time.monotonic()
+        self._ultimo_archivo = None
+        self._ultima_depuracion = None
+        self._archivo_lock = None
+        self._stats = {
+            'vueltas': 0,
+            'checkpoints_pasivos': 0,
+            'checkpoints_truncate': 0,
+            'checkpoints_incompletos': 0,
+            'paginas_copiadas': 0,
+            'optimizaciones': 0,
+            'analisis': 0,
+            'reportes_archivados': 0,
+            'cambios_depurados': 0,
+            'errores': 0,
+        }
+        atexit.register(self.cerrar)
+
+    def _contar(self, clave, cantidad=1):
+        with self._lock:
+            self._stats[clave] += cantidad
+
+    def iniciar(self):
+        """Arrancar el hilo (una vez por proceso, también tras un fork)"""
+        if self.intervalo <= 0 or (self._pid == os.getpid() and self._hilo is not None):
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._hilo is not None:
+                return
+            if self._archivo_lock is not None:
+                # Heredado del proceso padre: el lock es suyo, no de este worker
+                self._archivo_lock.close()
+                self._archivo_lock = None
+            self._pid = os.getpid()
+            self._detener = threading.Event()
+            self._hilo = threading.Thread(
+                target=self._ciclo, args=(self._detener,), name='mantenimiento-bd', daemon=True
+            )
+            self._hilo.start()
+
+    @property
+    def ruta_lock(self):
+        return self.database + '.mantenimiento.lock'
+
+    def es_responsable(self):
+        """True si este proceso tiene (o acaba de tomar) el lock del mantenimiento"""
+        if fcntl is None or self._archivo_lock is not None:
+            return True
+        archivo = open(self.ruta_lock, 'a')
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            archivo.close()
+            return False
+        self._archivo_lock = archivo
+        return True
+
+    def _ciclo(self, detener):
+        while not detener.wait(self.intervalo):
+            try:
+                if not self.es_responsable():
+                    continue
+                self.ejecutar()
+            except Exception as e:
+                self._contar('errores')
+                print(f"❌ Error en el mantenimiento de la base: {e}")
+
+    def _conectar(self):
+        return sqlite3.connect(self.database, timeout=self.espera)
+
+    def ejecutar(self, forzar_checkpoint=None, forzar_optimizar=False, forzar_analizar=False,
+                 forzar_depurar=False):
+        """
+        Una vuelta del planificador: checkpoint según el tamaño del WAL y
+        optimize/ANALYZE, depuración y archivado si ya toca. Devuelve la lista
+        de acciones realizadas.
+        """
+        acciones = []
+        wal = tamano_wal(self.database)
+        modo = forzar_checkpoint
+        if modo is None and wal >= self.wal_truncar:
+            modo = 'TRUNCATE'
+        elif modo is None and wal >= self.wal_pasivo:
+            modo = 'PASSIVE'
+
+        ahora = time.monotonic()
+        analizar = forzar_analizar or ahora - self._ultimo_analyze >= self.analizar_cada
+        optimizar_ahora = forzar_optimizar or ahora - self._ultimo_optimize >= self.optimizar_cada
+        depurar = self.cambios_dias > 0 and (forzar_depurar or self._ultima_depuracion is None
+                                             or ahora - self._ultima_depuracion >= self.depurar_cada)
+
+        conn = self._conectar()
+        try:
+            if modo:
+                # TRUNCATE después de un PASSIVE: solo espera a los lectores si ya copió todo
+                completo, paginas_wal, copiadas = checkpoint(conn, 'PASSIVE')
+                self._contar('paginas_copiadas', max(copiadas, 0))
+                realizado = 'PASSIVE'
+                if modo == 'TRUNCATE' and completo:
+                    completo = checkpoint(conn, 'TRUNCATE')[0]
+                    realizado = 'TRUNCATE'
+                self._contar('checkpoints_truncate' if realizado == 'TRUNCATE' else 'checkpoints_pasivos')
+                if not completo:
+                    self._contar('checkpoints_incompletos')
+                acciones.append(f'checkpoint {realizado.lower()} ({copiadas}/{paginas_wal} páginas'
+                                f'{"" if completo else ", incompleto"})')
+            if analizar:
+                optimizar(conn, analizar=True)
+                self._ultimo_analyze = self._ultimo_optimize = ahora
+                self._contar('analisis')
+                acciones.append('analyze')
+            elif optimizar_ahora:
+                optimizar(conn)
+                self._ultimo_optimize = ahora
+                self._contar('optimizaciones')
+                acciones.append('optimize')
+            if depurar:
+                self._ultima_depuracion = ahora
+                borradas = depurar_cambios(conn, self.cambios_dias)
+                self._contar('cambios_depurados', borradas)
+                acciones.append(f'depuración de cambios ({borradas} filas)')
+        finally:
+            conn.close()
+        # El archivado va al final y con su propia conexión (transacción por día)
+        if self.archivador is not None and (
+                self._ultimo_archivo is None or ahora - self._ultimo_archivo >= self.archivar_cada):
+            self._ultimo_archivo = ahora
+            movidos = sum(self.archivador.archivar().values())
+            self._contar('reportes_archivados', movidos)
+            acciones.append(f'archivo ({movidos} reportes)')
+        self._contar('vueltas')
+        return acciones
+
+    def estado(self):
+        """Estado actual del archivo de la base (ver estado_base)"""
+        conn = self._conectar()
+        try:
+            return estado_base(conn, self.database)
+        finally:
+            conn.close()
+
+    def cerrar(self, timeout=5.0):
+        """Detener el hilo y soltar el lock para que lo tome otro worker"""
+        with self._lock:
+            hilo, detener = self._hilo, self._detener
+            if hilo is None or self._pid != os.getpid():
+                return
+            self._hilo = None
+        detener.set()
+        hilo.join(timeout)
+        if self._archivo_lock is not None and not hilo.is_alive():
+            self._archivo_lock.close()
+            self._archivo_lock = None
+
+    def estadisticas(self):
+        """Contadores del planificador y si este proceso es el que lo ejecuta"""
+        with self._lock:
+            return dict(self._stats, responsable=int(fcntl is None or self._archivo_lock is not None))
+
+
+def imprimir_estado(estado):
+    print(f"📊 WAL: {estado['wal_bytes'] / 1024 ** 2:.1f} MB | base: {estado['bytes'] / 1024 ** 2:.1f} MB "
+          f"({estado['paginas']} páginas de {estado['tamano_pagina']} bytes) | "
+          f"libres: {estado['paginas_libres']} ({estado['fragmentacion']:.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mantenimiento de la base SQLite')
+    parser.add_argument('--db', default='sistema_rutas.db')
+    parser.add_argument('--checkpoint', choices=MODOS_CHECKPOINT, type=str.upper,
+                        help='forzar un checkpoint en este modo')
+    parser.add_argument('--optimizar', action='store_true', help='forzar PRAGMA optimize')
+    parser.add_argument('--analizar', action='store_true', help='forzar ANALYZE')
+    parser.add_argument('--depurar', action='store_true',
+                        help='forzar la depuración de reportes_cambios')
+    parser.add_argument('--cambios-dias', type=int, default=7,
+                        help='días de reportes_cambios que se conservan')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='VACUUM (reescribe la base; ejecutar con la aplicación detenida)')
+    parser.add_argument('--cada', type=float, default=0,
+                        help='repetir la vuelta del planificador cada N segundos')
+    parser.add_argument('--wal-pasivo-mb', type=float, default=4)
+    parser.add_argument('--wal-truncar-mb', type=float, default=64)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"❌ No existe la base {args.db}")
+        return 1
+
+    mantenimiento = MantenimientoBD(
+        args.db, wal_pasivo=args.wal_pasivo_mb * 1024 ** 2,
+        wal_truncar=args.wal_truncar_mb * 1024 ** 2, espera=5.0,
+        cambios_dias=args.cambios_dias
+    )
+    imprimir_estado(mantenimiento.estado())
+
+    if args.vacuum:
+        inicio = time.perf_counter()
+        conn = sqlite3.connect(args.db, timeout=30)
+        conn.execute('VACUUM')
+        conn.close()
+        print(f"🧹 VACUUM en {time.perf_counter() - inicio:.1f} s")
+
+    while True:
+        inicio = time.perf_counter()
+        acciones = mantenimiento.ejecutar(args.checkpoint, args.optimizar, args.analizar, args.depurar)
+        print(f"🔧 {', '.join(acciones) or 'sin acciones'} ({time.perf_counter() - inicio:.2f} s)")
+        imprimir_estado(mantenimiento.estado())
+        if args.cada <= 0:
+            return 0
+        # Las acciones forzadas solo en la primera vuelta
+        args.checkpoint, args.optimizar, args.analizar, args.depurar = None, False, False, False
+        time.sleep(args.cada)
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
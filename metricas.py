@@ -0,0 +1,167 @@
+"""
+Métricas de la aplicación en formato de texto de Prometheus (/metrics).
+
+Registra por endpoint la latencia (histograma), los requests por código de
+estado y las consultas SQL que hizo cada request; por consulta SQL (verbo +
+tabla principal) el tiempo de ejecución y las filas leídas. Los valores son
+del proceso actual: con varios workers de gunicorn cada uno expone los suyos.
+
+El pool de conexiones informa cada sentencia a través de observar_consulta()
+y observar_filas(); los totales por request se acumulan en un threading.local
+entre iniciar_request() y terminar_request(). Las respuestas en streaming
+(/api/reportes) se miden hasta que Flask entrega los encabezados.
+"""
+import re
+import threading
+import time
+from functools import lru_cache
+
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_SQL = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+PATRON_TABLA = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+(\w+)', re.IGNORECASE)
+
+
+@lru_cache(maxsize=512)
+def etiqueta_consulta(sql):
+    """Etiqueta de baja cardinalidad para una sentencia: 'select reportes_rutas'"""
+    palabras = sql.split(None, 1)
+    if not palabras:
+        return 'vacia'
+    verbo = palabras[0].lower()
+    if verbo in ('pragma', 'begin', 'commit', 'rollback'):
+        return verbo
+    tabla = PATRON_TABLA.search(sql)
+    return f'{verbo} {tabla.group(1)}' if tabla else verbo
+
+
+def escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def formatear_etiquetas(nombres, valores, extra=''):
+    pares = [f'{nombre}="{escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+
+class Metricas:
+    """Contadores e histogramas thread-safe con exportación a Prometheus"""
+
+    def __init__(self, prefijo='rutas'):
+        self.prefijo = prefijo
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # nombre -> (tipo, ayuda, etiquetas, buckets, {valores de etiquetas: dato})
+        self._series = {}
+
+        self.registrar('http_requests_total', 'counter',
+                       'Requests atendidos por endpoint, método y código de estado',
+                       ('endpoint', 'metodo', 'estado'))
+        self.registrar('http_request_duration_seconds', 'histogram',
+                       'Latencia de los requests por endpoint', ('endpoint', 'metodo'), BUCKETS_HTTP)
+        self.registrar('http_sql_queries_total', 'counter',
+                       'Sentencias SQL ejecutadas por los requests de cada endpoint', ('endpoint',))
+        self.registrar('sql_query_duration_seconds', 'histogram',
+                       'Tiempo de ejecución de cada sentencia SQL', ('consulta',), BUCKETS_SQL)
+        self.registrar('sql_fetch_seconds_total', 'counter',
+                       'Tiempo leyendo filas de los resultados', ('consulta',))
+        self.registrar('sql_rows_total', 'counter',
+                       'Filas leídas de los resultados', ('consulta',))
+
+    def registrar(self, nombre, tipo, ayuda, etiquetas=(), buckets=None):
+        self._series[nombre] = (tipo, ayuda, tuple(etiquetas), buckets, {})
+
+    def incrementar(self, nombre, valores=(), cantidad=1):
+        datos = self._series[nombre][4]
+        with self._lock:
+            datos[valores] = datos.get(valores, 0) + cantidad
+
+    def observar(self, nombre, valores, valor):
+        buckets, datos = self._series[nombre][3], self._series[nombre][4]
+        with self._lock:
+            dato = datos.get(valores)
+            if dato is None:
+                # [cuenta por bucket..., suma, cantidad]
+                dato = datos[valores] = [0] * len(buckets) + [0.0, 0]
+            for i, limite in enumerate(buckets):
+                if valor <= limite:
+                    dato[i] += 1
+            dato[-2] += valor
+            dato[-1] += 1
+
+    # --- SQL (llamado por db_pool) ---
+
+    def observar_consulta(self, sql, segundos):
+        self.observar('sql_query_duration_seconds', (etiqueta_consulta(sql),), segundos)
+        actual = getattr(self._local, 'request', None)
+        if actual is not None:
+            actual['consultas'] += 1
+            actual['sql_segundos'] += segundos
+
+    def observar_filas(self, sql, filas, segundos):
+        consulta = (etiqueta_consulta(sql),)
+        self.incrementar('sql_rows_total', consulta, filas)
+        self.incrementar('sql_fetch_seconds_total', consulta, segundos)
+        actual = getattr(self._local, 'request', None)
+        if actual is not None:
+            actual['filas'] += filas
+            actual['sql_segundos'] += segundos
+
+    # --- Requests (llamado por los hooks de Flask) ---
+
+    def iniciar_request(self):
+        self._local.request = {'inicio': time.perf_counter(), 'consultas': 0, 'filas': 0, 'sql_segundos': 0.0}
+
+    def terminar_request(self, endpoint, metodo, estado):
+        """Registrar el request en curso y devolver su resumen (None si no se inició)"""
+        actual = getattr(self._local, 'request', None)
+        if actual is None:
+            return None
+        self._local.request = None
+        segundos = time.perf_counter() - actual['inicio']
+        self.incrementar('http_requests_total', (endpoint, metodo, str(estado)))
+        self.observar('http_request_duration_seconds', (endpoint, metodo), segundos)
+        if actual['consultas']:
+            self.incrementar('http_sql_queries_total', (endpoint,), actual['consultas'])
+        return {
+            'segundos': segundos,
+            'consultas': actual['consultas'],
+            'filas': actual['filas'],
+            'sql_segundos': actual['sql_segundos'],
+        }
+
+    # --- Exportación ---
+
+    def exportar(self, adicionales=()):
+        """
+        Texto de Prometheus con las series registradas y las `adicionales`:
+        (nombre, tipo, ayuda, valor) leídas al momento (pool, log de actividad).
+        """
+        lineas = []
+        with self._lock:
+            series = [(nombre, tipo, ayuda, etiquetas, buckets,
+                       {valores: list(dato) if tipo == 'histogram' else dato for valores, dato in datos.items()})
+                      for nombre, (tipo, ayuda, etiquetas, buckets, datos) in self._series.items()]
+        for nombre, tipo, ayuda, etiquetas, buckets, datos in series:
+            completo = f'{self.prefijo}_{nombre}'
+            lineas.append(f'# HELP {completo} {ayuda}')
+            lineas.append(f'# TYPE {completo} {tipo}')
+            for valores, dato in sorted(datos.items()):
+                if tipo == 'histogram':
+                    for limite, cuenta in zip(buckets, dato):
+                        le = formatear_etiquetas(etiquetas, valores, f'le="{limite}"')
+                        lineas.append(f'{completo}_bucket{le} {cuenta}')
+                    le = formatear_etiquetas(etiquetas, valores, 'le="+Inf"')
+                    lineas.append(f'{completo}_bucket{le} {dato[-1]}')
+                    lineas.append(f'{completo}_sum{formatear_etiquetas(etiquetas, valores)} {dato[-2]}')
+                    lineas.append(f'{completo}_count{formatear_etiquetas(etiquetas, valores)} {dato[-1]}')
+                else:
+                    lineas.append(f'{completo}{formatear_etiquetas(etiquetas, valores)} {dato}')
+        for nombre, tipo, ayuda, valor in adicionales:
+            completo = f'{self.prefijo}_{nombre}'
+            lineas.append(f'# HELP {completo} {ayuda}')
+            lineas.append(f'# TYPE {completo} {tipo}')
+            lineas.append(f'{completo} {valor}')
+        return '\n'.join(lineas) + '\n'
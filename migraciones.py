@@ -0,0 +1,611 @@
+"""
+Migraciones versionadas del esquema del Sistema de Gestión de Rutas.
+
+Cada migración se aplica una sola vez y la versión alcanzada se guarda en
+PRAGMA user_version. inicializar_base_datos() es el único punto de arranque
+del esquema: lo usan app.init_db, init_database.py, railway_fix.py y
+railway_entry.py, y los handlers asumen que el esquema ya existe.
+
+Cada migración lleva su propio SQL y no se modifica una vez publicada, así
+que la versión N aplica siempre lo mismo sin importar cuándo se ejecute.
+Los cambios posteriores (una columna, un trigger distinto) van en una
+migración nueva al final de MIGRACIONES.
+
+Las migraciones 1 y 2 son idempotentes (IF NOT EXISTS, columnas revisadas
+con PRAGMA table_info) para adoptar sin cambios las bases creadas antes de
+este módulo, que tienen user_version = 0.
+"""
+import sqlite3
+
+from werkzeug.security import generate_password_hash
+
+# Usuarios creados en una base nueva: (username, email, contraseña, rol)
+USUARIOS_POR_DEFECTO = [
+    ('admin', 'admin@sistema-rutas.com', 'admin123', 'super_admin'),
+    ('supervisor', 'supervisor@sistema-rutas.com', 'supervisor123', 'supervisor'),
+]
+
+# Los borrados del archivador (archivador.py) no son bajas: el resumen y
+# los agregados conservan los reportes archivados y el feed en vivo no los
+# anuncia. El archivador marca su transacción con esta clave en metadatos,
+# que las demás conexiones nunca llegan a ver. Los triggers de borrado la
+# revisan desde la migración 5.
+CLAVE_ARCHIVANDO = 'archivando'
+
+# Estado actual de las tablas derivadas, para reconstruirlas desde
+# reportes_rutas (generar_datos_sinteticos.py). Las migraciones tienen su
+# propia copia; si una migración nueva cambia estas tablas, actualizar aquí.
+LLENAR_RESUMEN_DIARIO = '''
+    INSERT INTO reportes_daily_summary (
+        fecha_reporte, contratista, reportes, reportes_activos,
+        clientes_pendientes, cajas_camion, ultima_hora_ingreso
+    )
+    SELECT fecha_reporte, contratista, COUNT(*), SUM(estado IS 'activo'),
+           SUM(clientes_pendientes), SUM(cajas_camion), MAX(hora_aproximada_ingreso)
+    FROM reportes_rutas
+    WHERE fecha_reporte IS NOT NULL
+    GROUP BY fecha_reporte, contratista
+'''
+
+LLENAR_AGREGADO = '''
+    INSERT INTO reportes_agregados (
+        periodo, dimension, inicio, clave, contratista,
+        reportes, clientes_pendientes, cajas_camion
+    )
+    SELECT '{periodo}', '{dimension}', {inicio} AS inicio_periodo, {clave} AS clave_grupo,
+           contratista, COUNT(*), SUM(clientes_pendientes), SUM(cajas_camion)
+    FROM reportes_rutas r
+    WHERE r.fecha_reporte IS NOT NULL
+    GROUP BY inicio_periodo, clave_grupo, contratista
+'''
+
+# (periodo, expresión del inicio a partir de la fecha del reporte)
+PERIODOS_AGREGADOS = [
+    ('dia', '{fila}.fecha_reporte'),
+    ('semana', "date({fila}.fecha_reporte, 'weekday 0', '-6 days')"),
+]
+
+# (dimensión, expresión de la clave)
+DIMENSIONES_AGREGADOS = [
+    ('contratista', '{fila}.contratista'),
+    ('ruta', '{fila}.ruta_codigo'),
+    ('supervisor', "COALESCE({fila}.supervisor, '')"),
+]
+
+
+def sentencias_agregados(plantilla, fila, periodos=PERIODOS_AGREGADOS, dimensiones=DIMENSIONES_AGREGADOS):
+    """Repetir `plantilla` para cada periodo y dimensión sobre la fila `fila` (NEW, OLD o alias)"""
+    return [
+        plantilla.format(periodo=periodo, dimension=dimension,
+                         inicio=inicio.format(fila=fila), clave=clave.format(fila=fila))
+        for periodo, inicio in periodos
+        for dimension, clave in dimensiones
+    ]
+
+
+def llenar_derivados(conn):
+    """Volver a calcular el resumen diario y los agregados desde reportes_rutas"""
+    conn.execute('DELETE FROM reportes_daily_summary')
+    conn.execute(LLENAR_RESUMEN_DIARIO)
+    conn.execute('DELETE FROM reportes_agregados')
+    for sentencia in sentencias_agregados(LLENAR_AGREGADO, 'r'):
+        conn.execute(sentencia)
+
+
+def agregar_columna(conn, tabla, columna, tipo):
+    """Agregar una columna si aún no existe"""
+    existentes = {fila[1] for fila in conn.execute(f'PRAGMA table_info({tabla})')}
+    if columna not in existentes:
+        conn.execute(f'ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}')
+
+
+def migracion_1(conn):
+    """Tablas base: rutas, reportes_rutas, users y activity_log"""
+    # Rutas cargadas desde DB_Rutas.xlsx
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS rutas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ruta TEXT NOT NULL,
+            codigo TEXT,
+            placa TEXT,
+            supervisor TEXT,
+            contratista TEXT NOT NULL,
+            tipo TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    # Reportes de rutas diarios
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reportes_rutas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            contratista TEXT NOT NULL,
+            ruta_id INTEGER NOT NULL,
+            ruta_codigo TEXT NOT NULL,
+            clientes_pendientes INTEGER NOT NULL DEFAULT 0,
+            cajas_camion INTEGER NOT NULL DEFAULT 0,
+            hora_aproximada_ingreso TIME NOT NULL,
+            ubicacion_exacta TEXT,
+            latitud REAL,
+            longitud REAL,
+            hora_exacta_envio DATETIME DEFAULT CURRENT_TIMESTAMP,
+            comentarios TEXT,
+            fecha_reporte DATE DEFAULT (date('now')),
+            hora_reporte DATETIME DEFAULT CURRENT_TIMESTAMP,
+            estado TEXT DEFAULT 'activo',
+            reportado_por TEXT,
+            FOREIGN KEY (ruta_id) REFERENCES rutas (id)
+        )
+    ''')
+    # Usuarios del sistema
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            is_active INTEGER DEFAULT 1,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            last_login DATETIME,
+            created_by INTEGER,
+            FOREIGN KEY (created_by) REFERENCES users (id)
+        )
+    ''')
+    # Log de actividades
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS activity_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            action TEXT NOT NULL,
+            target_type TEXT,
+            target_id INTEGER,
+            details TEXT,
+            ip_address TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+
+def migracion_2(conn):
+    """Metadatos, columnas nuevas, registro de cambios e índices"""
+    # Pares clave/valor de la aplicación (generación del catálogo de rutas, etc.)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS metadatos (
+            clave TEXT PRIMARY KEY,
+            valor TEXT,
+            actualizado_en DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Clave generada por el cliente para reintentos seguros (/submit_reportes_batch)
+    agregar_columna(conn, 'reportes_rutas', 'clave_idempotencia', 'TEXT')
+    # Rutas que ya no están en el Excel se retiran en lugar de borrarse
+    agregar_columna(conn, 'rutas', 'activa', 'INTEGER NOT NULL DEFAULT 1')
+
+    # Registro de cambios de reportes_rutas, alimentado por triggers.
+    # seq es AUTOINCREMENT para que nunca se reutilice y sirva como watermark
+    # del feed en vivo del panel (/admin/stream).
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reportes_cambios (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            reporte_id INTEGER NOT NULL,
+            fecha_reporte DATE,
+            contratista TEXT,
+            tipo TEXT NOT NULL,
+            registrado_en DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_reportes_cambios_insert
+        AFTER INSERT ON reportes_rutas
+        BEGIN
+            INSERT INTO reportes_cambios (reporte_id, fecha_reporte, contratista, tipo)
+            VALUES (NEW.id, NEW.fecha_reporte, NEW.contratista, 'insertado');
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_reportes_cambios_update
+        AFTER UPDATE ON reportes_rutas
+        BEGIN
+            INSERT INTO reportes_cambios (reporte_id, fecha_reporte, contratista, tipo)
+            VALUES (NEW.id, NEW.fecha_reporte, NEW.contratista, 'actualizado');
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_reportes_cambios_delete
+        AFTER DELETE ON reportes_rutas
+        BEGIN
+            INSERT INTO reportes_cambios (reporte_id, fecha_reporte, contratista, tipo)
+            VALUES (OLD.id, OLD.fecha_reporte, OLD.contratista, 'eliminado');
+        END
+    ''')
+
+    # Índices secundarios para las consultas frecuentes del panel, la API y la
+    # exportación. fecha_reporte siempre se guarda como 'YYYY-MM-DD', por lo que
+    # las consultas comparan la columna directamente (sin date()).
+    for sentencia in (
+        # Listado del día ordenado por hora (admin, api/reportes)
+        'CREATE INDEX IF NOT EXISTS idx_reportes_fecha_hora '
+        'ON reportes_rutas (fecha_reporte, hora_reporte)',
+        # Listado del día filtrado por contratista y ordenado por hora
+        'CREATE INDEX IF NOT EXISTS idx_reportes_fecha_contratista_hora '
+        'ON reportes_rutas (fecha_reporte, contratista, hora_reporte)',
+        # Cambios de un día a partir de un watermark (/admin/stream)
+        'CREATE INDEX IF NOT EXISTS idx_cambios_fecha_seq '
+        'ON reportes_cambios (fecha_reporte, seq)',
+        # Dropdown de rutas por contratista (/get_rutas)
+        'CREATE INDEX IF NOT EXISTS idx_rutas_contratista_ruta '
+        'ON rutas (contratista, ruta)',
+        # Parcial: las filas sin clave no participan
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_reportes_clave_idempotencia '
+        'ON reportes_rutas (clave_idempotencia) WHERE clave_idempotencia IS NOT NULL',
+    ):
+        conn.execute(sentencia)
+
+
+def migracion_3(conn):
+    """Resumen diario por contratista mantenido por triggers"""
+    # Resumen diario por contratista para los tableros de supervisores
+    # (/api/resumen). Lo mantienen los triggers de abajo en cada inserción,
+    # cambio y borrado de reportes_rutas, así que leerlo no depende de cuántos
+    # reportes haya. Las filas que llegan a 0 reportes se eliminan.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reportes_daily_summary (
+            fecha_reporte DATE NOT NULL,
+            contratista TEXT NOT NULL,
+            reportes INTEGER NOT NULL DEFAULT 0,
+            reportes_activos INTEGER NOT NULL DEFAULT 0,
+            clientes_pendientes INTEGER NOT NULL DEFAULT 0,
+            cajas_camion INTEGER NOT NULL DEFAULT 0,
+            ultima_hora_ingreso TIME,
+            PRIMARY KEY (fecha_reporte, contratista)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('DELETE FROM reportes_daily_summary')
+    conn.execute('''
+        INSERT INTO reportes_daily_summary (
+            fecha_reporte, contratista, reportes, reportes_activos,
+            clientes_pendientes, cajas_camion, ultima_hora_ingreso
+        )
+        SELECT fecha_reporte, contratista, COUNT(*), SUM(estado IS 'activo'),
+               SUM(clientes_pendientes), SUM(cajas_camion), MAX(hora_aproximada_ingreso)
+        FROM reportes_rutas
+        WHERE fecha_reporte IS NOT NULL
+        GROUP BY fecha_reporte, contratista
+    ''')
+
+    # Sumar el reporte NEW a su fila del resumen (los reportes sin fecha no cuentan)
+    sumar = '''
+            INSERT INTO reportes_daily_summary (
+                fecha_reporte, contratista, reportes, reportes_activos,
+                clientes_pendientes, cajas_camion, ultima_hora_ingreso
+            )
+            SELECT NEW.fecha_reporte, NEW.contratista, 1, NEW.estado IS 'activo',
+                   NEW.clientes_pendientes, NEW.cajas_camion, NEW.hora_aproximada_ingreso
+            WHERE NEW.fecha_reporte IS NOT NULL
+            ON CONFLICT (fecha_reporte, contratista) DO UPDATE SET
+                reportes = reportes + 1,
+                reportes_activos = reportes_activos + excluded.reportes_activos,
+                clientes_pendientes = clientes_pendientes + excluded.clientes_pendientes,
+                cajas_camion = cajas_camion + excluded.cajas_camion,
+                ultima_hora_ingreso = MAX(COALESCE(ultima_hora_ingreso, ''), excluded.ultima_hora_ingreso);
+    '''
+    # Restar el reporte OLD de su fila del resumen. La hora máxima solo se
+    # recalcula (sobre los reportes de ese día y contratista) si OLD era la máxima.
+    restar = '''
+            UPDATE reportes_daily_summary SET
+                reportes = reportes - 1,
+                reportes_activos = reportes_activos - (OLD.estado IS 'activo'),
+                clientes_pendientes = clientes_pendientes - OLD.clientes_pendientes,
+                cajas_camion = cajas_camion - OLD.cajas_camion,
+                ultima_hora_ingreso = CASE
+                    WHEN OLD.hora_aproximada_ingreso < ultima_hora_ingreso THEN ultima_hora_ingreso
+                    ELSE (SELECT MAX(hora_aproximada_ingreso) FROM reportes_rutas
+                          WHERE fecha_reporte = OLD.fecha_reporte AND contratista = OLD.contratista)
+                END
+            WHERE fecha_reporte = OLD.fecha_reporte AND contratista = OLD.contratista;
+            DELETE FROM reportes_daily_summary
+            WHERE fecha_reporte = OLD.fecha_reporte AND contratista = OLD.contratista AND reportes <= 0;
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_resumen_diario_insert
+        AFTER INSERT ON reportes_rutas
+        BEGIN
+            {sumar}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_resumen_diario_update
+        AFTER UPDATE OF estado, clientes_pendientes, cajas_camion, hora_aproximada_ingreso,
+                        fecha_reporte, contratista ON reportes_rutas
+        BEGIN
+            {restar}
+            {sumar}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_resumen_diario_delete
+        AFTER DELETE ON reportes_rutas
+        BEGIN
+            {restar}
+        END
+    ''')
+
+
+def migracion_4(conn):
+    """Supervisor en cada reporte y agregados diarios y semanales mantenidos por triggers"""
+    # Supervisor de la ruta al enviar el reporte; el de los reportes anteriores
+    # a la columna se toma de la ruta
+    agregar_columna(conn, 'reportes_rutas', 'supervisor', 'TEXT')
+    conn.execute('''
+        UPDATE reportes_rutas
+        SET supervisor = (SELECT ru.supervisor FROM rutas ru WHERE ru.id = reportes_rutas.ruta_id)
+        WHERE supervisor IS NULL
+    ''')
+
+    # Agregados para los rangos de fechas de /api/analytics, uno por
+    # dimensión (contratista, ruta o supervisor) y contratista. periodo 'dia'
+    # usa la fecha del reporte como inicio y 'semana' el lunes de su semana.
+    # Un trimestre agrupado por contratista o supervisor son unas pocas miles
+    # de filas, sin leer reportes_rutas.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS reportes_agregados (
+            periodo TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            inicio DATE NOT NULL,
+            clave TEXT NOT NULL,
+            contratista TEXT NOT NULL,
+            reportes INTEGER NOT NULL DEFAULT 0,
+            clientes_pendientes INTEGER NOT NULL DEFAULT 0,
+            cajas_camion INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (periodo, dimension, inicio, clave, contratista)
+        ) WITHOUT ROWID
+    ''')
+
+    periodos = [
+        ('dia', '{fila}.fecha_reporte'),
+        ('semana', "date({fila}.fecha_reporte, 'weekday 0', '-6 days')"),
+    ]
+    # El supervisor es el que tenía la ruta al enviar el reporte, igual que
+    # ruta_codigo, para que restar un reporte siempre toque la misma fila
+    dimensiones = [
+        ('contratista', '{fila}.contratista'),
+        ('ruta', '{fila}.ruta_codigo'),
+        ('supervisor', "COALESCE({fila}.supervisor, '')"),
+    ]
+
+    conn.execute('DELETE FROM reportes_agregados')
+    llenar = '''
+        INSERT INTO reportes_agregados (
+            periodo, dimension, inicio, clave, contratista,
+            reportes, clientes_pendientes, cajas_camion
+        )
+        SELECT '{periodo}', '{dimension}', {inicio} AS inicio_periodo, {clave} AS clave_grupo,
+               contratista, COUNT(*), SUM(clientes_pendientes), SUM(cajas_camion)
+        FROM reportes_rutas r
+        WHERE r.fecha_reporte IS NOT NULL
+        GROUP BY inicio_periodo, clave_grupo, contratista
+    '''
+    for sentencia in sentencias_agregados(llenar, 'r', periodos, dimensiones):
+        conn.execute(sentencia)
+
+    sumar = ''.join(sentencias_agregados('''
+            INSERT INTO reportes_agregados (
+                periodo, dimension, inicio, clave, contratista,
+                reportes, clientes_pendientes, cajas_camion
+            )
+            SELECT '{periodo}', '{dimension}', {inicio}, {clave}, NEW.contratista, 1,
+                   NEW.clientes_pendientes, NEW.cajas_camion
+            WHERE NEW.fecha_reporte IS NOT NULL
+            ON CONFLICT (periodo, dimension, inicio, clave, contratista) DO UPDATE SET
+                reportes = reportes + 1,
+                clientes_pendientes = clientes_pendientes + excluded.clientes_pendientes,
+                cajas_camion = cajas_camion + excluded.cajas_camion;
+    ''', 'NEW', periodos, dimensiones))
+    restar = ''.join(sentencias_agregados('''
+            UPDATE reportes_agregados SET
+                reportes = reportes - 1,
+                clientes_pendientes = clientes_pendientes - OLD.clientes_pendientes,
+                cajas_camion = cajas_camion - OLD.cajas_camion
+            WHERE periodo = '{periodo}' AND dimension = '{dimension}' AND inicio = {inicio}
+              AND clave = {clave} AND contratista = OLD.contratista;
+            DELETE FROM reportes_agregados
+            WHERE periodo = '{periodo}' AND dimension = '{dimension}' AND inicio = {inicio}
+              AND clave = {clave} AND contratista = OLD.contratista AND reportes <= 0;
+    ''', 'OLD', periodos, dimensiones))
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_agregados_insert
+        AFTER INSERT ON reportes_rutas
+        BEGIN
+            {sumar}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_agregados_update
+        AFTER UPDATE OF clientes_pendientes, cajas_camion, fecha_reporte, contratista,
+                        ruta_codigo, supervisor ON reportes_rutas
+        BEGIN
+            {restar}
+            {sumar}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_agregados_delete
+        AFTER DELETE ON reportes_rutas
+        BEGIN
+            {restar}
+        END
+    ''')
+
+
+def migracion_5(conn):
+    """Triggers de borrado que ignoran los reportes que mueve el archivador"""
+    # Se reescriben los triggers creados por las migraciones 2, 3 y 4 con una
+    # condición WHEN sobre la marca 'archivando' (CLAVE_ARCHIVANDO)
+    evento = 'AFTER DELETE ON reportes_rutas'
+    condicion = "WHEN NOT EXISTS (SELECT 1 FROM metadatos WHERE clave = 'archivando')"
+    for nombre in ('trg_reportes_cambios_delete', 'trg_resumen_diario_delete', 'trg_agregados_delete'):
+        sql = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = ?", (nombre,)
+        ).fetchone()[0]
+        if condicion in sql:
+            continue
+        if evento not in sql:
+            raise RuntimeError(f'Definición inesperada del trigger {nombre}')
+        conn.execute(f'DROP TRIGGER {nombre}')
+        conn.execute(sql.replace(evento, f'{evento}\n        {condicion}', 1))
+
+
+def migracion_6(conn):
+    """
+    Contratista sin espacios al inicio ni al final en los reportes, igual que
+    el catálogo desde importar_rutas.normalizar_rutas (str.strip)
+    """
+    espacios = "' ' || char(9, 10, 11, 12, 13, 160)"
+    recortado = f'TRIM(contratista, {espacios})'
+    # Los triggers de actualización mueven cada reporte a su fila normalizada
+    # del resumen diario y de los agregados
+    conn.execute(f'UPDATE reportes_rutas SET contratista = {recortado} WHERE contratista <> {recortado}')
+    conn.execute(f'UPDATE reportes_cambios SET contratista = {recortado} WHERE contratista <> {recortado}')
+
+    # Lo que queda con espacios corresponde a reportes archivados: se suma a
+    # la fila normalizada
+    conn.execute(f'''
+        INSERT INTO reportes_daily_summary (
+            fecha_reporte, contratista, reportes, reportes_activos,
+            clientes_pendientes, cajas_camion, ultima_hora_ingreso
+        )
+        SELECT fecha_reporte, {recortado}, reportes, reportes_activos,
+               clientes_pendientes, cajas_camion, ultima_hora_ingreso
+        FROM reportes_daily_summary
+        WHERE contratista <> {recortado}
+        ON CONFLICT (fecha_reporte, contratista) DO UPDATE SET
+            reportes = reportes + excluded.reportes,
+            reportes_activos = reportes_activos + excluded.reportes_activos,
+            clientes_pendientes = clientes_pendientes + excluded.clientes_pendientes,
+            cajas_camion = cajas_camion + excluded.cajas_camion,
+            ultima_hora_ingreso = MAX(COALESCE(ultima_hora_ingreso, ''),
+                                      COALESCE(excluded.ultima_hora_ingreso, ''))
+    ''')
+    conn.execute(f'DELETE FROM reportes_daily_summary WHERE contratista <> {recortado}')
+    conn.execute(f'''
+        INSERT INTO reportes_agregados (
+            periodo, dimension, inicio, clave, contratista,
+            reportes, clientes_pendientes, cajas_camion
+        )
+        SELECT periodo, dimension, inicio,
+               CASE WHEN dimension = 'contratista' THEN {recortado} ELSE clave END,
+               {recortado}, reportes, clientes_pendientes, cajas_camion
+        FROM reportes_agregados
+        WHERE contratista <> {recortado}
+        ON CONFLICT (periodo, dimension, inicio, clave, contratista) DO UPDATE SET
+            reportes = reportes + excluded.reportes,
+            clientes_pendientes = clientes_pendientes + excluded.clientes_pendientes,
+            cajas_camion = cajas_camion + excluded.cajas_camion
+    ''')
+    conn.execute(f'DELETE FROM reportes_agregados WHERE contratista <> {recortado}')
+
+
+def migracion_7(conn):
+    """
+    Generación del catálogo de rutas mantenida por triggers: cualquier cambio
+    en rutas (recarga del Excel, railway_fix, ediciones directas) invalida
+    el catálogo en memoria de los workers y el ETag de /get_rutas
+    """
+    # La clave es catalogo.CLAVE_GENERACION
+    incrementar = '''
+            INSERT INTO metadatos (clave, valor) VALUES ('catalogo_generacion', '1')
+            ON CONFLICT(clave) DO UPDATE SET
+                valor = CAST(valor AS INTEGER) + 1,
+                actualizado_en = CURRENT_TIMESTAMP;
+    '''
+    for evento in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_rutas_generacion_{evento.lower()}
+            AFTER {evento} ON rutas
+            BEGIN
+                {incrementar}
+            END
+        ''')
+
+
+# (versión, descripción, función). Las nuevas migraciones se agregan al final.
+MIGRACIONES = [
+    (1, 'tablas base', migracion_1),
+    (2, 'metadatos, registro de cambios, columnas e índices', migracion_2),
+    (3, 'resumen diario de reportes', migracion_3),
+    (4, 'agregados diarios y semanales para analytics', migracion_4),
+    (5, 'triggers de borrado compatibles con el archivador', migracion_5),
+    (6, 'contratista sin espacios sobrantes en los reportes', migracion_6),
+    (7, 'generación del catálogo de rutas mantenida por triggers', migracion_7),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+
+def version_esquema(conn):
+    """Versión del esquema guardada en la base de datos (0 = sin migrar)"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrar(conn):
+    """
+    Aplicar las migraciones pendientes en una sola transacción.
+    BEGIN IMMEDIATE serializa a los procesos que arrancan a la vez; la
+    versión se vuelve a leer con el lock tomado. Devuelve la versión final.
+    """
+    if version_esquema(conn) >= VERSION_ESQUEMA:
+        return VERSION_ESQUEMA
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        version = version_esquema(conn)
+        for numero, descripcion, aplicar in MIGRACIONES:
+            if numero > version:
+                aplicar(conn)
+                conn.execute(f'PRAGMA user_version = {numero}')
+                print(f"🔧 Migración {numero} aplicada: {descripcion}")
+                version = numero
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return version
+
+
+def crear_usuarios_por_defecto(conn):
+    """
+    Crear los usuarios por defecto solo si la tabla users está vacía (base
+    nueva); devuelve los creados. Una cuenta por defecto que se eliminó a
+    propósito no vuelve a aparecer al reiniciar.
+    """
+    if conn.execute('SELECT 1 FROM users LIMIT 1').fetchone():
+        return []
+    conn.executemany('''
+        INSERT INTO users (username, email, password_hash, role)
+        VALUES (?, ?, ?, ?)
+    ''', [(username, email, generate_password_hash(password), role)
+          for username, email, password, role in USUARIOS_POR_DEFECTO])
+    conn.commit()
+    return [(username, password) for username, _, password, _ in USUARIOS_POR_DEFECTO]
+
+
+def inicializar_base_datos(database):
+    """Crear o actualizar el esquema de `database` y los usuarios por defecto"""
+    conn = sqlite3.connect(database, timeout=30)
+    try:
+        # journal_mode=WAL es persistente: basta con aplicarlo al inicializar
+        conn.execute('PRAGMA journal_mode=WAL')
+        version = migrar(conn)
+        creados = crear_usuarios_por_defecto(conn)
+    finally:
+        conn.close()
+
+    if creados:
+        print("✅ Usuarios por defecto creados:")
+        for username, password in creados:
+            print(f"   {username.capitalize()}: {username} / {password}")
+    return version
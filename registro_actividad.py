@@ -0,0 +1,139 @@
+"""
+Escritura asíncrona del log de actividades (activity_log).
+
+Los requests solo encolan el evento; un hilo por worker los inserta en
+lotes (por tamaño o por intervalo) dentro de una sola transacción, de modo
+que el log no compite por el lock de escritura de SQLite en cada request.
+Si la cola se llena, el request espera como máximo `espera_maxima`
+segundos (backpressure) y después el evento se descarta y se cuenta.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+SQL_INSERTAR = '''
+    INSERT INTO activity_log (user_id, action, target_type, target_id, details, ip_address, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+_DETENER = object()
+
+
+class RegistroActividad:
+    """Cola acotada de eventos con un escritor en segundo plano"""
+
+    def __init__(self, obtener_conexion, max_lote=100, intervalo=1.0,
+                 max_pendientes=10000, espera_maxima=0.05):
+        self._obtener_conexion = obtener_conexion
+        self.max_lote = max_lote
+        self.intervalo = intervalo
+        self.max_pendientes = max_pendientes
+        self.espera_maxima = espera_maxima
+        self._lock = threading.Lock()
+        self._pid = None
+        self._hilo = None
+        self._cola = None
+        self._stats = {
+            'encolados': 0,
+            'escritos': 0,
+            'lotes': 0,
+            'demorados': 0,
+            'descartados': 0,
+            'errores': 0,
+        }
+        atexit.register(self.cerrar)
+
+    def _contar(self, clave, cantidad=1):
+        with self._lock:
+            self._stats[clave] += cantidad
+
+    def _iniciar(self):
+        """Arrancar el escritor (una vez por proceso, también tras un fork)"""
+        with self._lock:
+            if self._pid == os.getpid() and self._hilo is not None:
+                return
+            self._pid = os.getpid()
+            self._cola = queue.Queue(maxsize=self.max_pendientes)
+            self._hilo = threading.Thread(
+                target=self._escribir, name='registro-actividad', daemon=True
+            )
+            self._hilo.start()
+
+    def registrar(self, user_id, action, target_type=None, target_id=None,
+                  details=None, ip_address=None):
+        """Encolar un evento; devuelve False si tuvo que descartarse"""
+        if self._pid != os.getpid() or self._hilo is None:
+            self._iniciar()
+        # Misma hora (UTC) que pondría CURRENT_TIMESTAMP al momento del evento
+        registrado = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        evento = (user_id, action, target_type, target_id, details, ip_address, registrado)
+        try:
+            self._cola.put_nowait(evento)
+        except queue.Full:
+            self._contar('demorados')
+            try:
+                self._cola.put(evento, timeout=self.espera_maxima)
+            except queue.Full:
+                self._contar('descartados')
+                return False
+        self._contar('encolados')
+        return True
+
+    def _escribir(self):
+        cola = self._cola
+        detener = False
+        while not detener:
+            lote = []
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.max_lote:
+                restante = limite - time.monotonic()
+                try:
+                    evento = cola.get(timeout=max(restante, 0)) if restante > 0 else cola.get_nowait()
+                except queue.Empty:
+                    break
+                if evento is _DETENER:
+                    detener = True
+                    break
+                lote.append(evento)
+            if lote:
+                self._guardar_lote(lote)
+
+    def _guardar_lote(self, lote):
+        try:
+            conn = self._obtener_conexion()
+            try:
+                conn.executemany(SQL_INSERTAR, lote)
+                conn.commit()
+            finally:
+                conn.close()
+        except Exception as e:
+            self._contar('errores')
+            self._contar('descartados', len(lote))
+            print(f"Error logging activity: {e}")
+            return
+        with self._lock:
+            self._stats['escritos'] += len(lote)
+            self._stats['lotes'] += 1
+
+    def cerrar(self, timeout=5.0):
+        """Escribir los eventos pendientes y detener el escritor"""
+        with self._lock:
+            hilo, cola = self._hilo, self._cola
+            if hilo is None or self._pid != os.getpid():
+                return
+            self._hilo = None
+        try:
+            cola.put(_DETENER, timeout=timeout)
+        except queue.Full:
+            return
+        hilo.join(timeout)
+
+    def estadisticas(self):
+        """Contadores del escritor para monitoreo"""
+        with self._lock:
+            stats = dict(self._stats)
+            cola = self._cola if self._pid == os.getpid() else None
+        stats['pendientes'] = cola.qsize() if cola is not None else 0
+        return stats
@@ -0,0 +1,141 @@
+/*
+ * Cola de reportes sin conexión (IndexedDB).
+ * La usan tanto index.html como el service worker (importScripts), de modo
+ * que los reportes guardados sin cobertura se reenvían desde cualquiera de
+ * los dos a /submit_reportes_batch. Cada reporte lleva su clave_idempotencia
+ * y el servidor descarta los que ya recibió. Los que el servidor rechaza
+ * pasan a un almacén aparte, con el error, para mostrarlos en el formulario.
+ */
+(function (global) {
+    const DB_NOMBRE = 'rutas-offline';
+    const ALMACEN = 'reportes_pendientes';
+    const RECHAZADOS = 'reportes_rechazados';
+    const LOTE_MAXIMO = 50;
+
+    function abrir() {
+        return new Promise(function (resolve, reject) {
+            const peticion = indexedDB.open(DB_NOMBRE, 2);
+            peticion.onupgradeneeded = function () {
+                [ALMACEN, RECHAZADOS].forEach(function (nombre) {
+                    if (!peticion.result.objectStoreNames.contains(nombre)) {
+                        peticion.result.createObjectStore(nombre, { keyPath: 'clave_idempotencia' });
+                    }
+                });
+            };
+            peticion.onsuccess = function () { resolve(peticion.result); };
+            peticion.onerror = function () { reject(peticion.error); };
+        });
+    }
+
+    function transaccion(modo, operacion, almacenes) {
+        almacenes = almacenes || [ALMACEN];
+        return abrir().then(function (db) {
+            return new Promise(function (resolve, reject) {
+                const tx = db.transaction(almacenes, modo);
+                const peticion = operacion.apply(null, almacenes.map(function (nombre) {
+                    return tx.objectStore(nombre);
+                }));
+                tx.oncomplete = function () {
+                    db.close();
+                    resolve(peticion ? peticion.result : undefined);
+                };
+                tx.onerror = function () {
+                    db.close();
+                    reject(tx.error);
+                };
+            });
+        });
+    }
+
+    function nuevaClave() {
+        if (global.crypto && global.crypto.randomUUID) {
+            return global.crypto.randomUUID();
+        }
+        return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12);
+    }
+
+    function guardar(reporte) {
+        return transaccion('readwrite', function (almacen) { return almacen.put(reporte); });
+    }
+
+    function pendientes() {
+        return transaccion('readonly', function (almacen) { return almacen.getAll(); });
+    }
+
+    function rechazados() {
+        return transaccion('readonly', function (almacen) { return almacen.getAll(); }, [RECHAZADOS]);
+    }
+
+    // Quitar de la cola los aceptados y duplicados, y mover los rechazados con su error
+    function quitar(claves, rechazos) {
+        return transaccion('readwrite', function (pendientes, rechazados) {
+            claves.forEach(function (clave) { pendientes.delete(clave); });
+            rechazos.forEach(function (rechazo) {
+                pendientes.delete(rechazo.reporte.clave_idempotencia);
+                rechazados.put(Object.assign({}, rechazo.reporte, { error: rechazo.error }));
+            });
+        }, [ALMACEN, RECHAZADOS]);
+    }
+
+    function descartarRechazados() {
+        return transaccion('readwrite', function (almacen) { almacen.clear(); }, [RECHAZADOS]);
+    }
+
+    // Enviar un lote; devuelve cuántos reportes siguen pendientes
+    function reenviarLote() {
+        return pendientes().then(function (reportes) {
+            if (!reportes.length) {
+                return 0;
+            }
+            const lote = reportes.slice(0, LOTE_MAXIMO);
+            return fetch('/submit_reportes_batch', {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ reportes: lote })
+            }).then(function (respuesta) {
+                if (respuesta.status >= 500) {
+                    throw new Error('HTTP ' + respuesta.status);
+                }
+                return respuesta.json();
+            }).then(function (datos) {
+                if (!datos.resultados) {
+                    throw new Error(datos.error || 'Respuesta inválida');
+                }
+                // Creados y duplicados salen de la cola; los rechazados pasan a su almacén
+                const aceptados = [];
+                const rechazos = [];
+                datos.resultados.forEach(function (resultado) {
+                    const reporte = lote[resultado.indice];
+                    if (resultado.estado === 'creado' || resultado.estado === 'duplicado') {
+                        aceptados.push(reporte.clave_idempotencia);
+                    } else if (resultado.estado === 'error') {
+                        rechazos.push({ reporte: reporte, error: resultado.error });
+                    }
+                });
+                if (!aceptados.length && !rechazos.length) {
+                    throw new Error('Respuesta sin resultados');
+                }
+                return quitar(aceptados, rechazos).then(function () {
+                    return reportes.length - aceptados.length - rechazos.length;
+                });
+            });
+        });
+    }
+
+    // Reenviar lotes hasta vaciar la cola (falla si se pierde la conexión)
+    function reenviar() {
+        return reenviarLote().then(function (restantes) {
+            return restantes > 0 ? reenviar() : 0;
+        });
+    }
+
+    global.ColaOffline = {
+        nuevaClave: nuevaClave,
+        guardar: guardar,
+        pendientes: pendientes,
+        rechazados: rechazados,
+        descartarRechazados: descartarRechazados,
+        reenviar: reenviar
+    };
+})(self);
@@ -0,0 +1,94 @@
+/*
+ * Service worker del formulario de reportes.
+ * - "/" (formulario y lista de contratistas): red primero, copia en cache sin conexión
+ * - /get_rutas/<contratista>: respuesta en cache al instante y actualización en segundo plano
+ * - Bootstrap, Font Awesome y jQuery (CDN): cache primero
+ * - Background Sync: reenvía la cola de reportes guardados sin conexión
+ */
+importScripts('{{ url_for("cola_offline_js") }}');
+
+const CACHE = 'rutas-{{ version }}';
+const PRECARGA = ['{{ url_for("index") }}', '{{ url_for("cola_offline_js") }}'];
+// Deben coincidir con el connect-src de la CSP con que se sirve este script
+const ORIGENES_CDN = {{ origenes_cdn | tojson }};
+
+self.addEventListener('install', function (event) {
+    event.waitUntil(
+        caches.open(CACHE)
+            .then(function (cache) { return cache.addAll(PRECARGA); })
+            .then(function () { return self.skipWaiting(); })
+    );
+});
+
+self.addEventListener('activate', function (event) {
+    event.waitUntil(
+        caches.keys().then(function (nombres) {
+            return Promise.all(nombres
+                .filter(function (nombre) { return nombre.startsWith('rutas-') && nombre !== CACHE; })
+                .map(function (nombre) { return caches.delete(nombre); }));
+        }).then(function () { return self.clients.claim(); })
+    );
+});
+
+function guardarEnCache(peticion, respuesta) {
+    if (respuesta && respuesta.ok) {
+        const copia = respuesta.clone();
+        caches.open(CACHE).then(function (cache) { cache.put(peticion, copia); });
+    }
+    return respuesta;
+}
+
+function redPrimero(peticion) {
+    return fetch(peticion)
+        .then(function (respuesta) { return guardarEnCache(peticion, respuesta); })
+        .catch(function () {
+            return caches.match(peticion).then(function (enCache) {
+                return enCache || caches.match('{{ url_for("index") }}');
+            });
+        });
+}
+
+function cacheYActualizar(peticion) {
+    return caches.match(peticion).then(function (enCache) {
+        const actualizacion = fetch(peticion)
+            .then(function (respuesta) { return guardarEnCache(peticion, respuesta); });
+        if (enCache) {
+            actualizacion.catch(function () {});
+            return enCache;
+        }
+        return actualizacion;
+    });
+}
+
+function cachePrimero(peticion) {
+    return caches.match(peticion).then(function (enCache) {
+        return enCache || fetch(peticion).then(function (respuesta) {
+            return guardarEnCache(peticion, respuesta);
+        });
+    });
+}
+
+self.addEventListener('fetch', function (event) {
+    const peticion = event.request;
+    if (peticion.method !== 'GET') {
+        return;
+    }
+    const url = new URL(peticion.url);
+
+    if (url.origin === self.location.origin) {
+        if (peticion.mode === 'navigate' && url.pathname === '{{ url_for("index") }}') {
+            event.respondWith(redPrimero(peticion));
+        } else if (url.pathname.startsWith('/get_rutas/') ||
+                   url.pathname === '{{ url_for("cola_offline_js") }}') {
+            event.respondWith(cacheYActualizar(peticion));
+        }
+    } else if (ORIGENES_CDN.indexOf(url.origin) !== -1) {
+        event.respondWith(cachePrimero(peticion));
+    }
+});
+
+self.addEventListener('sync', function (event) {
+    if (event.tag === 'reenviar-reportes') {
+        event.waitUntil(ColaOffline.reenviar());
+    }
+});
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""
+Verificador de planes de consulta del Sistema de Gestión de Rutas
+-----------------------------------------------------------------
+
+Ejecuta los endpoints más usados contra una base de datos temporal,
+captura cada SELECT que llega a SQLite y revisa su EXPLAIN QUERY PLAN.
+Falla (código de salida 1) si alguna consulta frecuente recorre una tabla
+completa en lugar de usar un índice, o si un endpoint acepta una fecha
+inválida en lugar de responder 400 (la consulta quedaría sin límite de fecha).
+
+Uso:
+python verificar_consultas.py
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+import app as app_module
+from archivador import Archivador
+from db_pool import ConexionPool
+
+# "SCAN r" o "SCAN reportes_rutas" sin índice = recorrido completo de la tabla
+PATRON_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+# Subconsultas (p. ej. el UNION ALL con los archivos): su SCAN recorre filas ya filtradas
+PATRON_SUBCONSULTA = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\w+)$')
+
+# Consultas de diagnóstico que no forman parte de los caminos frecuentes
+IGNORAR = ('sqlite_master', 'SELECT 1')
+
+# Antigüedad del reporte que se archiva para ejercitar las consultas históricas
+DIAS_ARCHIVADO = 60
+
+
+def preparar_base_datos(ruta_db):
+    """Crear el esquema y datos mínimos en una base de datos temporal"""
+    app_module.DATABASE = ruta_db
+    app_module.pool_conexiones = ConexionPool(ruta_db)
+    app_module.init_db()
+
+    conn = sqlite3.connect(ruta_db)
+    conn.executemany('''
+        INSERT INTO rutas (ruta, codigo, placa, supervisor, contratista, tipo)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        ('DS0001', 'SV-0001', 'C100001', 'SUPERVISOR A', 'CONTRATISTA A', 'GC'),
+        ('DS0002', 'SV-0002', 'C100002', 'SUPERVISOR B', 'CONTRATISTA B', 'GC'),
+    ])
+    # Un reporte viejo que pasa a un archivo mensual
+    fecha_vieja = (app_module.get_now() - app_module.timedelta(days=DIAS_ARCHIVADO)).strftime('%Y-%m-%d')
+    conn.execute('''
+        INSERT INTO reportes_rutas (contratista, ruta_id, ruta_codigo, hora_aproximada_ingreso,
+                                    fecha_reporte, hora_reporte, supervisor)
+        VALUES ('CONTRATISTA A', 1, 'DS0001', '15:00', ?, ?, 'SUPERVISOR A')
+    ''', (fecha_vieja, f'{fecha_vieja} 07:00:00'))
+    conn.commit()
+    conn.close()
+    app_module.archivador = Archivador(ruta_db, retencion_dias=DIAS_ARCHIVADO // 2)
+    app_module.archivador.archivar()
+    return fecha_vieja
+
+
+def capturar_consultas():
+    """Registrar el SQL expandido de cada conexión que abra el pool"""
+    consultas = []
+    pool = app_module.pool_conexiones
+    crear_original = pool._crear_conexion
+
+    def crear_con_traza():
+        conn = crear_original()
+        conn.set_trace_callback(consultas.append)
+        return conn
+
+    pool._crear_conexion = crear_con_traza
+    return consultas
+
+
+def ejercitar_endpoints(fecha_vieja):
+    """Simular el tráfico típico: formulario, envío, panel, API y exportación"""
+    client = app_module.app.test_client()
+    fecha = app_module.get_now().strftime('%Y-%m-%d')
+
+    client.get('/')
+    client.get('/get_rutas/CONTRATISTA A')
+    respuesta = client.post('/submit_reporte', json={
+        'contratista': 'CONTRATISTA A',
+        'ruta_id': 1,
+        'clientes_pendientes': 5,
+        'cajas_camion': 20,
+        'hora_aproximada_ingreso': '15:30',
+    })
+    reporte_id = (respuesta.get_json() or {}).get('reporte_id')
+    client.post('/submit_reporte', json={
+        'contratista': 'CONTRATISTA B',
+        'ruta_id': 2,
+        'clientes_pendientes': 3,
+        'cajas_camion': 12,
+        'hora_aproximada_ingreso': '16:00',
+    })
+
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    client.get(f'/admin?fecha={fecha}')
+    client.get(f'/admin?fecha={fecha}&contratista=CONTRATISTA A')
+    # Paginación por cursor: siguiente y anterior
+    siguiente = {'hora_reporte': app_module.get_now().strftime('%Y-%m-%d %H:%M:%S'), 'id': 2}
+    client.get(f'/admin?fecha={fecha}&per_page=1&despues={app_module.codificar_cursor(siguiente)}')
+    client.get(f'/admin?fecha={fecha}&per_page=1&antes={app_module.codificar_cursor(siguiente)}')
+    client.get(f'/admin/stream?fecha={fecha}&desde=0')
+    client.get(f'/admin/stream?fecha={fecha}&contratista=CONTRATISTA A&desde=0')
+    client.get(f'/api/reportes?fecha={fecha}')
+    client.get(f'/api/reportes?fecha={fecha}&contratista=CONTRATISTA A')
+    client.get(f'/api/reportes?fecha={fecha}&limit=1&fields=id,estado&since_id=0')
+    client.get(f'/api/reportes?fecha={fecha}&limit=1&cursor={app_module.codificar_cursor(siguiente)}')
+    client.get(f'/export_reportes?fecha={fecha}')
+    client.get(f'/api/resumen?fecha={fecha}')
+    client.get(f'/api/resumen?fecha={fecha}&contratista=CONTRATISTA A')
+    for agrupar in ('contratista', 'ruta', 'supervisor'):
+        client.get(f'/api/analytics?hasta={fecha}&agrupar={agrupar}')
+        client.get(f'/api/analytics?hasta={fecha}&agrupar={agrupar}&periodo=semana&contratista=CONTRATISTA A')
+    # Consultas que reúnen la base principal con los archivos mensuales
+    client.get(f'/admin?fecha={fecha_vieja}')
+    client.get(f'/api/reportes?fecha={fecha_vieja}&contratista=CONTRATISTA A')
+    client.get(f'/export_reportes?fecha_desde={fecha_vieja}&fecha_hasta={fecha}&format=csv').get_data()
+    if reporte_id:
+        client.post('/update_reporte_status', json={'reporte_id': reporte_id, 'status': 'completado'})
+        client.delete(f'/eliminar_reporte/{reporte_id}')
+
+
+def revisar_fechas_invalidas():
+    """
+    Una fecha que no se puede interpretar debe responder 400, nunca
+    consultar todas las fechas. Devuelve las URLs que no lo hicieron.
+    """
+    client = app_module.app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    urls = [
+        '/admin?fecha=basura',
+        '/admin/stream?fecha=basura&desde=0',
+        '/api/reportes?fecha=basura',
+        '/api/resumen?fecha=basura',
+        '/export_reportes?fecha=basura&format=csv',
+        '/export_reportes?fecha_desde=basura&fecha_hasta=2026-01-01&format=jsonl',
+    ]
+    return [url for url in urls if client.get(url).status_code != 400]
+
+
+def revisar_planes(ruta_db, consultas):
+    """Devolver las consultas cuyo plan recorre una tabla completa"""
+    conn = sqlite3.connect(ruta_db)
+    revisadas = []
+    fallidas = []
+
+    for sql in dict.fromkeys(consultas):
+        sql_limpio = ' '.join(sql.split())
+        if sql_limpio.upper().startswith('ATTACH'):
+            # Los archivos adjuntos hacen falta para explicar los UNION ALL
+            conn.execute(sql)
+            continue
+        if not sql_limpio.upper().startswith('SELECT') or any(i in sql_limpio for i in IGNORAR):
+            continue
+
+        plan = [fila[3] for fila in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+        subconsultas = {m.group(1) for m in map(PATRON_SUBCONSULTA.match, plan) if m}
+        scans = [paso for paso in plan
+                 if PATRON_SCAN.match(paso) and PATRON_SCAN.match(paso).group(1) not in subconsultas]
+        revisadas.append(sql_limpio)
+        if scans:
+            fallidas.append((sql_limpio, plan))
+
+    conn.close()
+    return revisadas, fallidas
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_db = os.path.join(directorio, 'verificacion.db')
+        fecha_vieja = preparar_base_datos(ruta_db)
+        consultas = capturar_consultas()
+        ejercitar_endpoints(fecha_vieja)
+        sin_validar = revisar_fechas_invalidas()
+        app_module.registro_actividad.cerrar()
+        app_module.pool_conexiones.cerrar()
+
+        revisadas, fallidas = revisar_planes(ruta_db, consultas)
+
+    print(f"🔍 Consultas revisadas: {len(revisadas)}")
+    for url in sin_validar:
+        print(f"❌ Fecha inválida aceptada (se esperaba 400): {url}")
+    if not fallidas:
+        print("✅ Todas las consultas frecuentes usan índices")
+        return 1 if sin_validar else 0
+
+    for sql, plan in fallidas:
+        print(f"\n❌ Recorrido completo de tabla en:\n   {sql}")
+        for paso in plan:
+            print(f"   - {paso}")
+    print(f"\n❌ {len(fallidas)} consulta(s) sin índice")
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())